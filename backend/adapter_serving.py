@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("adapter_serving.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("adapter-serving")
+
+# Nombre d'adaptateurs LoRA gardés en mémoire par modèle de base
+DEFAULT_MAX_ADAPTERS = 8
+
+# Nom réservé par PEFT pour les lignes d'un batch sans adaptateur
+BASE_ADAPTER = "__base__"
+
+
+class AdapterRegistry:
+    def __init__(self, db_path: str = "unsloth.db"):
+        """
+        Registre des adaptateurs LoRA servis sur un modèle de base résident.
+
+        Un adaptateur est désigné par un nom et associé au répertoire produit par le
+        fine-tuning (adapter_config.json, adapter_model.safetensors) et à son modèle de base.
+
+        Args:
+            db_path: Base SQLite contenant la table adapters
+        """
+        self.db_path = db_path
+        self._create_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _create_table(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS adapters (
+                name TEXT PRIMARY KEY,
+                adapter_path TEXT,
+                base_model TEXT,
+                registered_at REAL
+            )
+            ''')
+        finally:
+            conn.close()
+
+    def register(self, name: str, adapter_path: str, base_model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Enregistre (ou remplace) un adaptateur.
+
+        Args:
+            name: Nom de l'adaptateur dans les requêtes d'inférence
+            adapter_path: Répertoire de l'adaptateur LoRA
+            base_model: Modèle de base (lu dans adapter_config.json si absent)
+
+        Returns:
+            Dict[str, Any]: Entrée du registre
+        """
+        if name == BASE_ADAPTER:
+            raise ValueError(f"Nom d'adaptateur réservé: {name}")
+        config_path = os.path.join(adapter_path, "adapter_config.json")
+        if not os.path.exists(config_path):
+            raise ValueError(f"Adaptateur LoRA introuvable: {config_path}")
+        if base_model is None:
+            with open(config_path) as f:
+                base_model = json.load(f).get("base_model_name_or_path")
+
+        entry = {
+            "name": name,
+            "adapter_path": os.path.abspath(adapter_path),
+            "base_model": base_model,
+            "registered_at": time.time()
+        }
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO adapters (name, adapter_path, base_model, registered_at) VALUES (?, ?, ?, ?)",
+                (entry["name"], entry["adapter_path"], entry["base_model"], entry["registered_at"])
+            )
+        finally:
+            conn.close()
+        logger.info(f"Adaptateur {name} enregistré ({entry['adapter_path']}, base {base_model})")
+        return entry
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Retourne l'entrée d'un adaptateur (None s'il n'est pas enregistré)."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM adapters WHERE name = ?", (name,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Liste les adaptateurs enregistrés."""
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute("SELECT * FROM adapters ORDER BY name").fetchall()]
+        finally:
+            conn.close()
+
+    def remove(self, name: str) -> bool:
+        """Supprime un adaptateur du registre (les fichiers ne sont pas supprimés)."""
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM adapters WHERE name = ?", (name,)).rowcount > 0
+        finally:
+            conn.close()
+
+
+class AdapterManager:
+    def __init__(self, model, max_adapters: int = DEFAULT_MAX_ADAPTERS):
+        """
+        Adaptateurs LoRA attachés à un modèle de base transformers résident.
+
+        Les adaptateurs sont chargés à la demande dans le modèle de base (PEFT) et gardés
+        en mémoire dans la limite de max_adapters; au-delà, l'adaptateur inutilisé le moins
+        récemment demandé est détaché. Chaque couche LoRA reçoit, par un hook, l'adaptateur
+        de chaque ligne du batch: des requêtes sur des adaptateurs différents (ou sur le
+        modèle de base seul) sont décodées dans le même batch. Le choix des adaptateurs est
+        propre au thread qui appelle le modèle: hors de use(), les autres chemins
+        d'inférence (flux, lots) voient le modèle de base sans adaptateur.
+
+        Les méthodes attach, release et use doivent être appelées depuis un même thread
+        (celui du moteur à batching continu), qui seul modifie les couches du modèle.
+
+        Args:
+            model: Modèle de base transformers (partagé avec le pool)
+            max_adapters: Nombre d'adaptateurs gardés en mémoire
+        """
+        self.model = model
+        self.max_adapters = max(1, max_adapters)
+        self._peft_model = None
+        self._hooked = set()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._loaded: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    def _select_adapters(self, module, args, kwargs):
+        names = getattr(self._local, "adapter_names", None)
+        kwargs["adapter_names"] = names if names is not None else [BASE_ADAPTER] * args[0].shape[0]
+        return args, kwargs
+
+    def _install_hooks(self):
+        from peft.tuners.lora import LoraLayer
+
+        for module in self.model.modules():
+            if isinstance(module, LoraLayer) and id(module) not in self._hooked:
+                module.register_forward_pre_hook(self._select_adapters, with_kwargs=True)
+                self._hooked.add(id(module))
+
+    def _load(self, name: str, adapter_path: str):
+        start = time.perf_counter()
+        if self._peft_model is None:
+            from peft import PeftModel
+
+            # Les couches LoRA sont injectées dans le modèle de base lui-même (pas de copie des poids)
+            self._peft_model = PeftModel.from_pretrained(self.model, adapter_path, adapter_name=name, is_trainable=False)
+        else:
+            self._peft_model.load_adapter(adapter_path, adapter_name=name, is_trainable=False)
+        self._install_hooks()
+        elapsed = time.perf_counter() - start
+        self.loads += 1
+        self.load_time += elapsed
+        logger.info(f"Adaptateur {name} attaché en {elapsed:.2f}s ({adapter_path})")
+
+    def _evict(self):
+        for name, adapter in list(self._loaded.items()):
+            if len(self._loaded) <= self.max_adapters:
+                return
+            if adapter["in_use"] > 0:
+                continue
+            self._peft_model.delete_adapter(name)
+            del self._loaded[name]
+            self.evictions += 1
+            logger.info(f"Adaptateur {name} détaché (LRU)")
+
+    def attach(self, name: str, adapter_path: str):
+        """
+        Attache un adaptateur (chargé si nécessaire) pour une requête; à libérer avec release.
+
+        Un adaptateur ré-enregistré avec un autre répertoire est rechargé dès qu'il n'est plus utilisé.
+        """
+        with self._lock:
+            adapter = self._loaded.get(name)
+            if adapter is not None and adapter["adapter_path"] != adapter_path and adapter["in_use"] == 0:
+                self._peft_model.delete_adapter(name)
+                del self._loaded[name]
+                adapter = None
+
+            if adapter is None:
+                self._load(name, adapter_path)
+                adapter = {"adapter_path": adapter_path, "in_use": 0, "requests": 0, "loaded_at": time.time()}
+                self._loaded[name] = adapter
+            else:
+                self.hits += 1
+            adapter["in_use"] += 1
+            adapter["requests"] += 1
+            self._loaded.move_to_end(name)
+            self._evict()
+
+    def release(self, name: str):
+        """Libère un adaptateur attaché par attach."""
+        with self._lock:
+            if name in self._loaded:
+                self._loaded[name]["in_use"] -= 1
+            self._evict()
+
+    @contextmanager
+    def use(self, adapter_names: List[Optional[str]]):
+        """Applique à chaque ligne du batch son adaptateur (None: modèle de base) pendant un appel au modèle."""
+        self._local.adapter_names = [name or BASE_ADAPTER for name in adapter_names]
+        try:
+            yield
+        finally:
+            self._local.adapter_names = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne les adaptateurs en mémoire et les statistiques de chargement."""
+        with self._lock:
+            return {
+                "max_adapters": self.max_adapters,
+                "loaded": [
+                    {"name": name, "adapter_path": a["adapter_path"], "in_use": a["in_use"], "requests": a["requests"]}
+                    for name, a in self._loaded.items()
+                ],
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "load_seconds": self.load_time
+            }
@@ -1,9 +1,12 @@
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException, Form, Depends
+from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException, Form, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Union, Tuple, Iterator
+from contextlib import AsyncExitStack
 import os
+import asyncio
 import json
 import uuid
 import logging
@@ -11,12 +14,33 @@ import shutil
 from datetime import datetime
 import subprocess
 import sys
+import time
+import threading
 
 # Import des modules personnalisés
-from hardware_detection import get_hardware_info
+from hardware_detection import get_hardware_info, get_gpu_info
 from data_preprocessing import DataPreprocessor
 from model_export import ModelExporter
 from model_evaluation import ModelEvaluator
+from pipeline import PipelineRunner
+from hyperparameter_sweep import HyperparameterSweep
+from resource_estimator import estimate_finetune_memory, estimate_inference_memory, estimate_request_kv_cache, MemoryCalibrator, PeakMemoryTracker
+from scheduler import AdmissionController
+from job_queue import JobQueue
+from training import load_model_for_training, tune_batch_size, FineTuningTrainer, save_adapter
+from checkpointing import CheckpointManager
+from training_profiler import TrainingProfiler
+from multi_adapter import AdapterGroupScheduler, add_lora_adapter, adapter_name_for, estimate_group_memory, interleave_training
+from model_cache import ModelCache
+from model_pool import ModelPool, inference_load_options, load_inference_model
+from inference_engine import ContinuousBatchingEngine
+from adapter_serving import AdapterRegistry, AdapterManager
+from prefix_cache import PrefixCache, restore_gguf_prefix, save_gguf_prefix
+from response_cache import ResponseCache, model_fingerprint, is_deterministic
+from inference_workers import InferenceWorkerPool, QueueFullError
+from batch_inference import run_batch_inference
+from speculative_decoding import speculative_generate, DEFAULT_DRAFT_TOKENS
+from distributed_training import run_data_parallel, threads_per_process, write_job_file
 
 # Initialisation de l'application FastAPI
 app = FastAPI(title="Unsloth Fine-tuning API", description="API pour la plateforme de fine-tuning Unsloth")
@@ -54,6 +78,30 @@ class FineTuningConfig(BaseModel):
     weight_decay: float = 0.01
     warmup_steps: int = 50
     gradient_accumulation: int = 1
+    load_in_4bit: bool = True
+    dataset_path: Optional[str] = None
+    output_dir: Optional[str] = None
+    required_capabilities: List[str] = []  # ex: ["gpu"] (backend "queue" uniquement)
+    checkpoint_steps: int = 100  # 0 pour désactiver les checkpoints
+    checkpoint_keep_last: int = 3
+    resume_from_checkpoint: bool = True
+    validation_path: Optional[str] = None
+    validation_split: float = 0.0  # fraction du jeu d'entraînement réservée à la validation
+    eval_steps: int = 0  # 0: évaluation uniquement en fin d'entraînement
+    eval_batch_size: Optional[int] = None  # par défaut batch_size
+    early_stopping_patience: int = 0  # évaluations sans amélioration avant l'arrêt (0: désactivé)
+    early_stopping_min_delta: float = 0.0
+    profile: bool = False  # profilage des phases d'un pas sur profile_every_n_steps
+    profile_every_n_steps: int = 10
+    auto_batch_size: bool = False  # sonde du plus grand micro-batch qui tient en mémoire
+    effective_batch_size: Optional[int] = None  # par défaut batch_size * gradient_accumulation
+    auto_batch_max: int = 64
+    auto_batch_safety_margin: float = 0.1
+    share_base: bool = False  # entraîner avec les jobs compatibles sur un modèle de base chargé une fois
+    data_parallel_processes: int = 1  # processus d'entraînement CPU par machine (gradients moyennés par all-reduce)
+    data_parallel_nodes: int = 1  # machines participantes (les autres lancent distributed_training.py)
+    data_parallel_master_addr: str = "127.0.0.1"
+    data_parallel_master_port: int = 29500
 
 class JobStatus(BaseModel):
     job_id: str
@@ -64,11 +112,180 @@ class JobStatus(BaseModel):
     created_at: str
     updated_at: str
 
+class PipelineStepSpec(BaseModel):
+    id: str
+    type: str  # "preprocess", "finetune", "export", "evaluate"
+    params: Dict[str, Any] = {}
+    depends_on: List[str] = []
+
+class PipelineSpec(BaseModel):
+    name: Optional[str] = None
+    steps: List[PipelineStepSpec]
+    reuse_artifacts: bool = True
+    max_parallel: int = 4
+
+class SweepSpec(BaseModel):
+    name: Optional[str] = None
+    base_config: FineTuningConfig
+    search_space: Dict[str, Any]  # {nom: [valeurs] ou {"type": "choice"|"uniform"|"loguniform"|"int", ...}}
+    search: str = "grid"  # "grid" ou "random"
+    num_trials: Optional[int] = None
+    seed: Optional[int] = None
+    scheduler: str = "fifo"  # "fifo" ou "asha"
+    max_concurrent_trials: int = 2
+    min_steps: int = 10
+    max_steps: Optional[int] = None
+    reduction_factor: int = 3
+
 # Stockage en mémoire des jobs et tâches (à remplacer par une base de données dans un environnement de production)
 jobs = {}
 preprocessing_tasks = {}
 export_tasks = {}
 evaluation_tasks = {}
+pipelines = {}
+sweeps = {}
+batch_inference_tasks = {}
+
+# Exécution des jobs: "local" (tâches d'arrière-plan de l'API) ou "queue" (file SQLite partagée, voir worker.py)
+JOB_BACKEND = os.environ.get("UNSLOTH_JOB_BACKEND", "local")
+job_queue = JobQueue(os.environ.get("UNSLOTH_QUEUE_DB", "unsloth.db")) if JOB_BACKEND == "queue" else None
+
+# Index des jobs de fine-tuning: répertoire de sortie de chaque job (output_dir personnalisé compris)
+FINETUNE_JOB_INDEX = os.path.join("models", "finetuned", "jobs")
+
+def dispatch_task(
+    kind: str,
+    task_id: str,
+    task_function,
+    kwargs: Dict[str, Any],
+    background_tasks: BackgroundTasks,
+    requirements: Optional[List[str]] = None
+):
+    """Exécute une tâche en arrière-plan dans l'API, ou la place dans la file partagée des workers"""
+    if job_queue is not None:
+        job_queue.enqueue(task_id, kind, {"kwargs": kwargs}, requirements)
+    else:
+        background_tasks.add_task(task_function, task_id, **kwargs)
+
+def get_task_record(store: Dict[str, Any], task_id: str) -> Optional[Dict[str, Any]]:
+    """Retourne l'enregistrement d'une tâche, en tenant compte de son état dans la file partagée"""
+    if job_queue is not None:
+        queued = job_queue.get(task_id)
+        if queued is not None:
+            record = dict(queued["record"] or store.get(task_id) or {"task_id": task_id, "progress": 0.0})
+            if queued["status"] == "queued":
+                # Jamais loué, ou remis en file après la mort d'un worker
+                record["status"] = "queued"
+            elif queued["status"] == "cancelled":
+                record["status"] = "cancelled"
+            elif queued["status"] == "failed" and record.get("status") != "failed":
+                record["status"] = "failed"
+                record["error"] = queued["error"]
+            elif queued["status"] == "leased" and not record.get("status"):
+                record["status"] = "pending"
+            record["queue"] = {
+                "status": queued["status"],
+                "worker_id": queued["worker_id"],
+                "attempts": queued["attempts"],
+                "heartbeat_at": queued["heartbeat_at"]
+            }
+            return record
+    return store.get(task_id)
+
+def list_task_records(store: Dict[str, Any], kind: str) -> List[Dict[str, Any]]:
+    """Liste les enregistrements des tâches d'un type donné"""
+    if job_queue is not None:
+        return [get_task_record(store, job["job_id"]) for job in job_queue.list(kind)]
+    return list(store.values())
+
+# Cache local partagé des modèles de base (copies du Hub sous models/cache, table models)
+model_cache = ModelCache(os.path.join("models", "cache"), os.environ.get("UNSLOTH_QUEUE_DB", "unsloth.db"))
+
+# États clé/valeur des préfixes de prompts déjà calculés (prompts système, exemples few-shot)
+prefix_cache = PrefixCache(
+    max_bytes=int(os.environ.get("UNSLOTH_PREFIX_CACHE_BYTES", "0")) or None,
+    min_tokens=int(os.environ.get("UNSLOTH_PREFIX_CACHE_MIN_TOKENS", "32"))
+)
+
+# Réponses des requêtes d'inférence déterministes (température nulle)
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("UNSLOTH_RESPONSE_CACHE_SIZE", "1024")),
+    db_path=os.environ.get("UNSLOTH_RESPONSE_CACHE_DB") or None
+)
+
+# Modèles d'inférence résidents en mémoire, réutilisés d'une requête à l'autre
+model_pool = ModelPool(
+    max_memory_bytes=int(os.environ.get("UNSLOTH_MODEL_POOL_BYTES", "0")) or None,
+    ttl=float(os.environ.get("UNSLOTH_MODEL_POOL_TTL", "1800")),
+    on_unload=lambda entry: prefix_cache.drop(ModelPool.key(entry["model_path"], entry["options"]))
+)
+
+# Taille maximale des batchs de décodage des moteurs d'inférence transformers
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get("UNSLOTH_INFERENCE_MAX_BATCH", "8"))
+engine_lock = threading.Lock()
+
+# Adaptateurs LoRA servis sur les modèles de base résidents (registre et nombre gardé en mémoire par modèle)
+adapter_registry = AdapterRegistry(os.environ.get("UNSLOTH_QUEUE_DB", "unsloth.db"))
+INFERENCE_MAX_ADAPTERS = int(os.environ.get("UNSLOTH_INFERENCE_MAX_ADAPTERS", "8"))
+
+# Pool dédié aux requêtes d'inférence: file bornée, refus immédiat (429) quand elle est pleine.
+# UNSLOTH_INFERENCE_WORKERS limite les requêtes qui occupent un thread (llama-cpp, flux, décodage
+# spéculatif, lots); les requêtes du moteur à batching continu ne sont limitées que par
+# UNSLOTH_INFERENCE_MAX_BATCH par modèle
+inference_workers = InferenceWorkerPool(
+    max_workers=int(os.environ.get("UNSLOTH_INFERENCE_WORKERS", "4")),
+    max_queue=int(os.environ.get("UNSLOTH_INFERENCE_QUEUE", "32"))
+)
+
+# Regroupement des jobs de fine-tuning partageant un même modèle de base
+adapter_groups = AdapterGroupScheduler(
+    window=float(os.environ.get("UNSLOTH_ADAPTER_GROUP_WINDOW", "5")),
+    max_adapters=int(os.environ.get("UNSLOTH_ADAPTER_GROUP_SIZE", "4"))
+)
+
+# Contrôle d'admission mémoire partagé par les jobs de fine-tuning et d'inférence
+memory_calibrator = MemoryCalibrator()
+admission_controller = AdmissionController()
+
+def _probe_compute_device() -> str:
+    gpu_info = get_gpu_info()
+    return "gpu" if gpu_info["nvidia"]["available"] or gpu_info["amd"]["available"] else "cpu"
+
+# Détecté une seule fois au démarrage: get_gpu_info lance nvidia-smi et rocm-smi
+COMPUTE_DEVICE = _probe_compute_device()
+
+def detect_compute_device() -> str:
+    """Retourne "gpu" si un GPU est disponible, "cpu" sinon"""
+    return COMPUTE_DEVICE
+
+def estimate_finetune_job_memory(config: FineTuningConfig, device: str) -> Dict[str, Any]:
+    """Estime (et calibre) le pic mémoire d'un job de fine-tuning"""
+    estimate = estimate_finetune_memory(
+        config.model_name,
+        config.max_seq_length,
+        config.batch_size,
+        config.lora_r,
+        load_in_4bit=config.load_in_4bit,
+        gradient_accumulation=config.gradient_accumulation,
+        device=device
+    )
+    estimate = memory_calibrator.calibrate(estimate)
+    processes = config.data_parallel_processes
+    if processes > 1:
+        # Chaque processus data-parallel de la machine charge sa propre copie du modèle
+        estimate = dict(estimate, total=estimate["total"] * processes, data_parallel_processes=processes)
+    return estimate
+
+def _mark_waiting_for_memory(record: Dict[str, Any], entry: Dict[str, Any]):
+    """Met à jour l'enregistrement d'une tâche en attente de mémoire"""
+    record["status"] = "queued"
+    record["status_message"] = "En attente de mémoire disponible"
+    record["admission"] = {
+        "estimate": entry["estimate"],
+        "available": entry.get("last_available"),
+        "waiting_seconds": time.time() - entry["queued_at"]
+    }
+    record["updated_at"] = datetime.now().isoformat()
 
 @app.get("/")
 async def root():
@@ -104,41 +321,202 @@ async def upload_dataset(file: UploadFile = File(...)):
 async def start_finetune(config: FineTuningConfig, background_tasks: BackgroundTasks):
     """Endpoint pour démarrer un job de fine-tuning"""
     try:
-        # Générer un ID unique pour le job
-        job_id = str(uuid.uuid4())
-
         # Créer un enregistrement pour le job
-        now = datetime.now().isoformat()
-        jobs[job_id] = {
-            "job_id": job_id,
-            "status": "pending",
-            "progress": 0.0,
-            "config": config.dict(),
-            "metrics": {},
-            "created_at": now,
-            "updated_at": now
-        }
-
-        # Lancer le fine-tuning en arrière-plan
-        background_tasks.add_task(run_finetune_job, job_id, config)
+        job_id = create_finetune_job(config)
+
+        # Lancer le fine-tuning en arrière-plan (ou le confier aux workers)
+        if job_queue is not None:
+            job_queue.enqueue(
+                job_id,
+                "finetune",
+                {"config": config.dict(), "record": jobs[job_id]},
+                config.required_capabilities
+            )
+        else:
+            background_tasks.add_task(run_finetune_job, job_id, config)
 
         return {"job_id": job_id, "status": "pending"}
     except Exception as e:
         logger.error(f"Erreur lors du démarrage du fine-tuning: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def create_finetune_job(config: FineTuningConfig) -> str:
+    """Crée l'enregistrement d'un job de fine-tuning et retourne son identifiant"""
+    job_id = str(uuid.uuid4())
+    now = datetime.now().isoformat()
+    jobs[job_id] = {
+        "job_id": job_id,
+        "status": "pending",
+        "progress": 0.0,
+        "config": config.dict(),
+        "output_dir": config.output_dir or os.path.join("models", "finetuned", job_id),
+        "metrics": {},
+        "created_at": now,
+        "updated_at": now
+    }
+
+    # Conserver la configuration avec les artefacts pour pouvoir reprendre le job après un redémarrage
+    os.makedirs(FINETUNE_JOB_INDEX, exist_ok=True)
+    with open(os.path.join(FINETUNE_JOB_INDEX, f"{job_id}.json"), "w") as f:
+        json.dump({"output_dir": os.path.abspath(jobs[job_id]["output_dir"])}, f)
+    save_finetune_job(job_id)
+
+    return job_id
+
+def save_finetune_job(job_id: str):
+    """Enregistre l'état d'un job de fine-tuning dans job.json, avec ses artefacts"""
+    record = jobs[job_id]
+    try:
+        os.makedirs(record["output_dir"], exist_ok=True)
+        job_file = os.path.join(record["output_dir"], "job.json")
+        # Écriture atomique: un job.json tronqué empêcherait la reprise
+        with open(f"{job_file}.tmp", "w") as f:
+            json.dump({key: value for key, value in record.items() if key != "queue"}, f, indent=2, default=str)
+        os.replace(f"{job_file}.tmp", job_file)
+    except Exception as e:
+        logger.warning(f"Impossible d'enregistrer l'état du job {job_id}: {str(e)}")
+
+def load_finetune_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Relit le job.json d'un job de fine-tuning créé par un processus précédent"""
+    output_dir = os.path.join("models", "finetuned", job_id)
+    index_file = os.path.join(FINETUNE_JOB_INDEX, f"{job_id}.json")
+    if os.path.exists(index_file):
+        with open(index_file, "r") as f:
+            output_dir = json.load(f)["output_dir"]
+
+    job_file = os.path.join(output_dir, "job.json")
+    if not os.path.exists(job_file):
+        return None
+    with open(job_file, "r") as f:
+        return json.load(f)
+
 @app.get("/api/finetune/{job_id}/status")
 async def get_finetune_status(job_id: str):
     """Endpoint pour obtenir le statut d'un job de fine-tuning"""
-    if job_id not in jobs:
+    record = get_task_record(jobs, job_id)
+    if record is None:
         raise HTTPException(status_code=404, detail="Job non trouvé")
 
-    return jobs[job_id]
+    return record
+
+@app.post("/api/finetune/{job_id}/resume")
+async def resume_finetune(job_id: str, background_tasks: BackgroundTasks):
+    """Endpoint pour relancer un job de fine-tuning depuis son dernier checkpoint"""
+    record = get_task_record(jobs, job_id)
+    if record is not None and record.get("status") in ("pending", "queued", "running"):
+        raise HTTPException(status_code=409, detail="Le job est déjà en cours")
+    if record is None:
+        # Après un redémarrage de l'API, relire l'état sauvegardé avec les artefacts: un job
+        # en attente ou en cours dans le processus précédent a été interrompu et peut reprendre
+        record = load_finetune_job(job_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Job non trouvé")
+
+    try:
+        config = FineTuningConfig(**record["config"])
+        record = {key: value for key, value in record.items() if key != "queue"}
+        record.update({
+            "status": "pending",
+            "error": None,
+            "updated_at": datetime.now().isoformat()
+        })
+        jobs[job_id] = record
+        save_finetune_job(job_id)
+
+        if job_queue is not None:
+            if not job_queue.retry(job_id):
+                job_queue.enqueue(job_id, "finetune", {"config": config.dict(), "record": record}, config.required_capabilities)
+        else:
+            background_tasks.add_task(run_finetune_job, job_id, config)
+
+        return {"job_id": job_id, "status": "pending"}
+    except Exception as e:
+        logger.error(f"Erreur lors de la reprise du fine-tuning: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/finetune/{job_id}/profile")
+async def get_finetune_profile(job_id: str):
+    """Endpoint pour obtenir le profil des pas d'entraînement d'un job (config.profile)"""
+    record = get_task_record(jobs, job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job non trouvé")
+    if not record.get("config", {}).get("profile"):
+        raise HTTPException(status_code=400, detail="Le profilage n'est pas activé pour ce job")
+
+    return record.get("profile") or {"profiled_steps": 0, "phases": {}}
+
+@app.post("/api/finetune/{job_id}/stop")
+async def stop_finetune(job_id: str, reason: Optional[str] = None):
+    """Endpoint pour arrêter un job de fine-tuning (l'adaptateur du dernier pas est sauvegardé)"""
+    record = get_task_record(jobs, job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job non trouvé")
+    if record.get("status") not in ("pending", "queued", "running"):
+        raise HTTPException(status_code=409, detail="Le job n'est pas en cours")
+
+    request_finetune_stop(job_id, reason or "requested")
+    return {"job_id": job_id, "stop_requested": True}
+
+def request_finetune_stop(job_id: str, reason: str):
+    """Demande l'arrêt d'un job de fine-tuning après son pas d'optimisation en cours"""
+    if job_queue is not None:
+        job_queue.request_stop(job_id)
+    if job_id in jobs:
+        jobs[job_id]["stop_requested"] = True
+        jobs[job_id]["stop_reason"] = reason
+        jobs[job_id]["updated_at"] = datetime.now().isoformat()
+
+@app.post("/api/finetune/estimate")
+async def estimate_finetune(config: FineTuningConfig):
+    """Endpoint pour estimer le pic mémoire d'un job de fine-tuning"""
+    try:
+        device = detect_compute_device()
+        estimate = estimate_finetune_job_memory(config, device)
+        memory = await admission_controller.sample_memory(device)
+        estimate["free_memory"] = memory["free"]
+        estimate["fits_now"] = memory["free"] is None or estimate["total"] <= memory["free"]
+        return estimate
+    except Exception as e:
+        logger.error(f"Erreur lors de l'estimation mémoire: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/scheduler/status")
+async def get_scheduler_status():
+    """Endpoint pour obtenir l'état du contrôle d'admission mémoire et des groupes d'adaptateurs"""
+    return dict(admission_controller.get_status(), adapter_groups=adapter_groups.get_status())
 
 @app.get("/api/finetune/list")
 async def list_finetune_jobs():
     """Endpoint pour lister tous les jobs de fine-tuning"""
-    return list(jobs.values())
+    return list_task_records(jobs, "finetune")
+
+@app.get("/api/workers")
+async def list_workers():
+    """Endpoint pour lister les workers de la file partagée et l'état de la file"""
+    if job_queue is None:
+        return {"backend": JOB_BACKEND, "workers": [], "queue": {}}
+
+    job_queue.requeue_expired()
+    queue_counts: Dict[str, int] = {}
+    for job in job_queue.list():
+        queue_counts[job["status"]] = queue_counts.get(job["status"], 0) + 1
+
+    return {"backend": JOB_BACKEND, "workers": job_queue.list_workers(), "queue": queue_counts}
+
+@app.get("/api/models/cache")
+async def get_model_cache_status():
+    """Endpoint pour obtenir l'état du cache local des modèles"""
+    return model_cache.get_status()
+
+@app.post("/api/models/cache/prewarm")
+async def prewarm_model_cache(model_names: List[str], background_tasks: BackgroundTasks):
+    """Endpoint pour télécharger à l'avance des modèles dans le cache local"""
+    if not model_names:
+        raise HTTPException(status_code=400, detail="Aucun modèle à pré-charger")
+
+    # Téléchargements bloquants: exécutés dans le pool de threads
+    background_tasks.add_task(model_cache.prewarm, model_names)
+    return {"status": "pending", "models": model_names}
 
 @app.get("/api/hardware/info")
 async def get_hardware_information():
@@ -183,20 +561,24 @@ async def start_preprocessing(
         task_id = str(uuid.uuid4())
 
         # Lancer le prétraitement en arrière-plan
-        background_tasks.add_task(
-            run_preprocessing_task,
+        dispatch_task(
+            "preprocess",
             task_id,
-            file_path,
-            output_path,
-            remove_duplicates,
-            handle_missing,
-            missing_strategy,
-            remove_outliers,
-            outlier_method,
-            filter_by_length,
-            text_column,
-            min_length,
-            max_length
+            run_preprocessing_task,
+            {
+                "file_path": file_path,
+                "output_path": output_path,
+                "remove_duplicates": remove_duplicates,
+                "handle_missing": handle_missing,
+                "missing_strategy": missing_strategy,
+                "remove_outliers": remove_outliers,
+                "outlier_method": outlier_method,
+                "filter_by_length": filter_by_length,
+                "text_column": text_column,
+                "min_length": min_length,
+                "max_length": max_length
+            },
+            background_tasks
         )
 
         return {"task_id": task_id, "status": "preprocessing_started"}
@@ -207,10 +589,11 @@ async def start_preprocessing(
 @app.get("/api/preprocessing/{task_id}/status")
 async def get_preprocessing_status(task_id: str):
     """Endpoint pour obtenir le statut d'une tâche de prétraitement"""
-    if task_id not in preprocessing_tasks:
+    record = get_task_record(preprocessing_tasks, task_id)
+    if record is None:
         raise HTTPException(status_code=404, detail="Tâche de prétraitement non trouvée")
 
-    return preprocessing_tasks[task_id]
+    return record
 
 @app.post("/api/export/model")
 async def export_model(
@@ -226,13 +609,12 @@ async def export_model(
         task_id = str(uuid.uuid4())
 
         # Lancer l'export en arrière-plan
-        background_tasks.add_task(
-            run_export_task,
+        dispatch_task(
+            "export",
             task_id,
-            model_path,
-            model_name,
-            format,
-            quantization
+            run_export_task,
+            {"model_path": model_path, "model_name": model_name, "format": format, "quantization": quantization},
+            background_tasks
         )
 
         return {"task_id": task_id, "status": "export_started"}
@@ -243,10 +625,11 @@ async def export_model(
 @app.get("/api/export/{task_id}/status")
 async def get_export_status(task_id: str):
     """Endpoint pour obtenir le statut d'une tâche d'export"""
-    if task_id not in export_tasks:
+    record = get_task_record(export_tasks, task_id)
+    if record is None:
         raise HTTPException(status_code=404, detail="Tâche d'export non trouvée")
 
-    return export_tasks[task_id]
+    return record
 
 @app.post("/api/evaluate/model")
 async def evaluate_model(
@@ -261,12 +644,12 @@ async def evaluate_model(
         task_id = str(uuid.uuid4())
 
         # Lancer l'évaluation en arrière-plan
-        background_tasks.add_task(
-            run_evaluation_task,
+        dispatch_task(
+            "evaluate",
             task_id,
-            model_path,
-            test_file,
-            metrics
+            run_evaluation_task,
+            {"model_path": model_path, "test_file": test_file, "metrics": metrics},
+            background_tasks
         )
 
         return {"task_id": task_id, "status": "evaluation_started"}
@@ -277,10 +660,295 @@ async def evaluate_model(
 @app.get("/api/evaluate/{task_id}/status")
 async def get_evaluation_status(task_id: str):
     """Endpoint pour obtenir le statut d'une tâche d'évaluation"""
-    if task_id not in evaluation_tasks:
+    record = get_task_record(evaluation_tasks, task_id)
+    if record is None:
         raise HTTPException(status_code=404, detail="Tâche d'évaluation non trouvée")
 
-    return evaluation_tasks[task_id]
+    return record
+
+@app.post("/api/pipeline/start")
+async def start_pipeline(spec: PipelineSpec, background_tasks: BackgroundTasks):
+    """Endpoint pour démarrer un pipeline (prétraitement → fine-tuning → export → évaluation)"""
+    spec_dict = spec.dict()
+    try:
+        pipeline_runner.validate(spec_dict)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        # Créer un ID unique pour le pipeline
+        pipeline_id = str(uuid.uuid4())
+
+        now = datetime.now().isoformat()
+        pipelines[pipeline_id] = {
+            "pipeline_id": pipeline_id,
+            "name": spec.name,
+            "status": "pending",
+            "progress": 0.0,
+            "spec": spec_dict,
+            "created_at": now,
+            "updated_at": now
+        }
+
+        # Lancer le pipeline en arrière-plan
+        background_tasks.add_task(run_pipeline_task, pipeline_id, spec_dict)
+
+        return {"pipeline_id": pipeline_id, "status": "pending"}
+    except Exception as e:
+        logger.error(f"Erreur lors du démarrage du pipeline: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/pipeline/{pipeline_id}/status")
+async def get_pipeline_status(pipeline_id: str):
+    """Endpoint pour obtenir le statut d'un pipeline et de ses étapes"""
+    if pipeline_id not in pipelines:
+        raise HTTPException(status_code=404, detail="Pipeline non trouvé")
+
+    return pipelines[pipeline_id]
+
+@app.get("/api/pipeline/list")
+async def list_pipelines():
+    """Endpoint pour lister tous les pipelines"""
+    return list(pipelines.values())
+
+@app.post("/api/sweep/start")
+async def start_sweep(spec: SweepSpec, background_tasks: BackgroundTasks):
+    """Endpoint pour démarrer une recherche d'hyperparamètres (chaque essai est un job de fine-tuning)"""
+    spec_dict = spec.dict()
+    try:
+        num_trials = len(sweep_engine.validate(spec_dict))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        # Créer un ID unique pour la recherche
+        sweep_id = str(uuid.uuid4())
+
+        now = datetime.now().isoformat()
+        sweeps[sweep_id] = {
+            "sweep_id": sweep_id,
+            "name": spec.name,
+            "status": "pending",
+            "num_trials": num_trials,
+            "spec": spec_dict,
+            "created_at": now,
+            "updated_at": now
+        }
+
+        # Lancer la recherche en arrière-plan
+        background_tasks.add_task(run_sweep_task, sweep_id, spec_dict)
+
+        return {"sweep_id": sweep_id, "status": "pending", "num_trials": num_trials}
+    except Exception as e:
+        logger.error(f"Erreur lors du démarrage de la recherche d'hyperparamètres: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/sweep/{sweep_id}/status")
+async def get_sweep_status(sweep_id: str):
+    """Endpoint pour obtenir le statut d'une recherche d'hyperparamètres et de ses essais"""
+    if sweep_id not in sweeps:
+        raise HTTPException(status_code=404, detail="Recherche non trouvée")
+
+    return sweeps[sweep_id]
+
+@app.get("/api/sweep/list")
+async def list_sweeps():
+    """Endpoint pour lister toutes les recherches d'hyperparamètres"""
+    return list(sweeps.values())
+
+def _load_pooled_model(model_path: str, local_path: str, options: Dict[str, Any], estimate: Dict[str, Any]):
+    """Charge un modèle d'inférence dans le pool (l'estimation mémoire est conservée avec l'instance)"""
+    return model_pool.acquire(
+        model_path,
+        options,
+        estimate["total"],
+        lambda: dict(load_inference_model(local_path, options), estimate=estimate)
+    )
+
+def get_batching_engine(entry: Dict[str, Any]) -> ContinuousBatchingEngine:
+    """Retourne le moteur à batching continu d'un modèle transformers du pool (créé à la première requête)"""
+    with engine_lock:
+        if entry.get("engine") is None:
+            entry["engine"] = ContinuousBatchingEngine(
+                entry["model"],
+                entry["tokenizer"],
+                max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+                name=entry["model_path"],
+                prefix_cache=prefix_cache,
+                cache_key=ModelPool.key(entry["model_path"], entry["options"]),
+                adapters=AdapterManager(entry["model"], max_adapters=INFERENCE_MAX_ADAPTERS)
+            )
+        return entry["engine"]
+
+def generate_text(entry: Dict[str, Any], prompt: str, max_tokens: int, temperature: float, top_p: float) -> str:
+    """Génère la suite d'un prompt avec un modèle du pool"""
+    model = entry["model"]
+    if entry["kind"] == "gguf":
+        cache_key = ModelPool.key(entry["model_path"], entry["options"])
+        restore_gguf_prefix(prefix_cache, cache_key, model, prompt)
+        response = model(prompt, max_tokens=max_tokens, temperature=temperature, top_p=top_p)
+        save_gguf_prefix(prefix_cache, cache_key, model)
+        return response["choices"][0]["text"]
+
+    import torch
+
+    tokenizer = entry["tokenizer"]
+    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+    with torch.no_grad():
+        outputs = model.generate(
+            inputs["input_ids"],
+            max_new_tokens=max_tokens,
+            temperature=temperature,
+            top_p=top_p
+        )
+
+    generated_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
+    return generated_text.replace(prompt, "")
+
+def stream_text(
+    entry: Dict[str, Any],
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    top_p: float,
+    cancel: threading.Event
+) -> Iterator[str]:
+    """Génère la suite d'un prompt morceau par morceau; la génération s'arrête dès que cancel est positionné"""
+    model = entry["model"]
+    if entry["kind"] == "gguf":
+        cache_key = ModelPool.key(entry["model_path"], entry["options"])
+        restore_gguf_prefix(prefix_cache, cache_key, model, prompt)
+        for chunk in model(prompt, max_tokens=max_tokens, temperature=temperature, top_p=top_p, stream=True):
+            if cancel.is_set():
+                break
+            yield chunk["choices"][0]["text"]
+        save_gguf_prefix(prefix_cache, cache_key, model)
+        return
+
+    import torch
+    from transformers import TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList
+
+    class CancelCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return cancel.is_set()
+
+    tokenizer = entry["tokenizer"]
+    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+    # Même échantillonnage que /api/inference: décodage glouton à température nulle
+    generation_kwargs = {"max_new_tokens": max_tokens, "pad_token_id": tokenizer.pad_token_id}
+    if temperature > 0:
+        generation_kwargs.update(do_sample=True, temperature=temperature, top_p=top_p)
+    else:
+        generation_kwargs["do_sample"] = False
+
+    def generate():
+        try:
+            with torch.no_grad():
+                model.generate(
+                    **inputs,
+                    **generation_kwargs,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([CancelCriteria()])
+                )
+        except Exception as e:
+            logger.error(f"Erreur lors de la génération en flux: {str(e)}")
+            # Débloquer le consommateur du streamer
+            streamer.end()
+
+    # generate() alimente le streamer depuis un thread; les morceaux sont lus au fil de l'eau
+    thread = threading.Thread(target=generate, daemon=True)
+    thread.start()
+    try:
+        for text in streamer:
+            if text:
+                yield text
+    finally:
+        cancel.set()
+        thread.join()
+
+def inference_concurrency(model_path: str) -> int:
+    """Nombre de requêtes pouvant utiliser simultanément un modèle du pool"""
+    # Une instance llama-cpp ne peut pas générer pour deux requêtes à la fois;
+    # le moteur transformers décode ensemble jusqu'à INFERENCE_MAX_BATCH_SIZE requêtes
+    return 1 if model_path.endswith(".gguf") else INFERENCE_MAX_BATCH_SIZE
+
+def queue_full_exception(e: QueueFullError) -> HTTPException:
+    """Réponse 429 indiquant au client quand réessayer"""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def request_context_tokens(entry: Dict[str, Any], prompt: Optional[str], max_tokens: Optional[int]) -> Optional[int]:
+    """Tokens du prompt et de la réponse d'une requête (None si inconnus: contexte complet)"""
+    if prompt is None or max_tokens is None:
+        return None
+    if entry["kind"] == "gguf":
+        prompt_tokens = len(entry["model"].tokenize(prompt.encode("utf-8")))
+    else:
+        prompt_tokens = len(entry["tokenizer"](prompt)["input_ids"])
+    return prompt_tokens + max_tokens
+
+async def acquire_inference_model(
+    request_id: str,
+    model_path: str,
+    prompt: Optional[str] = None,
+    max_tokens: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Obtient le modèle du pool (en le chargeant si nécessaire) après admission mémoire
+
+    Une fois le modèle résident, la réservation de la requête se limite à son cache clé/valeur,
+    dimensionné d'après le prompt et max_tokens (contexte complet sans prompt, ex: tâches par lots).
+    """
+    lease = {"entry": None, "cached_model": None, "tracker": None, "estimate": None}
+    device = "cpu" if model_path.endswith(".gguf") else detect_compute_device()
+    lease["device"] = device
+    options = inference_load_options(model_path)
+    loop = asyncio.get_running_loop()
+    try:
+        entry = model_pool.acquire_resident(model_path, options)
+        if entry is not None:
+            lease["entry"] = entry
+            # Modèle déjà résident (poids et surcoût du framework visibles): seul le cache clé/valeur est réservé
+            context_tokens = request_context_tokens(entry, prompt, max_tokens)
+            await admission_controller.acquire(request_id, estimate_request_kv_cache(entry["estimate"], context_tokens), device)
+            return lease
+
+        # Résoudre le modèle via le cache local (les modèles du Hub ne sont téléchargés qu'une fois)
+        local_path = await loop.run_in_executor(None, model_cache.acquire, model_path)
+        lease["cached_model"] = model_path
+
+        # Attendre que la mémoire nécessaire au chargement soit disponible
+        estimate = memory_calibrator.calibrate(estimate_inference_memory(local_path, device=device))
+        lease["estimate"] = estimate
+        await admission_controller.acquire(request_id, estimate["total"], device)
+        lease["tracker"] = PeakMemoryTracker(device)
+        lease["tracker"].start()
+
+        # Charger le modèle (une seule fois pour toutes les requêtes suivantes)
+        lease["entry"] = await inference_workers.run(_load_pooled_model, model_path, local_path, options, estimate)
+        # Poids chargés: ils apparaissent dans la mémoire libre mesurée
+        context_tokens = request_context_tokens(lease["entry"], prompt, max_tokens)
+        admission_controller.resize(request_id, estimate_request_kv_cache(estimate, context_tokens))
+        return lease
+    except Exception:
+        release_inference_model(request_id, model_path, lease, success=False)
+        raise
+
+def release_inference_model(request_id: str, model_path: str, lease: Dict[str, Any], success: bool = True):
+    """Libère la réservation mémoire et rend le modèle au pool (calibration si le modèle a été chargé)"""
+    if lease["tracker"] is not None:
+        peak = lease["tracker"].stop()
+        lease["tracker"] = None
+        if success:
+            memory_calibrator.record("inference", model_path, lease["estimate"]["raw_total"], peak, lease["device"])
+    admission_controller.release(request_id)
+    if lease["entry"] is not None:
+        model_pool.release(lease["entry"])
+        lease["entry"] = None
+    if lease["cached_model"] is not None:
+        model_cache.release(lease["cached_model"])
+        lease["cached_model"] = None
 
 @app.post("/api/inference")
 async def run_inference(
@@ -288,56 +956,379 @@ async def run_inference(
     prompt: str = Form(...),
     max_tokens: int = Form(100),
     temperature: float = Form(0.7),
-    top_p: float = Form(0.9)
+    top_p: float = Form(0.9),
+    draft_model_path: Optional[str] = Form(None),
+    num_draft_tokens: int = Form(DEFAULT_DRAFT_TOKENS),
+    adapter: Optional[str] = Form(None)
 ):
-    """Endpoint pour exécuter l'inférence sur un modèle"""
+    """
+    Endpoint pour exécuter l'inférence sur un modèle
+
+    draft_model_path active le décodage spéculatif; adapter applique un adaptateur LoRA
+    du registre au modèle de base résident.
+    """
+    if draft_model_path and (model_path.endswith(".gguf") or draft_model_path.endswith(".gguf")):
+        raise HTTPException(status_code=400, detail="Le décodage spéculatif n'est disponible que pour les modèles transformers")
+    adapter_entry = None
+    if adapter:
+        if model_path.endswith(".gguf") or draft_model_path:
+            raise HTTPException(status_code=400, detail="Les adaptateurs LoRA ne sont servis que par le moteur transformers, sans décodage spéculatif")
+        adapter_entry = adapter_registry.get(adapter)
+        if adapter_entry is None:
+            raise HTTPException(status_code=404, detail=f"Adaptateur non enregistré: {adapter}")
     try:
-        # Charger le modèle
-        if model_path.endswith(".gguf"):
-            # Utiliser llama-cpp-python pour les modèles GGUF
-            try:
-                from llama_cpp import Llama
-            except ImportError:
-                subprocess.run([sys.executable, "-m", "pip", "install", "llama-cpp-python"], check=True)
-                from llama_cpp import Llama
-
-            model = Llama(model_path=model_path, n_ctx=2048)
-            response = model(prompt, max_tokens=max_tokens, temperature=temperature, top_p=top_p)
-            generated_text = response["choices"][0]["text"]
-        else:
-            # Utiliser Hugging Face pour les autres modèles
-            try:
-                from transformers import AutoModelForCausalLM, AutoTokenizer
-                import torch
-            except ImportError:
-                subprocess.run([sys.executable, "-m", "pip", "install", "transformers", "torch"], check=True)
-                from transformers import AutoModelForCausalLM, AutoTokenizer
-                import torch
-
-            model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.float16, device_map="auto")
-            tokenizer = AutoTokenizer.from_pretrained(model_path)
-
-            inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-            with torch.no_grad():
-                outputs = model.generate(
-                    inputs["input_ids"],
-                    max_new_tokens=max_tokens,
+        generate = lambda: generate_response(
+            model_path, prompt, max_tokens, temperature, top_p, draft_model_path, num_draft_tokens, adapter_entry
+        )
+        if not is_deterministic(temperature):
+            return await generate()
+
+        # Réponse déterministe: servie depuis le cache, ou partagée avec une requête identique en cours
+        loop = asyncio.get_running_loop()
+        local_path = await loop.run_in_executor(None, model_cache.resolve, model_path)
+        fingerprint = await loop.run_in_executor(None, model_fingerprint, local_path)
+        params = {"max_tokens": max_tokens, "temperature": 0.0}
+        if draft_model_path:
+            # Même texte qu'en décodage classique, mais les métriques de la réponse diffèrent
+            params["draft_model_path"] = draft_model_path
+        if adapter_entry is not None:
+            params["adapter"] = await loop.run_in_executor(None, model_fingerprint, adapter_entry["adapter_path"])
+        key = ResponseCache.make_key(fingerprint, prompt, params)
+        response, origin = await response_cache.get_or_generate(key, generate)
+        return dict(response, response_cache=origin)
+    except QueueFullError as e:
+        logger.warning(f"Requête d'inférence refusée: {str(e)}")
+        raise queue_full_exception(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur lors de l'inférence: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def generate_response(
+    model_path: str,
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    top_p: float,
+    draft_model_path: Optional[str] = None,
+    num_draft_tokens: int = DEFAULT_DRAFT_TOKENS,
+    adapter: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Génère la réponse d'une requête d'inférence avec le modèle du pool (et l'adaptateur LoRA demandé)"""
+    request_id = str(uuid.uuid4())
+    lease = None
+    draft_lease = None
+    success = False
+    # Le moteur à batching continu génère dans son propre thread: la requête n'occupe pas de thread du pool
+    uses_engine = not draft_model_path and not model_path.endswith(".gguf")
+    async with inference_workers.slot(model_path, inference_concurrency(model_path), needs_worker=not uses_engine):
+        try:
+            lease = await acquire_inference_model(request_id, model_path, prompt, max_tokens)
+            entry = lease["entry"]
+            if draft_model_path:
+                # Décodage spéculatif: le modèle brouillon propose, le modèle cible vérifie par blocs
+                draft_lease = await acquire_inference_model(f"{request_id}-draft", draft_model_path, prompt, max_tokens)
+                draft_entry = draft_lease["entry"]
+                result = await inference_workers.run(lambda: speculative_generate(
+                    entry["model"],
+                    draft_entry["model"],
+                    entry["tokenizer"],
+                    prompt,
+                    max_tokens=max_tokens,
                     temperature=temperature,
-                    top_p=top_p
-                )
+                    top_p=top_p,
+                    num_draft_tokens=num_draft_tokens,
+                    draft_tokenizer=draft_entry["tokenizer"]
+                ))
+                generated_text = result.pop("generated_text")
+                metrics = dict(result, draft_model_path=draft_model_path)
+            elif entry["kind"] == "transformers":
+                # Les requêtes concurrentes sur le même modèle sont décodées ensemble
+                engine = get_batching_engine(entry)
+                result = await asyncio.wrap_future(engine.submit(prompt, max_tokens, temperature, top_p, adapter=adapter))
+                generated_text = result["generated_text"]
+                metrics = {k: result[k] for k in ("adapter", "tokens", "cached_tokens", "queue_wait", "time_to_first_token", "latency")}
+            else:
+                # La génération llama-cpp est bloquante: elle s'exécute hors de la boucle d'événements
+                generated_text = await inference_workers.run(generate_text, entry, prompt, max_tokens, temperature, top_p)
+                metrics = None
+            success = True
+
+            return {
+                "prompt": prompt,
+                "generated_text": generated_text,
+                "model_path": model_path,
+                "metrics": metrics
+            }
+        finally:
+            if draft_lease is not None:
+                release_inference_model(f"{request_id}-draft", draft_model_path, draft_lease, success)
+            if lease is not None:
+                release_inference_model(request_id, model_path, lease, success)
+
+def _sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Formate un événement Server-Sent Events"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/inference/stream")
+async def stream_inference(
+    request: Request,
+    model_path: str = Form(...),
+    prompt: str = Form(...),
+    max_tokens: int = Form(100),
+    temperature: float = Form(0.7),
+    top_p: float = Form(0.9),
+    draft_model_path: Optional[str] = Form(None),
+    adapter: Optional[str] = Form(None)
+):
+    """Endpoint pour exécuter l'inférence en flux (Server-Sent Events): les tokens sont envoyés dès leur génération"""
+    # Le flux lit le modèle de base directement: refuser plutôt qu'ignorer ces options de /api/inference
+    if draft_model_path:
+        raise HTTPException(status_code=400, detail="Le décodage spéculatif n'est pas disponible en flux: utiliser /api/inference")
+    if adapter:
+        raise HTTPException(status_code=400, detail="Les adaptateurs LoRA ne sont pas servis en flux: utiliser /api/inference")
+    request_id = str(uuid.uuid4())
+    # La place dans le pool d'inférence est conservée jusqu'à la fin du flux
+    slot = AsyncExitStack()
+    try:
+        await slot.enter_async_context(inference_workers.slot(model_path, inference_concurrency(model_path)))
+        lease = await acquire_inference_model(request_id, model_path, prompt, max_tokens)
+    except QueueFullError as e:
+        logger.warning(f"Requête d'inférence refusée: {str(e)}")
+        raise queue_full_exception(e)
+    except Exception as e:
+        await slot.aclose()
+        logger.error(f"Erreur lors de l'inférence: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-            generated_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-            generated_text = generated_text.replace(prompt, "")
+    async def events():
+        loop = asyncio.get_running_loop()
+        cancel = threading.Event()
+        chunks = stream_text(lease["entry"], prompt, max_tokens, temperature, top_p, cancel)
+        chunks_lock = threading.Lock()
+        start = time.perf_counter()
+        first_token_at = None
+        parts = []
+        success = False
+
+        def next_chunk() -> Optional[str]:
+            with chunks_lock:
+                return next(chunks, None)
+
+        def finish():
+            # Arrête la génération, attend la fin du morceau en cours, puis libère le modèle
+            cancel.set()
+            with chunks_lock:
+                chunks.close()
+            release_inference_model(request_id, model_path, lease, success)
 
-        return {
-            "prompt": prompt,
-            "generated_text": generated_text,
-            "model_path": model_path
-        }
+        try:
+            while True:
+                # Chaque morceau est produit hors de la boucle d'événements
+                text = await inference_workers.run(next_chunk)
+                if text is None:
+                    break
+                if await request.is_disconnected():
+                    logger.info(f"Client déconnecté, arrêt de la génération {request_id}")
+                    break
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(text)
+                yield _sse_event({"text": text})
+
+            elapsed = time.perf_counter() - start
+            success = True
+            yield _sse_event({
+                "prompt": prompt,
+                "generated_text": "".join(parts),
+                "model_path": model_path,
+                "chunks": len(parts),
+                "time_to_first_token": first_token_at - start if first_token_at is not None else None,
+                "elapsed": elapsed
+            }, event="done")
+        except Exception as e:
+            logger.error(f"Erreur lors de l'inférence en flux: {str(e)}")
+            yield _sse_event({"error": str(e)}, event="error")
+        finally:
+            # Exécuté même si le client se déconnecte pendant l'envoi (la tâche continue hors de la boucle)
+            await loop.run_in_executor(None, finish)
+            await slot.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/inference/batch")
+async def start_batch_inference(
+    model_path: str = Form(...),
+    input_file: str = Form(...),
+    output_path: Optional[str] = Form(None),
+    prompt_column: Optional[str] = Form(None),
+    max_tokens: int = Form(100),
+    temperature: float = Form(0.7),
+    top_p: float = Form(0.9),
+    batch_size: int = Form(8),
+    draft_model_path: Optional[str] = Form(None),
+    num_draft_tokens: int = Form(DEFAULT_DRAFT_TOKENS),
+    background_tasks: BackgroundTasks = None
+):
+    """Endpoint pour lancer une inférence par lots sur un fichier de prompts (CSV ou JSONL)"""
+    if not os.path.exists(input_file):
+        raise HTTPException(status_code=400, detail=f"Fichier de prompts introuvable: {input_file}")
+    if draft_model_path and (model_path.endswith(".gguf") or draft_model_path.endswith(".gguf")):
+        raise HTTPException(status_code=400, detail="Le décodage spéculatif n'est disponible que pour les modèles transformers")
+    try:
+        # Créer un ID unique pour la tâche
+        task_id = str(uuid.uuid4())
+
+        # Un output_path existant est complété: les prompts déjà traités sont ignorés
+        output_path = output_path or os.path.join("outputs", "batch_inference", f"{task_id}.jsonl")
+
+        # Lancer l'inférence par lots en arrière-plan
+        dispatch_task(
+            "batch_inference",
+            task_id,
+            run_batch_inference_task,
+            {
+                "model_path": model_path,
+                "input_file": input_file,
+                "output_path": output_path,
+                "prompt_column": prompt_column,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "top_p": top_p,
+                "batch_size": batch_size,
+                "draft_model_path": draft_model_path,
+                "num_draft_tokens": num_draft_tokens
+            },
+            background_tasks
+        )
+
+        return {"task_id": task_id, "status": "batch_inference_started", "output_path": output_path}
     except Exception as e:
-        logger.error(f"Erreur lors de l'inférence: {str(e)}")
+        logger.error(f"Erreur lors du démarrage de l'inférence par lots: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/inference/batch/{task_id}/status")
+async def get_batch_inference_status(task_id: str):
+    """Endpoint pour obtenir le statut d'une inférence par lots"""
+    record = get_task_record(batch_inference_tasks, task_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Tâche d'inférence par lots non trouvée")
+
+    return record
+
+@app.post("/api/inference/batch/{task_id}/stop")
+async def stop_batch_inference(task_id: str):
+    """Endpoint pour arrêter une inférence par lots après son batch en cours (reprise en la relançant avec le même output_path)"""
+    record = get_task_record(batch_inference_tasks, task_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Tâche d'inférence par lots non trouvée")
+    if record.get("status") not in ("running", "queued", "pending"):
+        raise HTTPException(status_code=409, detail="La tâche n'est pas en cours")
+
+    if job_queue is not None:
+        job_queue.request_stop(task_id)
+    if task_id in batch_inference_tasks:
+        batch_inference_tasks[task_id]["stop_requested"] = True
+        batch_inference_tasks[task_id]["updated_at"] = datetime.now().isoformat()
+    return {"task_id": task_id, "stop_requested": True}
+
+@app.get("/api/inference/batch/list")
+async def list_batch_inference_tasks():
+    """Endpoint pour lister les inférences par lots"""
+    return list_task_records(batch_inference_tasks, "batch_inference")
+
+@app.get("/api/inference/models")
+async def get_inference_models():
+    """Endpoint pour obtenir l'état du pool des modèles d'inférence résidents"""
+    return model_pool.get_status()
+
+@app.get("/api/inference/queue")
+async def get_inference_queue_status():
+    """Endpoint pour consulter la file du pool d'inférence (profondeur, requêtes en cours, temps d'attente, refus)"""
+    return inference_workers.get_status()
+
+@app.post("/api/inference/adapters/register")
+async def register_inference_adapter(
+    name: str = Form(...),
+    adapter_path: str = Form(...),
+    base_model: Optional[str] = Form(None)
+):
+    """Endpoint pour enregistrer un adaptateur LoRA servi sur son modèle de base résident"""
+    try:
+        return adapter_registry.register(name, adapter_path, base_model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/inference/adapters")
+async def list_inference_adapters():
+    """Endpoint pour lister les adaptateurs enregistrés et ceux attachés aux modèles résidents"""
+    resident = [
+        {"model_path": m["model_path"], **m["engine"]["adapters"]}
+        for m in model_pool.get_status()["models"]
+        if m["engine"] is not None and m["engine"]["adapters"] is not None
+    ]
+    return {"adapters": adapter_registry.list(), "resident": resident}
+
+@app.delete("/api/inference/adapters/{name}")
+async def remove_inference_adapter(name: str):
+    """Endpoint pour retirer un adaptateur du registre (il est détaché des modèles résidents par LRU)"""
+    if not adapter_registry.remove(name):
+        raise HTTPException(status_code=404, detail=f"Adaptateur non enregistré: {name}")
+    return {"name": name, "status": "removed"}
+
+@app.get("/api/inference/response-cache")
+async def get_response_cache_status():
+    """Endpoint pour obtenir l'état du cache des réponses déterministes"""
+    return response_cache.get_status()
+
+@app.get("/api/inference/prefix-cache")
+async def get_prefix_cache_status():
+    """Endpoint pour obtenir l'état du cache des préfixes de prompts (taux de succès, tokens réutilisés)"""
+    return prefix_cache.get_status()
+
+@app.post("/api/inference/models/preload")
+async def preload_inference_model(model_path: str = Form(...)):
+    """Endpoint pour charger un modèle dans le pool avant les premières requêtes"""
+    request_id = str(uuid.uuid4())
+    options = inference_load_options(model_path)
+    entry = model_pool.acquire_resident(model_path, options)
+    if entry is not None:
+        model_pool.release(entry)
+        return {"model_path": model_path, "status": "resident"}
+
+    device = "cpu" if model_path.endswith(".gguf") else detect_compute_device()
+    loop = asyncio.get_running_loop()
+    try:
+        local_path = await loop.run_in_executor(None, model_cache.acquire, model_path)
+        try:
+            estimate = memory_calibrator.calibrate(estimate_inference_memory(local_path, device=device))
+            await admission_controller.acquire(request_id, estimate["total"], device)
+            entry = await inference_workers.run(_load_pooled_model, model_path, local_path, options, estimate)
+            model_pool.release(entry)
+        finally:
+            admission_controller.release(request_id)
+            model_cache.release(model_path)
+        return {"model_path": model_path, "status": "loaded", "load_seconds": entry["load_seconds"]}
+    except Exception as e:
+        logger.error(f"Erreur lors du pré-chargement du modèle {model_path}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/inference/models/unload")
+async def unload_inference_model(model_path: str = Form(...)):
+    """Endpoint pour décharger un modèle du pool"""
+    result = model_pool.unload(model_path)
+    if not result["unloaded"] and not result["busy"]:
+        raise HTTPException(status_code=404, detail="Modèle non chargé")
+    if result["busy"]:
+        raise HTTPException(status_code=409, detail="Modèle en cours d'utilisation")
+    return {"model_path": model_path, "status": "unloaded"}
+
 # Fonction pour installer Unsloth en arrière-plan
 async def run_unsloth_installation():
     """Fonction qui installe Unsloth et ses dépendances"""
@@ -467,6 +1458,7 @@ async def run_export_task(
     quantization: Optional[str]
 ):
     """Fonction qui exécute l'export de modèle"""
+    cached_model = None
     try:
         # Initialiser la tâche
         export_tasks[task_id] = {
@@ -480,8 +1472,9 @@ async def run_export_task(
             "updated_at": datetime.now().isoformat()
         }
 
-        # Créer l'exportateur
-        exporter = ModelExporter(model_path)
+        # Créer l'exportateur à partir de la copie locale du modèle
+        exporter = ModelExporter(model_cache.acquire(model_path))
+        cached_model = model_path
 
         # Exporter le modèle
         export_tasks[task_id]["progress"] = 0.5
@@ -509,6 +1502,93 @@ async def run_export_task(
         export_tasks[task_id]["status"] = "failed"
         export_tasks[task_id]["error"] = str(e)
         export_tasks[task_id]["updated_at"] = datetime.now().isoformat()
+    finally:
+        if cached_model is not None:
+            model_cache.release(cached_model)
+
+# Fonction pour exécuter l'inférence par lots en arrière-plan
+async def run_batch_inference_task(
+    task_id: str,
+    model_path: str,
+    input_file: str,
+    output_path: str,
+    prompt_column: Optional[str],
+    max_tokens: int,
+    temperature: float,
+    top_p: float,
+    batch_size: int,
+    draft_model_path: Optional[str] = None,
+    num_draft_tokens: int = DEFAULT_DRAFT_TOKENS
+):
+    """Fonction qui exécute l'inférence sur tous les prompts d'un fichier, modèle chargé une seule fois"""
+    lease = None
+    draft_lease = None
+    success = False
+    slot = AsyncExitStack()
+    try:
+        # Initialiser la tâche
+        batch_inference_tasks[task_id] = {
+            "task_id": task_id,
+            "status": "running",
+            "progress": 0.0,
+            "model_path": model_path,
+            "input_file": input_file,
+            "output_path": output_path,
+            "created_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat()
+        }
+        record = batch_inference_tasks[task_id]
+
+        # Les tâches par lots attendent leur tour dans le pool d'inférence au lieu d'être refusées
+        record["status_message"] = "En attente du pool d'inférence"
+        await slot.enter_async_context(inference_workers.slot(model_path, inference_concurrency(model_path), block=True))
+        record["status_message"] = "Chargement du modèle"
+        lease = await acquire_inference_model(task_id, model_path)
+        if draft_model_path:
+            draft_lease = await acquire_inference_model(f"{task_id}-draft", draft_model_path)
+
+        def on_progress(stats: Dict[str, Any]):
+            record["progress"] = (stats["skipped"] + stats["generated"]) / stats["total"] if stats["total"] else 1.0
+            record["stats"] = stats
+            record["status_message"] = f"{stats['skipped'] + stats['generated']}/{stats['total']} prompts"
+            record["updated_at"] = datetime.now().isoformat()
+
+        record["status_message"] = "Génération en cours"
+        record["updated_at"] = datetime.now().isoformat()
+        stats = await inference_workers.run(lambda: run_batch_inference(
+            lease["entry"],
+            input_file,
+            output_path,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            batch_size=batch_size,
+            prompt_column=prompt_column,
+            on_progress=on_progress,
+            should_stop=lambda: bool(record.get("stop_requested")),
+            draft_entry=draft_lease["entry"] if draft_lease is not None else None,
+            num_draft_tokens=num_draft_tokens
+        ))
+        success = True
+
+        # Marquer comme terminé
+        record["status"] = "stopped" if stats["stopped"] else "completed"
+        record["progress"] = 1.0 if not stats["stopped"] else record["progress"]
+        record["stats"] = stats
+        record["status_message"] = None
+        record["updated_at"] = datetime.now().isoformat()
+
+    except Exception as e:
+        logger.error(f"Erreur lors de l'inférence par lots: {str(e)}")
+        batch_inference_tasks[task_id]["status"] = "failed"
+        batch_inference_tasks[task_id]["error"] = str(e)
+        batch_inference_tasks[task_id]["updated_at"] = datetime.now().isoformat()
+    finally:
+        if draft_lease is not None:
+            release_inference_model(f"{task_id}-draft", draft_model_path, draft_lease, success)
+        if lease is not None:
+            release_inference_model(task_id, model_path, lease, success)
+        await slot.aclose()
 
 # Fonction pour exécuter l'évaluation de modèle en arrière-plan
 async def run_evaluation_task(
@@ -518,6 +1598,7 @@ async def run_evaluation_task(
     metrics: List[str]
 ):
     """Fonction qui exécute l'évaluation de modèle"""
+    cached_model = None
     try:
         # Initialiser la tâche
         evaluation_tasks[task_id] = {
@@ -531,8 +1612,10 @@ async def run_evaluation_task(
             "updated_at": datetime.now().isoformat()
         }
 
-        # Créer l'évaluateur
-        evaluator = ModelEvaluator(model_path)
+        # Créer l'évaluateur à partir de la copie locale du modèle; les réponses générées sont partagées par
+        # les métriques et conservées sous evaluation_results/generations (relance sans régénération)
+        evaluator = ModelEvaluator(model_cache.acquire(model_path))
+        cached_model = model_path
 
         # Charger le modèle
         evaluation_tasks[task_id]["progress"] = 0.1
@@ -589,85 +1672,309 @@ async def run_evaluation_task(
         evaluation_tasks[task_id]["status"] = "failed"
         evaluation_tasks[task_id]["error"] = str(e)
         evaluation_tasks[task_id]["updated_at"] = datetime.now().isoformat()
+    finally:
+        if cached_model is not None:
+            model_cache.release(cached_model)
+
+def _load_finetune_model(config: FineTuningConfig):
+    """Charge le modèle de base (via le cache local) avec son adaptateur LoRA initial"""
+    try:
+        model_source = model_cache.acquire(config.model_name)
+        return load_model_for_training(dict(config.dict(), model_name=model_source))
+    finally:
+        # Les poids sont chargés en mémoire: la copie locale peut de nouveau être évincée
+        model_cache.release(config.model_name)
+
+def prepare_finetune_trainer(
+    job_id: str,
+    config: FineTuningConfig,
+    model,
+    tokenizer,
+    adapter_name: Optional[str] = None,
+    admission_id: Optional[str] = None
+) -> FineTuningTrainer:
+    """Construit le trainer d'un job (taille de batch, checkpoints, profilage, suivi du statut)"""
+    record = jobs[job_id]
+    training_config = config.dict()
+    if config.auto_batch_size:
+        # À la reprise, conserver les valeurs choisies: la position des checkpoints et le nombre de pas en dépendent
+        if not record.get("batch_tuning"):
+            record["status_message"] = "Recherche de la taille de batch"
+            record["updated_at"] = datetime.now().isoformat()
+            record["batch_tuning"] = tune_batch_size(
+                model,
+                tokenizer,
+                training_config,
+                config.effective_batch_size or config.batch_size * config.gradient_accumulation,
+                max_batch_size=config.auto_batch_max,
+                safety_margin=config.auto_batch_safety_margin
+            )
+        training_config["batch_size"] = record["batch_tuning"]["batch_size"]
+        training_config["gradient_accumulation"] = record["batch_tuning"]["gradient_accumulation"]
+        logger.info(
+            f"Job {job_id}: micro-batch {training_config['batch_size']}, "
+            f"accumulation {training_config['gradient_accumulation']}"
+        )
+
+    def on_step(metrics: Dict[str, Any]):
+        if metrics["step"] == 1:
+            # Le pic mémoire du premier pas est désormais visible dans la mémoire libre
+            admission_controller.mark_steady(admission_id or job_id)
+        record["progress"] = metrics["step"] / metrics["total_steps"]
+        record["metrics"] = metrics
+        record["status_message"] = f"Pas {metrics['step']}/{metrics['total_steps']}"
+        if profiler is not None:
+            record["profile"] = profiler.summary()
+        record["updated_at"] = datetime.now().isoformat()
+
+    def on_evaluate(evaluation: Dict[str, Any]):
+        record.setdefault("eval_history", []).append(evaluation)
+
+    checkpoint_manager = CheckpointManager(
+        os.path.join(record["output_dir"], "checkpoints"),
+        keep_last_n=config.checkpoint_keep_last
+    )
+    profiler = None
+    if config.profile:
+        profiler = TrainingProfiler(
+            config.profile_every_n_steps,
+            trace_path=os.path.join(record["output_dir"], "profile_trace.json"),
+            device="gpu" if next(model.parameters()).is_cuda else "cpu"
+        )
+    record["eval_history"] = []
+    return FineTuningTrainer(
+        model,
+        tokenizer,
+        training_config,
+        on_step=on_step,
+        on_evaluate=on_evaluate,
+        should_stop=lambda: bool(record.get("stop_requested")),
+        checkpoint_manager=checkpoint_manager,
+        profiler=profiler,
+        adapter_name=adapter_name
+    )
+
+def finalize_finetune_job(job_id: str, trainer: FineTuningTrainer, model, tokenizer, adapter_name: Optional[str] = None):
+    """Enregistre les résultats de l'entraînement et sauvegarde l'adaptateur LoRA et le tokenizer"""
+    record = jobs[job_id]
+    record["metrics"] = trainer.final_metrics
+    record["resumed_from"] = trainer.resumed_from
+    if record["metrics"]["stop_reason"] == "early_stopping":
+        record["stop_reason"] = "early_stopping"
+    elif record["metrics"]["stopped_early"]:
+        record["stop_reason"] = record.get("stop_reason") or "requested"
+    if trainer.best_step is not None:
+        record["best_val_loss"] = trainer.best_val_loss
+        record["best_step"] = trainer.best_step
+    if trainer.profiler is not None:
+        record["profile"] = trainer.profiler.summary()
+    if record.get("stop_reason") == "lease_lost":
+        # Un autre worker a repris le job: ne pas écraser ses sorties
+        raise Exception("Bail perdu: le job a été repris par un autre worker")
+
+    save_adapter(model, tokenizer, record["output_dir"], adapter_name)
+    record["model_path"] = record["output_dir"]
+    try:
+        # L'adaptateur est servi sous l'identifiant du job (paramètre adapter de /api/inference)
+        adapter_registry.register(job_id, record["output_dir"])
+    except Exception as e:
+        logger.warning(f"Adaptateur du job {job_id} non enregistré pour l'inférence: {str(e)}")
+    record["status_message"] = None
+
+def execute_finetune_training(job_id: str, config: FineTuningConfig):
+    """Charge le modèle, entraîne les adaptateurs LoRA sur le jeu de données et les sauvegarde"""
+    record = jobs[job_id]
+    if not config.dataset_path:
+        raise ValueError("dataset_path est requis pour lancer un fine-tuning")
+
+    record["status_message"] = "Chargement du modèle"
+    record["updated_at"] = datetime.now().isoformat()
+    if config.data_parallel_processes > 1 or config.data_parallel_nodes > 1:
+        execute_data_parallel_training(job_id, config)
+        return
+
+    model, tokenizer, backend = _load_finetune_model(config)
+    record["backend"] = backend
+
+    trainer = prepare_finetune_trainer(job_id, config, model, tokenizer)
+    trainer.train()
+    finalize_finetune_job(job_id, trainer, model, tokenizer)
+
+def _single_process_throughput(config: FineTuningConfig) -> Optional[float]:
+    """Débit du dernier job comparable terminé dans un seul processus (référence du speedup)"""
+    for other in sorted(jobs.values(), key=lambda j: j["updated_at"], reverse=True):
+        other_config = other.get("config") or {}
+        if (
+            other["status"] == "completed"
+            and not other.get("data_parallel")
+            and other_config.get("model_name") == config.model_name
+            and other_config.get("max_seq_length") == config.max_seq_length
+            and other_config.get("batch_size") == config.batch_size
+            and (other.get("metrics") or {}).get("average_tokens_per_sec")
+        ):
+            return other["metrics"]["average_tokens_per_sec"]
+    return None
+
+def execute_data_parallel_training(job_id: str, config: FineTuningConfig):
+    """Entraîne l'adaptateur LoRA avec plusieurs processus CPU qui se partagent le jeu de données"""
+    record = jobs[job_id]
+    processes = max(1, config.data_parallel_processes)
+    world_size = processes * max(1, config.data_parallel_nodes)
+    training_config = config.dict()
+    if config.auto_batch_size:
+        logger.warning(f"Job {job_id}: auto_batch_size ignoré en data-parallel, micro-batch {config.batch_size} par processus")
+
+    record["status_message"] = "Lancement des processus data-parallel"
+    record["updated_at"] = datetime.now().isoformat()
+    job = {
+        "job_id": job_id,
+        "config": training_config,
+        "model_source": model_cache.acquire(config.model_name),
+        "output_dir": record["output_dir"],
+        "processes_per_node": processes,
+        "world_size": world_size,
+        "master_addr": config.data_parallel_master_addr,
+        "master_port": config.data_parallel_master_port,
+        "threads_per_process": threads_per_process(processes)
+    }
+    record["data_parallel"] = {
+        "processes": processes,
+        "nodes": config.data_parallel_nodes,
+        "world_size": world_size,
+        "threads_per_process": job["threads_per_process"],
+        "job_file": write_job_file(job)
+    }
+    record["eval_history"] = []
+
+    def on_message(message: tuple):
+        if message[0] == "step":
+            metrics = message[1]
+            if metrics["step"] == 1:
+                admission_controller.mark_steady(job_id)
+            record["progress"] = metrics["step"] / metrics["total_steps"]
+            record["metrics"] = metrics
+            record["status_message"] = f"Pas {metrics['step']}/{metrics['total_steps']}"
+            if message[2] is not None:
+                record["profile"] = message[2]
+            record["updated_at"] = datetime.now().isoformat()
+        elif message[0] == "evaluate":
+            record["eval_history"].append(message[1])
+
+    try:
+        result = run_data_parallel(job, on_message=on_message, should_stop=lambda: bool(record.get("stop_requested")))
+    finally:
+        model_cache.release(config.model_name)
+
+    if record.get("stop_reason") == "lease_lost":
+        raise Exception("Bail perdu: le job a été repris par un autre worker")
+
+    metrics = result["metrics"]
+    record["backend"] = result["backend"]
+    record["metrics"] = metrics
+    record["resumed_from"] = result["resumed_from"]
+    if metrics["stop_reason"] == "early_stopping":
+        record["stop_reason"] = "early_stopping"
+    elif metrics["stopped_early"]:
+        record["stop_reason"] = record.get("stop_reason") or "requested"
+    if result["best_step"] is not None:
+        record["best_val_loss"] = result["best_val_loss"]
+        record["best_step"] = result["best_step"]
+    if result["profile"] is not None:
+        record["profile"] = result["profile"]
+
+    # Passage à l'échelle: débit global, par processus, et part du temps passée dans l'all-reduce
+    tokens_per_sec = metrics["average_tokens_per_sec"]
+    baseline = _single_process_throughput(config)
+    record["data_parallel"].update({
+        "tokens_per_sec": tokens_per_sec,
+        "tokens_per_sec_per_process": tokens_per_sec / world_size,
+        "allreduce_seconds": metrics.get("allreduce_seconds", 0.0),
+        "allreduce_share": metrics.get("allreduce_share", 0.0),
+        "single_process_tokens_per_sec": baseline,
+        "speedup_vs_single_process": tokens_per_sec / baseline if baseline else None,
+        "scaling_efficiency": tokens_per_sec / (baseline * world_size) if baseline else None
+    })
+    record["model_path"] = record["output_dir"]
+    record["status_message"] = None
+
+def execute_shared_finetune_group(group_id: str, members: List[Tuple[str, FineTuningConfig]]):
+    """Charge le modèle de base une seule fois et entraîne les adaptateurs des membres en alternance"""
+    for job_id, config in members:
+        if not config.dataset_path:
+            raise ValueError(f"dataset_path est requis pour lancer un fine-tuning (job {job_id})")
+        jobs[job_id]["status_message"] = "Chargement du modèle de base partagé"
+        jobs[job_id]["updated_at"] = datetime.now().isoformat()
+
+    model, tokenizer, backend = _load_finetune_model(members[0][1])
+
+    trainers = {}
+    for index, (job_id, config) in enumerate(members):
+        adapter_name = adapter_name_for(index)
+        jobs[job_id]["backend"] = backend
+        jobs[job_id]["shared_base"] = {
+            "group_id": group_id,
+            "adapter_name": adapter_name,
+            "members": [member_id for member_id, _ in members]
+        }
+        try:
+            if index > 0:
+                add_lora_adapter(model, adapter_name, config.dict())
+            model.set_adapter(adapter_name)
+            trainers[job_id] = (adapter_name, prepare_finetune_trainer(
+                job_id, config, model, tokenizer, adapter_name=adapter_name, admission_id=group_id
+            ))
+        except Exception as e:
+            logger.error(f"Erreur lors de la préparation de l'adaptateur du job {job_id}: {str(e)}")
+            jobs[job_id]["error"] = str(e)
+
+    errors = interleave_training(model, trainers)
+
+    for job_id, (adapter_name, trainer) in trainers.items():
+        if errors.get(job_id) is not None:
+            jobs[job_id]["error"] = str(errors[job_id])
+            continue
+        try:
+            model.set_adapter(adapter_name)
+            finalize_finetune_job(job_id, trainer, model, tokenizer, adapter_name)
+        except Exception as e:
+            logger.error(f"Erreur lors de la sauvegarde de l'adaptateur du job {job_id}: {str(e)}")
+            jobs[job_id]["error"] = str(e)
 
 # Fonction pour exécuter le fine-tuning en arrière-plan
 async def run_finetune_job(job_id: str, config: FineTuningConfig):
-    """Fonction qui exécute le fine-tuning avec Unsloth"""
+    """Fonction qui exécute le fine-tuning avec Unsloth (ou transformers + PEFT)"""
+    if config.share_base:
+        await run_shared_finetune_job(job_id, config)
+    else:
+        await _run_single_finetune_job(job_id, config)
+
+async def _run_single_finetune_job(job_id: str, config: FineTuningConfig):
+    """Fonction qui exécute un job de fine-tuning seul (modèle de base chargé pour lui)"""
+    device = detect_compute_device()
+    estimate = None
+    tracker = None
     try:
+        # Attendre que la mémoire estimée soit disponible
+        estimate = estimate_finetune_job_memory(config, device)
+        jobs[job_id]["memory_estimate"] = estimate
+        jobs[job_id]["admission"] = await admission_controller.acquire(
+            job_id,
+            estimate["total"],
+            device,
+            on_wait=lambda entry: _mark_waiting_for_memory(jobs[job_id], entry)
+        )
+        tracker = PeakMemoryTracker(device)
+        tracker.start()
+
         # Mettre à jour le statut du job
         jobs[job_id]["status"] = "running"
+        jobs[job_id]["status_message"] = None
         jobs[job_id]["updated_at"] = datetime.now().isoformat()
+        save_finetune_job(job_id)
 
-        # Intégration avec Unsloth
-        try:
-            from unsloth import FastLanguageModel
-            import torch
-
-            # Initialiser le modèle
-            model, tokenizer = FastLanguageModel.from_pretrained(
-                model_name=config.model_name,
-                max_seq_length=config.max_seq_length,
-                dtype=torch.bfloat16,
-                load_in_4bit=True,
-            )
-
-            # Configurer pour le fine-tuning
-            model = FastLanguageModel.get_peft_model(
-                model,
-                r=config.lora_r,
-                target_modules=["q_proj", "k_proj", "v_proj", "o_proj"],
-                lora_alpha=config.lora_alpha,
-                lora_dropout=config.lora_dropout,
-                bias="none",
-            )
-
-            # Simuler l'entraînement pour l'instant
-            # Dans une implémentation réelle, vous chargeriez vos données et lanceriez l'entraînement
-            import time
-            import random
-
-            total_steps = config.epochs * 10  # Simuler 10 batchs par époque
-            for step in range(total_steps):
-                # Simuler le travail
-                time.sleep(0.5)
-
-                # Mettre à jour la progression
-                progress = (step + 1) / total_steps
-                jobs[job_id]["progress"] = progress
-
-                # Simuler des métriques
-                loss = 2.0 - (1.5 * progress) + random.uniform(-0.1, 0.1)
-                jobs[job_id]["metrics"] = {
-                    "loss": loss,
-                    "step": step + 1,
-                    "epoch": (step // 10) + 1
-                }
-
-                jobs[job_id]["updated_at"] = datetime.now().isoformat()
-
-        except ImportError:
-            # Si Unsloth n'est pas disponible, simuler le processus
-            import time
-            import random
-
-            total_steps = config.epochs * 10  # Simuler 10 batchs par époque
-            for step in range(total_steps):
-                # Simuler le travail
-                time.sleep(0.5)
-
-                # Mettre à jour la progression
-                progress = (step + 1) / total_steps
-                jobs[job_id]["progress"] = progress
-
-                # Simuler des métriques
-                loss = 2.0 - (1.5 * progress) + random.uniform(-0.1, 0.1)
-                jobs[job_id]["metrics"] = {
-                    "loss": loss,
-                    "step": step + 1,
-                    "epoch": (step // 10) + 1
-                }
-
-                jobs[job_id]["updated_at"] = datetime.now().isoformat()
+        # L'entraînement est bloquant: l'exécuter hors de la boucle d'événements
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, execute_finetune_training, job_id, config)
 
         # Marquer comme terminé
         jobs[job_id]["status"] = "completed"
@@ -678,6 +1985,207 @@ async def run_finetune_job(job_id: str, config: FineTuningConfig):
         jobs[job_id]["status"] = "failed"
         jobs[job_id]["error"] = str(e)
         jobs[job_id]["updated_at"] = datetime.now().isoformat()
+    finally:
+        admission_controller.release(job_id)
+        if tracker is not None:
+            peak = tracker.stop()
+            jobs[job_id]["memory_peak"] = peak
+            if jobs[job_id]["status"] == "completed":
+                memory_calibrator.record("finetune", config.model_name, estimate["raw_total"], peak, device)
+        save_finetune_job(job_id)
+
+def _mark_group_waiting_for_memory(members: List[Tuple[str, FineTuningConfig]], entry: Dict[str, Any]):
+    """Met à jour les enregistrements des membres d'un groupe en attente de mémoire"""
+    for member_id, _ in members:
+        _mark_waiting_for_memory(jobs[member_id], entry)
+
+async def run_shared_finetune_job(job_id: str, config: FineTuningConfig):
+    """Fonction qui exécute un job de fine-tuning dans un groupe partageant le modèle de base"""
+    loop = asyncio.get_running_loop()
+    group, leader = adapter_groups.join(job_id, config.dict())
+    jobs[job_id]["shared_base"] = {"group_id": group["group_id"]}
+    if not leader:
+        # Le leader du groupe entraîne tous les membres et met à jour leurs enregistrements
+        jobs[job_id]["status_message"] = "En attente du groupe d'adaptateurs"
+        jobs[job_id]["updated_at"] = datetime.now().isoformat()
+        await adapter_groups.wait(group)
+        return
+
+    jobs[job_id]["status_message"] = "Constitution du groupe d'adaptateurs"
+    jobs[job_id]["updated_at"] = datetime.now().isoformat()
+    await asyncio.sleep(max(0.0, adapter_groups.window - (time.time() - group["opened_at"])))
+    member_ids = adapter_groups.close(group)
+    if len(member_ids) == 1:
+        try:
+            await _run_single_finetune_job(job_id, config)
+        finally:
+            adapter_groups.finish(group)
+        return
+
+    group_id = group["group_id"]
+    members = [(member_id, FineTuningConfig(**jobs[member_id]["config"])) for member_id in member_ids]
+    device = detect_compute_device()
+    tracker = None
+    try:
+        # Estimation du groupe: modèle de base et activations une fois, état LoRA par adaptateur
+        estimates = [estimate_finetune_job_memory(member_config, device) for _, member_config in members]
+        group_estimate = estimate_group_memory(estimates)
+        for (member_id, _), estimate in zip(members, estimates):
+            jobs[member_id]["memory_estimate"] = dict(estimate, group_total=group_estimate)
+        admission = await admission_controller.acquire(
+            group_id,
+            group_estimate,
+            device,
+            on_wait=lambda entry: _mark_group_waiting_for_memory(members, entry)
+        )
+        tracker = PeakMemoryTracker(device)
+        tracker.start()
+
+        for member_id, _ in members:
+            jobs[member_id]["admission"] = admission
+            jobs[member_id]["status"] = "running"
+            jobs[member_id]["status_message"] = None
+            jobs[member_id]["updated_at"] = datetime.now().isoformat()
+            save_finetune_job(member_id)
+
+        await loop.run_in_executor(None, execute_shared_finetune_group, group_id, members)
+
+        for member_id, _ in members:
+            jobs[member_id]["status"] = "failed" if jobs[member_id].get("error") else "completed"
+            jobs[member_id]["updated_at"] = datetime.now().isoformat()
+
+    except Exception as e:
+        logger.error(f"Erreur lors du fine-tuning du groupe {group_id}: {str(e)}")
+        for member_id, _ in members:
+            jobs[member_id]["status"] = "failed"
+            jobs[member_id]["error"] = str(e)
+            jobs[member_id]["updated_at"] = datetime.now().isoformat()
+    finally:
+        admission_controller.release(group_id)
+        if tracker is not None:
+            peak = tracker.stop()
+            for member_id, _ in members:
+                jobs[member_id]["memory_peak"] = peak
+                jobs[member_id]["shared_base"]["memory_peak_per_job"] = peak / len(members)
+        for member_id, _ in members:
+            save_finetune_job(member_id)
+        adapter_groups.finish(group)
+
+# Exécuteurs des étapes de pipeline: chaque étape réutilise la fonction run_* correspondante
+def _execute_preprocess_step(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Étape de prétraitement: retourne le chemin des données prétraitées"""
+    task_id = str(uuid.uuid4())
+    asyncio.run(run_preprocessing_task(
+        task_id,
+        params["file_path"],
+        params["output_path"],
+        params.get("remove_duplicates", True),
+        params.get("handle_missing", True),
+        params.get("missing_strategy", "drop"),
+        params.get("remove_outliers", False),
+        params.get("outlier_method", "zscore"),
+        params.get("filter_by_length", False),
+        params.get("text_column"),
+        params.get("min_length", 0),
+        params.get("max_length")
+    ))
+    task = preprocessing_tasks[task_id]
+    if task["status"] != "completed":
+        raise Exception(task.get("error", "Échec du prétraitement"))
+    return {"task_id": task_id, "output_path": task["output_path"], "stats": task.get("stats")}
+
+def _execute_finetune_step(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Étape de fine-tuning: retourne le chemin du modèle affiné"""
+    config = FineTuningConfig(**params)
+    job_id = create_finetune_job(config)
+    asyncio.run(run_finetune_job(job_id, config))
+    job = jobs[job_id]
+    if job["status"] != "completed":
+        raise Exception(job.get("error", "Échec du fine-tuning"))
+    return {"job_id": job_id, "model_path": job.get("model_path"), "metrics": job.get("metrics")}
+
+def _execute_export_step(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Étape d'export: retourne le chemin du modèle exporté"""
+    task_id = str(uuid.uuid4())
+    asyncio.run(run_export_task(
+        task_id,
+        params["model_path"],
+        params["model_name"],
+        params.get("format", "gguf"),
+        params.get("quantization", "q4_k_m")
+    ))
+    task = export_tasks[task_id]
+    if task["status"] != "completed":
+        raise Exception(task.get("error", "Échec de l'export"))
+    return {"task_id": task_id, "model_path": task["result"]["file_path"], "result": task["result"]}
+
+def _execute_evaluate_step(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Étape d'évaluation: retourne les résultats des métriques"""
+    task_id = str(uuid.uuid4())
+    asyncio.run(run_evaluation_task(
+        task_id,
+        params["model_path"],
+        params["test_file"],
+        params.get("metrics", ["perplexity", "accuracy", "bleu"])
+    ))
+    task = evaluation_tasks[task_id]
+    if task["status"] != "completed":
+        raise Exception(task.get("error", "Échec de l'évaluation"))
+    return {"task_id": task_id, "results": task["results"]}
+
+pipeline_runner = PipelineRunner({
+    "preprocess": _execute_preprocess_step,
+    "finetune": _execute_finetune_step,
+    "export": _execute_export_step,
+    "evaluate": _execute_evaluate_step
+})
+
+# Essais des recherches d'hyperparamètres: des jobs de fine-tuning ordinaires
+def _launch_sweep_trial(config: Dict[str, Any]) -> str:
+    """Lance un essai (dans un thread, ou via la file partagée) et retourne l'identifiant du job"""
+    trial_config = FineTuningConfig(**config)
+    job_id = create_finetune_job(trial_config)
+    if job_queue is not None:
+        job_queue.enqueue(
+            job_id,
+            "finetune",
+            {"config": trial_config.dict(), "record": jobs[job_id]},
+            trial_config.required_capabilities
+        )
+    else:
+        threading.Thread(
+            target=lambda: asyncio.run(run_finetune_job(job_id, trial_config)),
+            daemon=True
+        ).start()
+    return job_id
+
+sweep_engine = HyperparameterSweep(
+    _launch_sweep_trial,
+    lambda job_id: get_task_record(jobs, job_id),
+    request_finetune_stop
+)
+
+# Fonction pour exécuter une recherche d'hyperparamètres en arrière-plan (synchrone: exécutée dans le pool de threads)
+def run_sweep_task(sweep_id: str, spec: Dict[str, Any]):
+    """Fonction qui exécute une recherche d'hyperparamètres"""
+    try:
+        sweep_engine.run(sweep_id, spec, sweeps[sweep_id])
+    except Exception as e:
+        logger.error(f"Erreur lors de la recherche d'hyperparamètres {sweep_id}: {str(e)}")
+        sweeps[sweep_id]["status"] = "failed"
+        sweeps[sweep_id]["error"] = str(e)
+        sweeps[sweep_id]["updated_at"] = datetime.now().isoformat()
+
+# Fonction pour exécuter un pipeline en arrière-plan (synchrone: exécutée dans le pool de threads)
+def run_pipeline_task(pipeline_id: str, spec: Dict[str, Any]):
+    """Fonction qui exécute un pipeline sous forme de DAG"""
+    try:
+        pipeline_runner.run(pipeline_id, spec, pipelines[pipeline_id])
+    except Exception as e:
+        logger.error(f"Erreur lors de l'exécution du pipeline {pipeline_id}: {str(e)}")
+        pipelines[pipeline_id]["status"] = "failed"
+        pipelines[pipeline_id]["error"] = str(e)
+        pipelines[pipeline_id]["updated_at"] = datetime.now().isoformat()
 
 if __name__ == "__main__":
     import uvicorn
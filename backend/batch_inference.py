@@ -0,0 +1,320 @@
+import os
+import csv
+import json
+import time
+import logging
+from typing import Dict, Any, List, Optional, Iterator, Callable, Set
+
+from speculative_decoding import speculative_generate, DEFAULT_DRAFT_TOKENS
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("batch_inference.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("batch-inference")
+
+# Colonnes reconnues pour le prompt, par ordre de préférence
+PROMPT_COLUMNS = ("prompt", "instruction", "question", "input", "text")
+
+# Nombre de prompts triés par longueur en une fois (les fichiers plus grands sont traités par fenêtres)
+SORT_WINDOW = 10000
+
+
+def iter_prompts(input_path: str, prompt_column: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lit les prompts d'un fichier CSV ou JSONL.
+
+    Args:
+        input_path: Fichier de prompts (.csv, .jsonl; une chaîne JSON par ligne est aussi acceptée)
+        prompt_column: Colonne du prompt (détectée parmi PROMPT_COLUMNS si absente)
+
+    Yields:
+        Dict[str, Any]: {"index": position dans le fichier, "id": colonne id si présente, "prompt"}
+    """
+    if input_path.endswith(".csv"):
+        with open(input_path, newline="", encoding="utf-8") as f:
+            rows = csv.DictReader(f)
+            yield from _iter_rows(rows, prompt_column)
+        return
+
+    with open(input_path, encoding="utf-8") as f:
+        rows = (json.loads(line) for line in f if line.strip())
+        yield from _iter_rows(rows, prompt_column)
+
+
+def _iter_rows(rows, prompt_column: Optional[str]) -> Iterator[Dict[str, Any]]:
+    for index, row in enumerate(rows):
+        if isinstance(row, str):
+            yield {"index": index, "id": None, "prompt": row}
+            continue
+        column = prompt_column or next((c for c in PROMPT_COLUMNS if row.get(c)), None)
+        if column is None or not row.get(column):
+            raise ValueError(f"Ligne {index}: aucune colonne de prompt trouvée (attendu: {prompt_column or ', '.join(PROMPT_COLUMNS)})")
+        yield {"index": index, "id": row.get("id"), "prompt": str(row[column])}
+
+
+def truncate_partial_line(output_path: str):
+    """Supprime la dernière ligne du fichier de sortie si une interruption l'a laissée incomplète."""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        if not data or data.endswith(b"\n"):
+            return
+        f.truncate(data.rfind(b"\n") + 1)
+    logger.warning(f"Ligne incomplète supprimée en fin de {output_path}")
+
+
+def completed_indices(output_path: str) -> Set[int]:
+    """Retourne les indices des prompts déjà présents dans le fichier de sortie (reprise)."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["index"])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def length_buckets(items: List[Dict[str, Any]], length: Callable[[str], int], batch_size: int) -> List[List[Dict[str, Any]]]:
+    """
+    Trie les prompts par longueur et les découpe en batchs de longueurs voisines (peu de padding).
+
+    Args:
+        items: Prompts ({"index", "id", "prompt"})
+        length: Longueur d'un prompt (en tokens)
+        batch_size: Nombre de prompts par batch
+
+    Returns:
+        List[List[Dict[str, Any]]]: Batchs, du plus long au plus court
+    """
+    for item in items:
+        item["length"] = length(item["prompt"])
+    ordered = sorted(items, key=lambda item: item["length"], reverse=True)
+    return [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+
+def generate_batch_transformers(
+    model,
+    tokenizer,
+    prompts: List[str],
+    max_tokens: int,
+    temperature: float,
+    top_p: float
+) -> List[Dict[str, Any]]:
+    """Génère les réponses d'un batch de prompts en un seul appel à generate (padding à gauche)."""
+    import torch
+
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    padding_side = tokenizer.padding_side
+    tokenizer.padding_side = "left"
+    try:
+        inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(model.device)
+    finally:
+        tokenizer.padding_side = padding_side
+
+    generation_kwargs = {"max_new_tokens": max_tokens, "pad_token_id": tokenizer.pad_token_id}
+    if temperature > 0:
+        generation_kwargs.update(do_sample=True, temperature=temperature, top_p=top_p)
+    else:
+        generation_kwargs["do_sample"] = False
+    with torch.no_grad():
+        outputs = model.generate(**inputs, **generation_kwargs)
+
+    results = []
+    new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+    for row in new_tokens:
+        count = int((row != tokenizer.pad_token_id).sum().item())
+        results.append({"generated_text": tokenizer.decode(row, skip_special_tokens=True), "tokens": count})
+    return results
+
+
+def generate_batch_gguf(model, prompts: List[str], max_tokens: int, temperature: float, top_p: float) -> List[Dict[str, Any]]:
+    """Génère les réponses d'un batch de prompts avec llama-cpp-python (un prompt à la fois, modèle déjà chargé)."""
+    results = []
+    for prompt in prompts:
+        response = model(prompt, max_tokens=max_tokens, temperature=temperature, top_p=top_p)
+        results.append({
+            "generated_text": response["choices"][0]["text"],
+            "tokens": response.get("usage", {}).get("completion_tokens")
+        })
+    return results
+
+
+def generate_batch_speculative(
+    entry: Dict[str, Any],
+    draft_entry: Dict[str, Any],
+    prompts: List[str],
+    max_tokens: int,
+    temperature: float,
+    top_p: float,
+    num_draft_tokens: int
+) -> List[Dict[str, Any]]:
+    """Génère les réponses d'un batch par décodage spéculatif (un prompt à la fois, vérification par blocs de tokens)."""
+    results = []
+    for prompt in prompts:
+        result = speculative_generate(
+            entry["model"],
+            draft_entry["model"],
+            entry["tokenizer"],
+            prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            num_draft_tokens=num_draft_tokens,
+            draft_tokenizer=draft_entry["tokenizer"]
+        )
+        results.append({
+            "generated_text": result.pop("generated_text"),
+            "tokens": result["tokens"],
+            "speculative": result
+        })
+    return results
+
+
+def run_batch_inference(
+    entry: Dict[str, Any],
+    input_path: str,
+    output_path: str,
+    max_tokens: int = 100,
+    temperature: float = 0.7,
+    top_p: float = 0.9,
+    batch_size: int = 8,
+    prompt_column: Optional[str] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    draft_entry: Optional[Dict[str, Any]] = None,
+    num_draft_tokens: int = DEFAULT_DRAFT_TOKENS
+) -> Dict[str, Any]:
+    """
+    Exécute l'inférence sur tous les prompts d'un fichier avec un modèle chargé une fois.
+
+    Les prompts sont triés par longueur (par fenêtres de SORT_WINDOW) et générés par batchs.
+    Chaque résultat est ajouté au fichier JSONL de sortie dès la fin de son batch; les
+    prompts déjà présents dans ce fichier sont ignorés, ce qui rend le job reprenable.
+
+    Args:
+        entry: Modèle du pool ({"kind", "model", "tokenizer"})
+        input_path: Fichier de prompts (CSV ou JSONL)
+        output_path: Fichier JSONL des résultats
+        max_tokens: Nombre maximal de tokens générés par prompt
+        temperature: Température (0: décodage glouton)
+        top_p: Masse de probabilité conservée
+        batch_size: Nombre de prompts par batch
+        prompt_column: Colonne du prompt
+        on_progress: Fonction appelée avec la progression après chaque batch
+        should_stop: Fonction indiquant qu'un arrêt a été demandé
+        draft_entry: Modèle brouillon du pool pour le décodage spéculatif (transformers uniquement)
+        num_draft_tokens: Nombre de tokens proposés par le modèle brouillon par vérification
+
+    Returns:
+        Dict[str, Any]: Statistiques du job (prompts, générés, ignorés, tokens/s)
+    """
+    # Une ligne tronquée par une interruption est régénérée
+    truncate_partial_line(output_path)
+    done = completed_indices(output_path)
+    total = sum(1 for _ in iter_prompts(input_path, prompt_column))
+    if done:
+        logger.info(f"Reprise: {len(done)}/{total} prompts déjà traités dans {output_path}")
+
+    if draft_entry is not None and "gguf" in (entry["kind"], draft_entry["kind"]):
+        raise ValueError("Le décodage spéculatif n'est disponible que pour les modèles transformers")
+
+    if entry["kind"] == "gguf":
+        model = entry["model"]
+        length = lambda prompt: len(model.tokenize(prompt.encode("utf-8")))
+        generate = lambda prompts: generate_batch_gguf(model, prompts, max_tokens, temperature, top_p)
+    else:
+        tokenizer = entry["tokenizer"]
+        length = lambda prompt: len(tokenizer(prompt)["input_ids"])
+        generate = lambda prompts: generate_batch_transformers(entry["model"], tokenizer, prompts, max_tokens, temperature, top_p)
+    if draft_entry is not None:
+        generate = lambda prompts: generate_batch_speculative(
+            entry, draft_entry, prompts, max_tokens, temperature, top_p, num_draft_tokens
+        )
+
+    stats = {
+        "total": total,
+        "skipped": len(done),
+        "generated": 0,
+        "generated_tokens": 0,
+        "batches": 0,
+        "elapsed": 0.0,
+        "stopped": False
+    }
+    if draft_entry is not None:
+        speculative = {"draft_tokens": 0, "accepted_tokens": 0, "decode_seconds": 0.0, "baseline_seconds": 0.0}
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    start = time.time()
+
+    def windows() -> Iterator[List[Dict[str, Any]]]:
+        window = []
+        for item in iter_prompts(input_path, prompt_column):
+            if item["index"] in done:
+                continue
+            window.append(item)
+            if len(window) >= SORT_WINDOW:
+                yield window
+                window = []
+        if window:
+            yield window
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        for window in windows():
+            for batch in length_buckets(window, length, batch_size):
+                if should_stop is not None and should_stop():
+                    stats["stopped"] = True
+                    break
+                results = generate([item["prompt"] for item in batch])
+                for item, result in zip(batch, results):
+                    line = {
+                        "index": item["index"],
+                        "id": item["id"],
+                        "prompt": item["prompt"],
+                        "generated_text": result["generated_text"],
+                        "tokens": result["tokens"]
+                    }
+                    if "speculative" in result:
+                        metrics = result["speculative"]
+                        line["acceptance_rate"] = metrics["acceptance_rate"]
+                        line["speedup"] = metrics["speedup"]
+                        speculative["draft_tokens"] += metrics["draft_tokens"]
+                        speculative["accepted_tokens"] += metrics["accepted_tokens"]
+                        if metrics["tokens_per_sec"] and metrics["baseline_tokens_per_sec"]:
+                            speculative["decode_seconds"] += metrics["tokens"] / metrics["tokens_per_sec"]
+                            speculative["baseline_seconds"] += metrics["tokens"] / metrics["baseline_tokens_per_sec"]
+                    out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                    stats["generated_tokens"] += result["tokens"] or 0
+                # Les résultats du batch sont durables avant de passer au suivant
+                out.flush()
+                os.fsync(out.fileno())
+
+                stats["generated"] += len(batch)
+                stats["batches"] += 1
+                stats["elapsed"] = time.time() - start
+                if on_progress is not None:
+                    on_progress(dict(stats))
+            if stats["stopped"]:
+                break
+
+    stats["elapsed"] = time.time() - start
+    stats["prompts_per_sec"] = stats["generated"] / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+    stats["tokens_per_sec"] = stats["generated_tokens"] / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+    if draft_entry is not None:
+        # Accélération du décodage sur l'ensemble du job, pondérée par le nombre de tokens
+        stats["speculative"] = {
+            "draft_tokens": speculative["draft_tokens"],
+            "accepted_tokens": speculative["accepted_tokens"],
+            "acceptance_rate": speculative["accepted_tokens"] / speculative["draft_tokens"] if speculative["draft_tokens"] else 0.0,
+            "speedup": speculative["baseline_seconds"] / speculative["decode_seconds"] if speculative["decode_seconds"] > 0 else None
+        }
+    return stats
@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import shutil
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("checkpointing.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("checkpointing")
+
+CHECKPOINT_PATTERN = re.compile(r"^checkpoint-(\d+)$")
+
+# Fichiers présents dans un checkpoint complet (trainer_state.json est écrit en dernier)
+ADAPTER_FILE = "adapter_model.bin"
+OPTIMIZER_FILE = "optimizer.pt"
+SCHEDULER_FILE = "scheduler.pt"
+STATE_FILE = "trainer_state.json"
+REQUIRED_FILES = (ADAPTER_FILE, OPTIMIZER_FILE, SCHEDULER_FILE, STATE_FILE)
+
+# Meilleur adaptateur sur la validation (jamais supprimé par la rotation des checkpoints)
+BEST_DIR = "best"
+
+
+def _to_cpu(value: Any) -> Any:
+    """Copie récursivement les tenseurs d'une structure vers le CPU (instantané indépendant)."""
+    import torch
+
+    if isinstance(value, torch.Tensor):
+        return value.detach().to("cpu", copy=True)
+    if isinstance(value, dict):
+        return {key: _to_cpu(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_to_cpu(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_to_cpu(item) for item in value)
+    return value
+
+
+class CheckpointManager:
+    def __init__(self, checkpoint_dir: str, keep_last_n: int = 3):
+        """
+        Initialise le gestionnaire de checkpoints d'un job de fine-tuning.
+
+        Seuls l'adaptateur LoRA, l'état de l'optimiseur et du scheduler et la position
+        dans les données sont sauvegardés. L'écriture se fait dans un thread à partir
+        d'un instantané CPU, pour ne pas bloquer l'entraînement sur les E/S disque.
+
+        Args:
+            checkpoint_dir: Répertoire des checkpoints du job
+            keep_last_n: Nombre de checkpoints les plus récents conservés
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.keep_last_n = max(1, keep_last_n)
+        self._writer: Optional[threading.Thread] = None
+
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def snapshot(self, model, optimizer, scheduler, trainer_state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Capture l'état à sauvegarder (copie CPU de l'adaptateur et de l'optimiseur).
+
+        Args:
+            model: Modèle PEFT en cours d'entraînement
+            optimizer: Optimiseur
+            scheduler: Scheduler du taux d'apprentissage
+            trainer_state: État de la boucle (pas, époque, position dans les données...)
+
+        Returns:
+            Dict[str, Any]: Instantané indépendant des tenseurs d'entraînement
+        """
+        from peft import get_peft_model_state_dict
+
+        adapter_name = getattr(model, "active_adapter", "default")
+        if isinstance(adapter_name, list):
+            adapter_name = adapter_name[0]
+        peft_config = model.peft_config[adapter_name]
+
+        return {
+            "adapter": _to_cpu(get_peft_model_state_dict(model, adapter_name=adapter_name)),
+            "adapter_config": peft_config,
+            "optimizer": _to_cpu(optimizer.state_dict()),
+            "scheduler": scheduler.state_dict(),
+            "trainer_state": dict(trainer_state, saved_at=datetime.now().isoformat())
+        }
+
+    def save_async(self, model, optimizer, scheduler, trainer_state: Dict[str, Any]):
+        """
+        Capture un instantané puis l'écrit en arrière-plan.
+
+        Un seul checkpoint est écrit à la fois: si l'écriture précédente n'est pas
+        terminée, l'appel attend sa fin avant de lancer la suivante.
+        """
+        snapshot = self.snapshot(model, optimizer, scheduler, trainer_state)
+        self.wait()
+        self._writer = threading.Thread(target=self._write, args=(snapshot,), daemon=True)
+        self._writer.start()
+
+    def wait(self):
+        """Attend la fin de l'écriture en cours."""
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+
+    def _write(self, snapshot: Dict[str, Any]):
+        import torch
+
+        step = snapshot["trainer_state"]["step"]
+        final_path = os.path.join(self.checkpoint_dir, f"checkpoint-{step}")
+        tmp_path = f"{final_path}.tmp"
+        try:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+
+            # Adaptateur au format PEFT: le checkpoint est aussi chargeable par PeftModel.from_pretrained
+            torch.save(snapshot["adapter"], os.path.join(tmp_path, ADAPTER_FILE))
+            snapshot["adapter_config"].save_pretrained(tmp_path)
+            torch.save(snapshot["optimizer"], os.path.join(tmp_path, OPTIMIZER_FILE))
+            torch.save(snapshot["scheduler"], os.path.join(tmp_path, SCHEDULER_FILE))
+            with open(os.path.join(tmp_path, STATE_FILE), "w") as f:
+                json.dump(snapshot["trainer_state"], f, indent=2)
+
+            # Le renommage rend le checkpoint visible d'un coup: un checkpoint partiel n'est jamais lu
+            shutil.rmtree(final_path, ignore_errors=True)
+            os.replace(tmp_path, final_path)
+            logger.info(f"Checkpoint sauvegardé: {final_path}")
+
+            self._prune()
+        except Exception as e:
+            logger.error(f"Erreur lors de la sauvegarde du checkpoint {final_path}: {str(e)}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def save_best(self, model, state: Dict[str, Any]):
+        """
+        Sauvegarde en arrière-plan le meilleur adaptateur (sans optimiseur) dans le répertoire best.
+
+        Args:
+            model: Modèle PEFT
+            state: Informations sur l'évaluation (pas, perte de validation)
+        """
+        from peft import get_peft_model_state_dict
+
+        adapter_name = getattr(model, "active_adapter", "default")
+        if isinstance(adapter_name, list):
+            adapter_name = adapter_name[0]
+        snapshot = {
+            "adapter": _to_cpu(get_peft_model_state_dict(model, adapter_name=adapter_name)),
+            "adapter_config": model.peft_config[adapter_name],
+            "state": dict(state, saved_at=datetime.now().isoformat())
+        }
+        self.wait()
+        self._writer = threading.Thread(target=self._write_best, args=(snapshot,), daemon=True)
+        self._writer.start()
+
+    def _write_best(self, snapshot: Dict[str, Any]):
+        import torch
+
+        final_path = os.path.join(self.checkpoint_dir, BEST_DIR)
+        tmp_path = f"{final_path}.tmp"
+        try:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            torch.save(snapshot["adapter"], os.path.join(tmp_path, ADAPTER_FILE))
+            snapshot["adapter_config"].save_pretrained(tmp_path)
+            with open(os.path.join(tmp_path, STATE_FILE), "w") as f:
+                json.dump(snapshot["state"], f, indent=2)
+
+            shutil.rmtree(final_path, ignore_errors=True)
+            os.replace(tmp_path, final_path)
+            logger.info(f"Meilleur adaptateur sauvegardé (pas {snapshot['state']['step']}): {final_path}")
+        except Exception as e:
+            logger.error(f"Erreur lors de la sauvegarde du meilleur adaptateur: {str(e)}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def load_best(self) -> Optional[Dict[str, Any]]:
+        """
+        Retourne l'état (CPU) du meilleur adaptateur sauvegardé.
+
+        Returns:
+            Optional[Dict[str, Any]]: State dict PEFT, ou None s'il n'y en a pas
+        """
+        import torch
+
+        path = os.path.join(self.checkpoint_dir, BEST_DIR, ADAPTER_FILE)
+        if not os.path.exists(path):
+            return None
+        return torch.load(path, map_location="cpu")
+
+    def list_checkpoints(self) -> List[str]:
+        """Liste les checkpoints complets, du plus ancien au plus récent."""
+        checkpoints = []
+        for name in os.listdir(self.checkpoint_dir):
+            match = CHECKPOINT_PATTERN.match(name)
+            path = os.path.join(self.checkpoint_dir, name)
+            if match and all(os.path.exists(os.path.join(path, f)) for f in REQUIRED_FILES):
+                checkpoints.append((int(match.group(1)), path))
+        return [path for _, path in sorted(checkpoints)]
+
+    def _prune(self):
+        """Supprime les checkpoints au-delà des keep_last_n plus récents."""
+        for path in self.list_checkpoints()[:-self.keep_last_n]:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Checkpoint supprimé: {path}")
+
+    def latest(self) -> Optional[str]:
+        """
+        Retourne le checkpoint valide le plus récent.
+
+        Returns:
+            Optional[str]: Chemin du checkpoint, ou None s'il n'y en a aucun
+        """
+        for path in reversed(self.list_checkpoints()):
+            try:
+                with open(os.path.join(path, STATE_FILE), "r") as f:
+                    json.load(f)
+                return path
+            except Exception as e:
+                logger.warning(f"Checkpoint invalide ignoré ({path}): {str(e)}")
+        return None
+
+    def load(self, path: str, model, optimizer, scheduler) -> Dict[str, Any]:
+        """
+        Restaure l'adaptateur, l'optimiseur et le scheduler depuis un checkpoint.
+
+        Args:
+            path: Chemin du checkpoint
+            model: Modèle PEFT (mêmes paramètres LoRA que lors de la sauvegarde)
+            optimizer: Optimiseur construit sur les mêmes groupes de paramètres
+            scheduler: Scheduler construit avec le même nombre total de pas
+
+        Returns:
+            Dict[str, Any]: État de la boucle d'entraînement sauvegardé
+        """
+        import torch
+        from peft import set_peft_model_state_dict
+
+        device = next(p.device for p in model.parameters())
+        adapter_name = getattr(model, "active_adapter", "default")
+        if isinstance(adapter_name, list):
+            adapter_name = adapter_name[0]
+
+        set_peft_model_state_dict(
+            model,
+            torch.load(os.path.join(path, ADAPTER_FILE), map_location=device),
+            adapter_name=adapter_name
+        )
+        # load_state_dict replace lui-même l'état de l'optimiseur sur le périphérique des paramètres
+        optimizer.load_state_dict(torch.load(os.path.join(path, OPTIMIZER_FILE), map_location="cpu"))
+        scheduler.load_state_dict(torch.load(os.path.join(path, SCHEDULER_FILE)))
+
+        with open(os.path.join(path, STATE_FILE), "r") as f:
+            trainer_state = json.load(f)
+
+        logger.info(f"Reprise depuis {path} (pas {trainer_state['step']})")
+        return trainer_state
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import queue
+import logging
+import argparse
+import multiprocessing
+from typing import Dict, Any, Optional, Callable
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("distributed_training.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("distributed-training")
+
+# Nom du fichier de description du job lu par les processus des autres machines
+JOB_FILE = "data_parallel_job.json"
+
+
+def threads_per_process(num_processes: int) -> int:
+    """Répartit les cœurs de la machine entre les processus pour éviter la sur-souscription."""
+    return max(1, (os.cpu_count() or 1) // max(1, num_processes))
+
+
+def write_job_file(job: Dict[str, Any]) -> str:
+    """
+    Écrit la description du job dans son répertoire de sortie.
+
+    Les machines supplémentaires lancent leurs processus avec
+    python distributed_training.py --job-file <chemin> --node-rank <k>
+    (le répertoire de sortie et le jeu de données doivent être sur un système de fichiers partagé).
+    """
+    path = os.path.join(job["output_dir"], JOB_FILE)
+    os.makedirs(job["output_dir"], exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(job, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _broadcast_trainable_parameters(model):
+    """Aligne les adaptateurs LoRA de tous les processus sur ceux du rang 0."""
+    import torch.distributed as dist
+
+    for _, param in sorted(
+        ((n, p) for n, p in model.named_parameters() if p.requires_grad), key=lambda item: item[0]
+    ):
+        dist.broadcast(param.data, src=0)
+
+
+def _worker_main(job: Dict[str, Any], rank: int, messages, stop_event):
+    """Point d'entrée d'un processus d'entraînement (un rang du groupe gloo)."""
+    # Entraînement data-parallel sur CPU uniquement (backend gloo)
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    os.environ["MASTER_ADDR"] = job["master_addr"]
+    os.environ["MASTER_PORT"] = str(job["master_port"])
+
+    import torch
+    import torch.distributed as dist
+    from training import load_model_for_training, FineTuningTrainer, save_adapter
+    from checkpointing import CheckpointManager
+    from training_profiler import TrainingProfiler
+
+    is_main = rank == 0
+    torch.set_num_threads(job["threads_per_process"])
+    dist.init_process_group("gloo", rank=rank, world_size=job["world_size"])
+    try:
+        config = job["config"]
+        model, tokenizer, backend = load_model_for_training(dict(config, model_name=job["model_source"]))
+        _broadcast_trainable_parameters(model)
+
+        profiler = None
+        if is_main and config.get("profile"):
+            profiler = TrainingProfiler(
+                config.get("profile_every_n_steps", 10),
+                trace_path=os.path.join(job["output_dir"], "profile_trace.json")
+            )
+
+        def on_step(metrics: Dict[str, Any]):
+            messages.put(("step", metrics, profiler.summary() if profiler is not None else None))
+
+        def on_evaluate(evaluation: Dict[str, Any]):
+            messages.put(("evaluate", evaluation))
+
+        trainer = FineTuningTrainer(
+            model,
+            tokenizer,
+            config,
+            on_step=on_step if is_main else None,
+            on_evaluate=on_evaluate if is_main else None,
+            should_stop=stop_event.is_set,
+            checkpoint_manager=CheckpointManager(
+                os.path.join(job["output_dir"], "checkpoints"),
+                keep_last_n=config.get("checkpoint_keep_last", 3)
+            ),
+            profiler=profiler,
+            rank=rank,
+            world_size=job["world_size"]
+        )
+        trainer.train()
+
+        if is_main:
+            save_adapter(model, tokenizer, job["output_dir"])
+            messages.put(("done", {
+                "backend": backend,
+                "metrics": trainer.final_metrics,
+                "resumed_from": trainer.resumed_from,
+                "best_val_loss": trainer.best_val_loss,
+                "best_step": trainer.best_step,
+                "profile": profiler.summary() if profiler is not None else None
+            }))
+    except Exception as e:
+        logger.error(f"Erreur dans le processus de rang {rank}: {str(e)}")
+        messages.put(("error", rank, str(e)))
+        raise
+    finally:
+        dist.destroy_process_group()
+
+
+def run_data_parallel(
+    job: Dict[str, Any],
+    node_rank: int = 0,
+    on_message: Optional[Callable[[tuple], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    poll_interval: float = 1.0
+) -> Optional[Dict[str, Any]]:
+    """
+    Lance les processus d'entraînement data-parallel de cette machine et attend leur fin.
+
+    Chaque processus charge le modèle, lit sa part du jeu de données et moyenne les
+    gradients LoRA avec les autres par all-reduce (gloo) à chaque pas d'optimisation.
+    Le rang 0 (premier processus de la machine 0) écrit les checkpoints et l'adaptateur
+    et publie ses métriques via on_message.
+
+    Args:
+        job: Description du job (config, model_source, output_dir, processes_per_node,
+             world_size, master_addr, master_port, threads_per_process)
+        node_rank: Rang de cette machine (0: machine principale)
+        on_message: Fonction appelée avec les messages du rang 0 ("step", "evaluate")
+        should_stop: Fonction indiquant qu'un arrêt a été demandé
+        poll_interval: Intervalle (en secondes) de relève des messages
+
+    Returns:
+        Optional[Dict[str, Any]]: Résultat du rang 0 (None sur les autres machines)
+    """
+    context = multiprocessing.get_context("spawn")
+    messages = context.Queue()
+    stop_event = context.Event()
+    per_node = job["processes_per_node"]
+
+    processes = [
+        context.Process(
+            target=_worker_main,
+            args=(job, node_rank * per_node + local_rank, messages, stop_event),
+            daemon=True
+        )
+        for local_rank in range(per_node)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(
+        f"{per_node} processus lancés (machine {node_rank}, {job['world_size']} au total, "
+        f"{job['threads_per_process']} threads chacun)"
+    )
+
+    result = None
+    errors = []
+    try:
+        while True:
+            if should_stop is not None and not stop_event.is_set() and should_stop():
+                logger.info("Arrêt demandé, transmis aux processus d'entraînement")
+                stop_event.set()
+            try:
+                message = messages.get(timeout=poll_interval)
+            except queue.Empty:
+                if all(not process.is_alive() for process in processes):
+                    break
+                continue
+
+            if message[0] == "done":
+                result = message[1]
+            elif message[0] == "error":
+                errors.append(f"rang {message[1]}: {message[2]}")
+                # Les autres rangs resteraient bloqués dans le prochain all-reduce
+                break
+            elif on_message is not None:
+                on_message(message)
+    finally:
+        for process in processes:
+            process.join(timeout=5 if errors else 30)
+            if process.is_alive():
+                process.terminate()
+
+    if errors:
+        raise RuntimeError(f"Échec de l'entraînement data-parallel ({'; '.join(errors)})")
+    failed = [p.exitcode for p in processes if p.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"Des processus d'entraînement se sont arrêtés anormalement (codes {failed})")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Processus d'entraînement data-parallel d'une machine supplémentaire")
+    parser.add_argument("--job-file", required=True, help=f"Fichier {JOB_FILE} écrit par la machine principale")
+    parser.add_argument("--node-rank", type=int, required=True, help="Rang de cette machine (1 à nnodes - 1)")
+    args = parser.parse_args()
+
+    with open(args.job_file) as f:
+        job = json.load(f)
+    start = time.time()
+    run_data_parallel(job, node_rank=args.node_rank)
+    logger.info(f"Processus de la machine {args.node_rank} terminés en {time.time() - start:.1f}s")
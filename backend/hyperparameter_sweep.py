@@ -0,0 +1,335 @@
+import math
+import time
+import random
+import logging
+import itertools
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("hyperparameter_sweep.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("hyperparameter-sweep")
+
+SEARCH_STRATEGIES = ("grid", "random")
+TRIAL_SCHEDULERS = ("fifo", "asha")
+PARAMETER_TYPES = ("choice", "uniform", "loguniform", "int")
+
+# Statuts d'un job de fine-tuning pour lesquels l'essai est terminé
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+def _normalize_parameter(name: str, spec: Any) -> Dict[str, Any]:
+    """Normalise la définition d'un hyperparamètre (une liste est un raccourci pour "choice")."""
+    if isinstance(spec, list):
+        spec = {"type": "choice", "values": spec}
+    if not isinstance(spec, dict) or spec.get("type") not in PARAMETER_TYPES:
+        raise ValueError(f"Hyperparamètre {name}: type inconnu (attendu: {', '.join(PARAMETER_TYPES)})")
+    if spec["type"] == "choice":
+        if not spec.get("values"):
+            raise ValueError(f"Hyperparamètre {name}: 'values' est requis")
+    else:
+        if "min" not in spec or "max" not in spec or spec["min"] > spec["max"]:
+            raise ValueError(f"Hyperparamètre {name}: 'min' et 'max' sont requis (min <= max)")
+        if spec["type"] == "loguniform" and spec["min"] <= 0:
+            raise ValueError(f"Hyperparamètre {name}: 'min' doit être positif pour loguniform")
+    return spec
+
+
+def grid_values(spec: Dict[str, Any]) -> List[Any]:
+    """
+    Valeurs d'un hyperparamètre pour la recherche en grille.
+
+    Les intervalles continus sont discrétisés en "num" points (3 par défaut),
+    espacés linéairement (uniform) ou géométriquement (loguniform).
+    """
+    if spec["type"] == "choice":
+        return list(spec["values"])
+    if spec["type"] == "int":
+        return list(range(int(spec["min"]), int(spec["max"]) + 1, int(spec.get("step", 1))))
+
+    num = max(1, int(spec.get("num", 3)))
+    if num == 1:
+        return [spec["min"]]
+    if spec["type"] == "loguniform":
+        low, high = math.log(spec["min"]), math.log(spec["max"])
+        return [math.exp(low + (high - low) * i / (num - 1)) for i in range(num)]
+    return [spec["min"] + (spec["max"] - spec["min"]) * i / (num - 1) for i in range(num)]
+
+
+def sample_value(spec: Dict[str, Any], rng: random.Random) -> Any:
+    """Tire une valeur d'un hyperparamètre pour la recherche aléatoire."""
+    if spec["type"] == "choice":
+        return rng.choice(spec["values"])
+    if spec["type"] == "int":
+        return rng.randint(int(spec["min"]), int(spec["max"]))
+    if spec["type"] == "loguniform":
+        return math.exp(rng.uniform(math.log(spec["min"]), math.log(spec["max"])))
+    return rng.uniform(spec["min"], spec["max"])
+
+
+def generate_trials(
+    search_space: Dict[str, Any],
+    search: str = "grid",
+    num_trials: Optional[int] = None,
+    seed: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Génère les combinaisons d'hyperparamètres à essayer.
+
+    Args:
+        search_space: Définition des hyperparamètres ({nom: {"type", "values" | "min", "max", "num"}})
+        search: "grid" (produit cartésien) ou "random"
+        num_trials: Nombre d'essais (requis pour "random"; tronque la grille sinon)
+        seed: Graine du tirage aléatoire
+
+    Returns:
+        List[Dict[str, Any]]: Hyperparamètres de chaque essai
+    """
+    if search not in SEARCH_STRATEGIES:
+        raise ValueError(f"Stratégie de recherche inconnue: {search}")
+    specs = {name: _normalize_parameter(name, spec) for name, spec in search_space.items()}
+    if not specs:
+        raise ValueError("L'espace de recherche est vide")
+
+    if search == "grid":
+        names = list(specs)
+        trials = [
+            dict(zip(names, values))
+            for values in itertools.product(*(grid_values(specs[name]) for name in names))
+        ]
+        return trials[:num_trials] if num_trials else trials
+
+    if not num_trials:
+        raise ValueError("num_trials est requis pour la recherche aléatoire")
+    rng = random.Random(seed)
+    return [{name: sample_value(spec, rng) for name, spec in specs.items()} for _ in range(num_trials)]
+
+
+class SuccessiveHalvingScheduler:
+    def __init__(self, min_steps: int, max_steps: Optional[int] = None, reduction_factor: int = 3):
+        """
+        Arrêt précoce asynchrone par réductions successives (ASHA).
+
+        À chaque palier (min_steps * reduction_factor^k pas), un essai est arrêté si sa perte
+        de validation n'est pas parmi le meilleur 1/reduction_factor des essais ayant
+        atteint ce palier. Les décisions sont prises dès qu'un essai atteint un palier,
+        sans attendre les autres essais.
+
+        Args:
+            min_steps: Nombre de pas du premier palier
+            max_steps: Nombre de pas au-delà duquel il n'y a plus de palier
+            reduction_factor: Facteur de réduction entre deux paliers
+        """
+        if min_steps <= 0:
+            raise ValueError("min_steps doit être positif")
+        if reduction_factor < 2:
+            raise ValueError("reduction_factor doit être au moins 2")
+        self.min_steps = min_steps
+        self.max_steps = max_steps
+        self.reduction_factor = reduction_factor
+        self.rungs: Dict[int, Dict[str, float]] = {}
+
+    def milestones(self, total_steps: Optional[int] = None) -> List[int]:
+        """Paliers (en pas d'optimisation) strictement inférieurs au nombre total de pas."""
+        limit = total_steps or self.max_steps
+        milestones = []
+        milestone = self.min_steps
+        while limit is None or milestone < limit:
+            milestones.append(milestone)
+            milestone *= self.reduction_factor
+            if limit is None and len(milestones) >= 8:
+                break
+        return milestones
+
+    def on_result(self, trial_id: str, eval_history: List[Dict[str, Any]], total_steps: Optional[int] = None) -> Optional[int]:
+        """
+        Enregistre les évaluations d'un essai et décide s'il doit être arrêté.
+
+        Args:
+            trial_id: Identifiant de l'essai
+            eval_history: Évaluations de validation de l'essai ({"step", "val_loss"})
+            total_steps: Nombre total de pas prévu pour l'essai
+
+        Returns:
+            Optional[int]: Palier auquel l'essai est arrêté, ou None s'il continue
+        """
+        for milestone in self.milestones(total_steps):
+            rung = self.rungs.setdefault(milestone, {})
+            if trial_id in rung:
+                continue
+            # Première évaluation atteignant le palier
+            reached = [e for e in eval_history if e["step"] >= milestone and not math.isnan(e["val_loss"])]
+            if not reached:
+                return None
+
+            value = reached[0]["val_loss"]
+            rung[trial_id] = value
+            recorded = sorted(rung.values())
+            if len(recorded) < self.reduction_factor:
+                # Trop peu d'essais à ce palier pour comparer: l'essai continue
+                continue
+            cutoff = recorded[max(1, len(recorded) // self.reduction_factor) - 1]
+            if value > cutoff:
+                return milestone
+        return None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Valeurs enregistrées à chaque palier."""
+        return {str(milestone): dict(rung) for milestone, rung in sorted(self.rungs.items())}
+
+
+class HyperparameterSweep:
+    def __init__(
+        self,
+        launch_trial: Callable[[Dict[str, Any]], str],
+        get_trial: Callable[[str], Optional[Dict[str, Any]]],
+        stop_trial: Callable[[str, str], None],
+        poll_interval: float = 5.0
+    ):
+        """
+        Initialise le moteur de recherche d'hyperparamètres.
+
+        Chaque essai est un job de fine-tuning ordinaire: le moteur le lance, suit son
+        enregistrement de statut et le fait arrêter via les fonctions fournies par l'API,
+        si bien que les essais passent par le même système de jobs (local ou file partagée).
+
+        Args:
+            launch_trial: Lance un job de fine-tuning à partir d'une configuration et retourne son identifiant
+            get_trial: Retourne l'enregistrement de statut d'un job
+            stop_trial: Demande l'arrêt d'un job (identifiant, raison)
+            poll_interval: Intervalle (en secondes) entre deux relevés de l'état des essais
+        """
+        self.launch_trial = launch_trial
+        self.get_trial = get_trial
+        self.stop_trial = stop_trial
+        self.poll_interval = poll_interval
+
+    @staticmethod
+    def validate(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Vérifie la définition d'une recherche et retourne les hyperparamètres des essais.
+
+        Raises:
+            ValueError: Si la définition est invalide
+        """
+        if spec.get("scheduler", "fifo") not in TRIAL_SCHEDULERS:
+            raise ValueError(f"Ordonnanceur d'essais inconnu: {spec.get('scheduler')}")
+        base_config = spec["base_config"]
+        unknown = [name for name in spec["search_space"] if name not in base_config]
+        if unknown:
+            raise ValueError(f"Hyperparamètres inconnus: {', '.join(unknown)}")
+        if spec.get("scheduler") == "asha":
+            if not base_config.get("eval_steps"):
+                raise ValueError("L'ordonnanceur asha nécessite eval_steps > 0")
+            if not base_config.get("validation_path") and not base_config.get("validation_split"):
+                raise ValueError("L'ordonnanceur asha nécessite validation_path ou validation_split")
+        return generate_trials(spec["search_space"], spec.get("search", "grid"), spec.get("num_trials"), spec.get("seed"))
+
+    def run(self, sweep_id: str, spec: Dict[str, Any], record: Dict[str, Any]):
+        """
+        Exécute la recherche: lance les essais (au plus max_concurrent_trials à la fois),
+        arrête les essais peu prometteurs (asha) et publie l'état dans l'enregistrement.
+
+        Args:
+            sweep_id: Identifiant de la recherche
+            spec: Définition de la recherche
+            record: Enregistrement de statut mis à jour pendant l'exécution
+        """
+        params_list = self.validate(spec)
+        max_concurrent = max(1, spec.get("max_concurrent_trials", 2))
+        scheduler = None
+        if spec.get("scheduler") == "asha":
+            scheduler = SuccessiveHalvingScheduler(
+                spec.get("min_steps", 10),
+                spec.get("max_steps"),
+                spec.get("reduction_factor", 3)
+            )
+
+        trials = [
+            {"trial_id": f"trial-{index}", "params": params, "status": "pending", "job_id": None}
+            for index, params in enumerate(params_list)
+        ]
+        record["trials"] = trials
+        record["status"] = "running"
+        record["updated_at"] = datetime.now().isoformat()
+        logger.info(f"Recherche {sweep_id}: {len(trials)} essai(s), ordonnanceur {spec.get('scheduler', 'fifo')}")
+
+        while True:
+            running = [t for t in trials if t["status"] == "running"]
+            for trial in [t for t in trials if t["status"] == "pending"][:max_concurrent - len(running)]:
+                config = dict(spec["base_config"], **trial["params"])
+                config["output_dir"] = None
+                trial["job_id"] = self.launch_trial(config)
+                trial["status"] = "running"
+                trial["started_at"] = datetime.now().isoformat()
+                logger.info(f"Recherche {sweep_id}: {trial['trial_id']} lancé (job {trial['job_id']}, {trial['params']})")
+
+            for trial in [t for t in trials if t["status"] == "running"]:
+                self._update_trial(sweep_id, trial, scheduler)
+
+            self._summarize(record, trials, scheduler)
+            if all(t["status"] not in ("pending", "running") for t in trials):
+                break
+            time.sleep(self.poll_interval)
+
+        record["status"] = "completed" if record.get("best_trial") else "failed"
+        if record["status"] == "failed":
+            record["error"] = "Aucun essai n'a produit de perte de validation"
+        record["updated_at"] = datetime.now().isoformat()
+        logger.info(f"Recherche {sweep_id} terminée: meilleur essai {(record.get('best_trial') or {}).get('trial_id')}")
+
+    def _update_trial(self, sweep_id: str, trial: Dict[str, Any], scheduler: Optional[SuccessiveHalvingScheduler]):
+        """Relève l'état du job d'un essai et applique la décision d'arrêt précoce."""
+        job = self.get_trial(trial["job_id"]) or {}
+        metrics = job.get("metrics") or {}
+        eval_history = job.get("eval_history") or []
+
+        trial["step"] = metrics.get("step", 0)
+        trial["total_steps"] = metrics.get("total_steps")
+        trial["train_loss"] = metrics.get("loss")
+        trial["eval_history"] = eval_history
+        if eval_history:
+            trial["val_loss"] = eval_history[-1]["val_loss"]
+            trial["best_val_loss"] = min(e["val_loss"] for e in eval_history)
+
+        if job.get("status") in FINISHED_STATUSES:
+            trial["status"] = "stopped" if trial.get("stop_reason") else job["status"]
+            trial["error"] = job.get("error")
+            trial["model_path"] = job.get("model_path")
+            trial["finished_at"] = datetime.now().isoformat()
+            return
+
+        if scheduler is not None and not trial.get("stop_reason"):
+            rung = scheduler.on_result(trial["trial_id"], eval_history, trial["total_steps"])
+            if rung is not None:
+                trial["stop_reason"] = f"asha: perte de validation hors du meilleur 1/{scheduler.reduction_factor} au palier {rung}"
+                logger.info(f"Recherche {sweep_id}: arrêt de {trial['trial_id']} au palier {rung}")
+                self.stop_trial(trial["job_id"], "pruned")
+
+    @staticmethod
+    def _summarize(record: Dict[str, Any], trials: List[Dict[str, Any]], scheduler: Optional[SuccessiveHalvingScheduler]):
+        """Publie le meilleur essai et le nombre total de pas consommés."""
+        scored = [t for t in trials if t.get("best_val_loss") is not None and not math.isnan(t["best_val_loss"])]
+        best = min(scored, key=lambda t: t["best_val_loss"]) if scored else None
+        record["best_trial"] = {
+            "trial_id": best["trial_id"],
+            "job_id": best["job_id"],
+            "params": best["params"],
+            "best_val_loss": best["best_val_loss"],
+            "model_path": best.get("model_path")
+        } if best else None
+        record["steps_consumed"] = sum(t.get("step") or 0 for t in trials)
+        record["trial_counts"] = {
+            status: sum(1 for t in trials if t["status"] == status)
+            for status in ("pending", "running", "completed", "stopped", "failed", "cancelled")
+        }
+        if scheduler is not None:
+            record["rungs"] = scheduler.get_status()
+        record["updated_at"] = datetime.now().isoformat()
@@ -0,0 +1,427 @@
+import time
+import queue
+import logging
+import threading
+from contextlib import nullcontext
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional, Hashable
+
+from prefix_cache import PrefixCache, kv_size
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("inference_engine.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("inference-engine")
+
+# Nombre de requêtes récentes conservées pour les statistiques d'attente
+RECENT_REQUESTS = 200
+
+
+def cache_to_layers(cache) -> List[tuple]:
+    """Extrait les tenseurs (clés, valeurs) de chaque couche d'un cache transformers, quelle que soit sa version."""
+    if isinstance(cache, (tuple, list)):
+        return [(k, v) for k, v in cache]
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def layers_to_cache(layers: List[tuple]):
+    """Construit un DynamicCache à partir des tenseurs (clés, valeurs) de chaque couche."""
+    from transformers import DynamicCache
+
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    return DynamicCache(layers)
+
+
+def token_probabilities(logits, temperature: float, top_p: float):
+    """
+    Distribution du prochain token après température et nucleus sampling (température > 0).
+
+    Args:
+        logits: Logits du dernier token (vecteur de la taille du vocabulaire)
+        temperature: Température
+        top_p: Masse de probabilité conservée (nucleus sampling)
+    """
+    import torch
+
+    probs = torch.softmax(logits.float() / temperature, dim=-1)
+    if 0 < top_p < 1:
+        sorted_probs, sorted_indices = torch.sort(probs, descending=True)
+        # Conserver les tokens jusqu'à atteindre top_p (le plus probable est toujours conservé)
+        remove = torch.cumsum(sorted_probs, dim=-1) - sorted_probs > top_p
+        sorted_probs[remove] = 0.0
+        probs = torch.zeros_like(probs).scatter_(0, sorted_indices, sorted_probs)
+        probs = probs / probs.sum()
+    return probs
+
+
+def sample_token(logits, temperature: float, top_p: float, generator=None) -> int:
+    """
+    Tire le prochain token d'une séquence selon ses propres paramètres d'échantillonnage.
+
+    Args:
+        logits: Logits du dernier token (vecteur de la taille du vocabulaire)
+        temperature: Température (0: décodage glouton)
+        top_p: Masse de probabilité conservée (nucleus sampling)
+        generator: Générateur aléatoire torch (graine de la requête)
+    """
+    import torch
+
+    if temperature <= 0:
+        return int(torch.argmax(logits).item())
+    probs = token_probabilities(logits, temperature, top_p)
+    return int(torch.multinomial(probs, 1, generator=generator).item())
+
+
+class ContinuousBatchingEngine:
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        max_batch_size: int = 8,
+        name: str = "model",
+        prefix_cache: Optional[PrefixCache] = None,
+        cache_key: Optional[Hashable] = None,
+        adapters=None
+    ):
+        """
+        Moteur d'inférence à batching continu pour un modèle transformers chargé.
+
+        Les requêtes sont mises en file puis intégrées au batch en cours à la frontière
+        d'un pas de décodage: chaque nouvelle requête est pré-remplie seule, puis son cache
+        clé/valeur est ajouté (avec padding à gauche) au cache du batch. Une requête quitte
+        le batch dès qu'elle a fini (EOS ou max_tokens), sans attendre les autres. Les
+        paramètres d'échantillonnage restent propres à chaque requête, tout comme
+        l'adaptateur LoRA appliqué (les requêtes de plusieurs adaptateurs partagent le batch).
+
+        Args:
+            model: Modèle transformers (AutoModelForCausalLM)
+            tokenizer: Tokenizer du modèle
+            max_batch_size: Nombre maximal de séquences décodées ensemble
+            name: Nom du modèle (journaux)
+            prefix_cache: Cache des préfixes déjà pré-remplis (seule la suite du prompt est alors calculée)
+            cache_key: Clé du modèle dans le cache de préfixes
+            adapters: Adaptateurs LoRA servis sur ce modèle (AdapterManager)
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max(1, max_batch_size)
+        self.name = name
+        self.prefix_cache = prefix_cache
+        self.cache_key = cache_key if cache_key is not None else name
+        self.adapters = adapters
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+        # État du batch: séquences actives, cache par couche [B, têtes, T, d] et masque d'attention [B, T]
+        self._active: List[Dict[str, Any]] = []
+        self._layers: Optional[List[tuple]] = None
+        self._mask = None
+
+        self.decode_steps = 0
+        self.occupied_slots = 0
+        self.completed = 0
+        self.failed = 0
+        self.generated_tokens = 0
+        self.busy_time = 0.0
+        self._recent: List[Dict[str, float]] = []
+
+        self._thread = threading.Thread(target=self._run, name=f"batching-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        prompt: str,
+        max_tokens: int = 100,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        seed: Optional[int] = None,
+        adapter: Optional[Dict[str, str]] = None
+    ) -> Future:
+        """
+        Ajoute une requête à la file du moteur.
+
+        Args:
+            adapter: Adaptateur LoRA de la requête ({"name", "adapter_path"}; None: modèle de base)
+
+        Returns:
+            Future: Résultat {"generated_text", "tokens", "cached_tokens", "queue_wait", "time_to_first_token", "latency"}
+        """
+        future: Future = Future()
+        if self._stopped.is_set():
+            future.set_exception(RuntimeError(f"Moteur d'inférence arrêté ({self.name})"))
+            return future
+        if adapter is not None and self.adapters is None:
+            future.set_exception(ValueError(f"Ce moteur ne sert pas d'adaptateurs LoRA ({self.name})"))
+            return future
+        self._queue.put({
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": top_p,
+            "seed": seed,
+            "adapter": adapter["name"] if adapter is not None else None,
+            "adapter_path": adapter["adapter_path"] if adapter is not None else None,
+            "future": future,
+            "submitted_at": time.perf_counter()
+        })
+        return future
+
+    def shutdown(self):
+        """Arrête le moteur; les requêtes en cours échouent."""
+        self._stopped.set()
+        self._queue.put(None)
+
+    # Gestion du batch
+
+    def _use_adapters(self, sequences: List[Dict[str, Any]]):
+        if self.adapters is None:
+            return nullcontext()
+        return self.adapters.use([s["adapter"] for s in sequences])
+
+    def _admit(self, request: Dict[str, Any]):
+        """Pré-remplit une requête seule et ajoute sa séquence au batch."""
+        import torch
+
+        request["admitted_at"] = time.perf_counter()
+        if request["adapter"] is not None:
+            # Chargé à la première requête, puis gardé en mémoire (LRU) tant qu'il est demandé
+            self.adapters.attach(request["adapter"], request["adapter_path"])
+            request["adapter_attached"] = True
+        device = self.model.device
+        input_ids = self.tokenizer(request["prompt"], return_tensors="pt")["input_ids"].to(device)
+        tokens = input_ids[0].tolist()
+
+        # Les états clé/valeur dépendent de l'adaptateur appliqué
+        cache_key = self.cache_key
+        if request["adapter"] is not None:
+            cache_key = (self.cache_key, request["adapter"], request["adapter_path"])
+
+        # Réutiliser le plus long préfixe déjà calculé (au moins un token reste à pré-remplir pour les logits)
+        cached, past_key_values = 0, None
+        if self.prefix_cache is not None:
+            state, cached = self.prefix_cache.lookup(cache_key, tokens, max_length=len(tokens) - 1)
+            if state is not None:
+                past_key_values = layers_to_cache([(k[:, :, :cached], v[:, :, :cached]) for k, v in state])
+        with torch.no_grad(), self._use_adapters([request]):
+            outputs = self.model(input_ids=input_ids[:, cached:], past_key_values=past_key_values, use_cache=True)
+
+        generator = None
+        if request["seed"] is not None:
+            generator = torch.Generator(device=outputs.logits.device).manual_seed(request["seed"])
+        sequence = dict(
+            request,
+            generator=generator,
+            length=input_ids.shape[1],
+            cached_tokens=cached,
+            tokens=[],
+            first_token_at=None
+        )
+        layers = cache_to_layers(outputs.past_key_values)
+        if self.prefix_cache is not None:
+            # Les tenseurs conservés ne sont jamais modifiés: le cache du batch est reconstruit par concaténation
+            self.prefix_cache.store(cache_key, tokens, layers, kv_size(layers))
+
+        self._append_token(sequence, outputs.logits[0, -1])
+        if self._finished(sequence):
+            self._complete(sequence)
+            return
+
+        mask = torch.ones((1, sequence["length"]), dtype=torch.long, device=device)
+        if self._layers is None:
+            self._layers, self._mask = layers, mask
+        else:
+            # Padding à gauche de la partie la plus courte pour aligner les longueurs de cache
+            current, new = self._mask.shape[1], mask.shape[1]
+            width = max(current, new)
+            self._layers = [
+                (
+                    torch.cat([self._pad(k, width - current), self._pad(nk, width - new)], dim=0),
+                    torch.cat([self._pad(v, width - current), self._pad(nv, width - new)], dim=0)
+                )
+                for (k, v), (nk, nv) in zip(self._layers, layers)
+            ]
+            self._mask = torch.cat([self._pad_mask(self._mask, width - current), self._pad_mask(mask, width - new)], dim=0)
+        self._active.append(sequence)
+
+    @staticmethod
+    def _pad(tensor, width: int):
+        if width == 0:
+            return tensor
+        import torch
+        shape = list(tensor.shape)
+        shape[2] = width
+        return torch.cat([torch.zeros(shape, dtype=tensor.dtype, device=tensor.device), tensor], dim=2)
+
+    @staticmethod
+    def _pad_mask(mask, width: int):
+        if width == 0:
+            return mask
+        import torch
+        return torch.cat([torch.zeros((mask.shape[0], width), dtype=mask.dtype, device=mask.device), mask], dim=1)
+
+    def _append_token(self, sequence: Dict[str, Any], logits):
+        token = sample_token(logits, sequence["temperature"], sequence["top_p"], sequence["generator"])
+        if sequence["first_token_at"] is None:
+            sequence["first_token_at"] = time.perf_counter()
+        sequence["tokens"].append(token)
+
+    def _finished(self, sequence: Dict[str, Any]) -> bool:
+        return (
+            len(sequence["tokens"]) >= sequence["max_tokens"]
+            or sequence["tokens"][-1] == self.tokenizer.eos_token_id
+        )
+
+    def _complete(self, sequence: Dict[str, Any], error: Optional[Exception] = None):
+        now = time.perf_counter()
+        if sequence.get("adapter_attached"):
+            self.adapters.release(sequence["adapter"])
+        with self._lock:
+            self._recent.append({
+                "queue_wait": sequence.get("admitted_at", now) - sequence["submitted_at"],
+                "latency": now - sequence["submitted_at"]
+            })
+            del self._recent[:-RECENT_REQUESTS]
+            if error is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+                self.generated_tokens += len(sequence["tokens"])
+        if error is not None:
+            sequence["future"].set_exception(error)
+            return
+        sequence["future"].set_result({
+            "generated_text": self.tokenizer.decode(sequence["tokens"], skip_special_tokens=True),
+            "adapter": sequence["adapter"],
+            "tokens": len(sequence["tokens"]),
+            "cached_tokens": sequence["cached_tokens"],
+            "queue_wait": sequence["admitted_at"] - sequence["submitted_at"],
+            "time_to_first_token": sequence["first_token_at"] - sequence["submitted_at"],
+            "latency": now - sequence["submitted_at"]
+        })
+
+    def _decode_step(self):
+        """Décode un token pour toutes les séquences actives puis retire celles qui ont fini."""
+        import torch
+
+        batch_size = len(self._active)
+        device = self.model.device
+        input_ids = torch.tensor([[s["tokens"][-1]] for s in self._active], device=device)
+        # Position réelle de chaque séquence (le padding à gauche n'est pas compté)
+        position_ids = self._mask.sum(dim=1, keepdim=True)
+        mask = torch.cat([self._mask, torch.ones((batch_size, 1), dtype=self._mask.dtype, device=device)], dim=1)
+
+        with torch.no_grad(), self._use_adapters(self._active):
+            outputs = self.model(
+                input_ids=input_ids,
+                attention_mask=mask,
+                position_ids=position_ids,
+                past_key_values=layers_to_cache(self._layers),
+                use_cache=True
+            )
+        self._layers = cache_to_layers(outputs.past_key_values)
+        self._mask = mask
+        self.decode_steps += 1
+        self.occupied_slots += batch_size
+
+        keep = []
+        for index, sequence in enumerate(self._active):
+            self._append_token(sequence, outputs.logits[index, -1])
+            if self._finished(sequence):
+                self._complete(sequence)
+            else:
+                keep.append(index)
+
+        if len(keep) < batch_size:
+            self._active = [self._active[i] for i in keep]
+            if not keep:
+                self._layers, self._mask = None, None
+                return
+            rows = torch.tensor(keep, device=device)
+            self._mask = self._mask.index_select(0, rows)
+            # Retirer le padding devenu commun à toutes les séquences restantes
+            trim = int((self._mask.cumsum(dim=1) == 0).sum(dim=1).min().item())
+            self._mask = self._mask[:, trim:]
+            self._layers = [(k.index_select(0, rows)[:, :, trim:], v.index_select(0, rows)[:, :, trim:]) for k, v in self._layers]
+
+    def _fail_active(self, error: Exception):
+        for sequence in self._active:
+            self._complete(sequence, error)
+        self._active, self._layers, self._mask = [], None, None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            # Bloquer uniquement lorsque aucun batch n'est en cours
+            try:
+                request = self._queue.get(block=not self._active)
+            except queue.Empty:
+                request = None
+            else:
+                if request is None:
+                    break
+
+            start = time.perf_counter()
+            try:
+                # Les nouvelles requêtes rejoignent le batch à la frontière du pas de décodage
+                while request is not None:
+                    try:
+                        self._admit(request)
+                    except Exception as e:
+                        logger.error(f"Erreur lors du pré-remplissage d'une requête ({self.name}): {str(e)}")
+                        self._complete(request, e)
+                    if len(self._active) >= self.max_batch_size:
+                        break
+                    try:
+                        request = self._queue.get_nowait()
+                    except queue.Empty:
+                        request = None
+
+                if self._active:
+                    self._decode_step()
+            except Exception as e:
+                logger.error(f"Erreur lors du décodage par batch ({self.name}): {str(e)}")
+                self._fail_active(e)
+            self.busy_time += time.perf_counter() - start
+
+        self._fail_active(RuntimeError(f"Moteur d'inférence arrêté ({self.name})"))
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request["future"].set_exception(RuntimeError(f"Moteur d'inférence arrêté ({self.name})"))
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne les statistiques du moteur (file, occupation du batch, temps d'attente)."""
+        with self._lock:
+            recent = list(self._recent)
+        waits = sorted(r["queue_wait"] for r in recent)
+        return {
+            "model": self.name,
+            "max_batch_size": self.max_batch_size,
+            "queue_depth": self._queue.qsize(),
+            "active": len(self._active),
+            "decode_steps": self.decode_steps,
+            "mean_batch_size": self.occupied_slots / self.decode_steps if self.decode_steps else 0.0,
+            "batch_occupancy": self.occupied_slots / (self.decode_steps * self.max_batch_size) if self.decode_steps else 0.0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "generated_tokens": self.generated_tokens,
+            "tokens_per_sec": self.generated_tokens / self.busy_time if self.busy_time > 0 else 0.0,
+            "queue_wait": {
+                "mean": sum(waits) / len(waits) if waits else 0.0,
+                "p50": waits[len(waits) // 2] if waits else 0.0,
+                "max": waits[-1] if waits else 0.0
+            },
+            "adapters": self.adapters.get_status() if self.adapters is not None else None
+        }
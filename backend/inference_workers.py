@@ -0,0 +1,169 @@
+import math
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Hashable
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("inference_workers.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("inference-workers")
+
+# Nombre de requêtes récentes conservées pour les statistiques d'attente et de durée
+RECENT_REQUESTS = 200
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int, message: str):
+        """File d'inférence pleine: la requête est refusée immédiatement."""
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class InferenceWorkerPool:
+    def __init__(self, max_workers: int = 4, max_queue: int = 32):
+        """
+        Pool dédié à l'exécution des requêtes d'inférence, isolé du reste de l'API.
+
+        Les appels bloquants (chargement, génération llama-cpp, lecture des flux) s'exécutent
+        dans un pool de threads réservé à l'inférence plutôt que dans la boucle d'événements
+        ou le pool par défaut. Au plus max_workers requêtes occupant un thread s'exécutent en
+        même temps (les requêtes confiées au moteur à batching continu, qui a son propre
+        thread, n'en occupent pas), et chaque modèle a sa propre limite de concurrence
+        (la taille de batch du moteur pour un modèle transformers). Au-delà de max_queue requêtes en
+        attente, les nouvelles requêtes sont refusées immédiatement (QueueFullError) avec
+        une estimation du délai avant de réessayer.
+
+        Args:
+            max_workers: Nombre de requêtes occupant un thread exécutées simultanément
+            max_queue: Nombre maximal de requêtes en attente
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._loop = None
+        self._slots = None
+        self._model_slots: Dict[Hashable, asyncio.Semaphore] = {}
+        self.waiting = 0
+        self.running = 0
+        self._per_model: Dict[Hashable, Dict[str, int]] = {}
+        self.completed = 0
+        self.rejected = 0
+        self._recent: List[Dict[str, float]] = []
+
+    def _bind(self):
+        # Les sémaphores asyncio appartiennent à une boucle d'événements
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_workers)
+            self._model_slots = {}
+
+    def retry_after(self) -> int:
+        """Délai estimé (en secondes) avant qu'une place se libère dans la file."""
+        # Médiane plutôt que moyenne: un chargement de modèle ne doit pas fausser l'estimation
+        durations = [r["duration"] for r in self._recent]
+        typical = _percentile(durations, 0.5) if durations else 1.0
+        return max(1, math.ceil(typical * (self.waiting + 1) / self.max_workers))
+
+    @asynccontextmanager
+    async def slot(self, model_key: Hashable, concurrency: int, block: bool = False, needs_worker: bool = True):
+        """
+        Réserve une place d'exécution pour une requête sur un modèle.
+
+        Args:
+            model_key: Clé du modèle
+            concurrency: Nombre maximal de requêtes simultanées sur ce modèle
+            block: Attendre même si la file est pleine (tâches en arrière-plan)
+            needs_worker: La requête occupe un thread du pool pendant toute son exécution
+                          (False: seule la limite du modèle s'applique)
+
+        Raises:
+            QueueFullError: Si la file d'attente est pleine
+        """
+        self._bind()
+        full = self.waiting >= self.max_queue and (self.running >= self.max_workers or self.waiting > 0)
+        if full and not block:
+            self.rejected += 1
+            raise QueueFullError(
+                self.retry_after(),
+                f"File d'inférence pleine ({self.waiting} requêtes en attente)"
+            )
+
+        stats = self._per_model.setdefault(model_key, {"waiting": 0, "running": 0})
+        model_slots = self._model_slots.setdefault(model_key, asyncio.Semaphore(max(1, concurrency)))
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        stats["waiting"] += 1
+        acquired = []
+        try:
+            await model_slots.acquire()
+            acquired.append(model_slots)
+            if needs_worker:
+                await self._slots.acquire()
+                acquired.append(self._slots)
+        except BaseException:
+            for semaphore in acquired:
+                semaphore.release()
+            raise
+        finally:
+            self.waiting -= 1
+            stats["waiting"] -= 1
+
+        started_at = time.perf_counter()
+        self.running += 1
+        stats["running"] += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            stats["running"] -= 1
+            if needs_worker:
+                self._slots.release()
+            model_slots.release()
+            self.completed += 1
+            self._recent.append({"wait": started_at - queued_at, "duration": time.perf_counter() - started_at})
+            del self._recent[:-RECENT_REQUESTS]
+
+    async def run(self, function, *args):
+        """Exécute un appel bloquant dans le pool de threads de l'inférence."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne l'état de la file (profondeur, requêtes en cours, attentes, refus)."""
+        waits = [r["wait"] for r in self._recent]
+        durations = [r["duration"] for r in self._recent]
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait": {
+                "mean": sum(waits) / len(waits) if waits else 0.0,
+                "p50": _percentile(waits, 0.5),
+                "p95": _percentile(waits, 0.95),
+                "max": max(waits) if waits else 0.0
+            },
+            "duration": {
+                "mean": sum(durations) / len(durations) if durations else 0.0,
+                "p95": _percentile(durations, 0.95)
+            },
+            "models": {str(key): dict(value) for key, value in self._per_model.items()}
+        }
@@ -0,0 +1,401 @@
+import json
+import time
+import socket
+import sqlite3
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("job_queue.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("job-queue")
+
+# Colonnes JSON décodées à la lecture
+JSON_COLUMNS = ("payload", "requirements", "record", "capabilities")
+
+
+class JobQueue:
+    def __init__(self, db_path: str = "unsloth.db", lease_seconds: float = 60.0):
+        """
+        Initialise la file de jobs partagée (SQLite).
+
+        Les workers louent un job pour une durée limitée et prolongent le bail par
+        des heartbeats; un job dont le bail expire (worker mort) est remis en file.
+
+        La base est en mode WAL (mémoire partagée): l'API et les workers doivent
+        s'exécuter sur la même machine, et db_path ne doit pas être sur un partage
+        réseau (NFS, SMB).
+
+        Args:
+            db_path: Chemin local de la base SQLite partagée entre l'API et les workers
+            lease_seconds: Durée d'un bail sans heartbeat avant remise en file
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self._create_tables()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _create_tables(self):
+        conn = self._connect()
+        try:
+            # WAL: lectures concurrentes des processus d'une même machine (pas de partage réseau)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS job_queue (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT,
+                payload TEXT,
+                requirements TEXT,
+                status TEXT,
+                worker_id TEXT,
+                lease_expires_at REAL,
+                heartbeat_at REAL,
+                attempts INTEGER,
+                max_attempts INTEGER,
+                record TEXT,
+                error TEXT,
+                created_at TEXT,
+                updated_at TEXT
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                hostname TEXT,
+                capabilities TEXT,
+                status TEXT,
+                current_job TEXT,
+                heartbeat_at REAL,
+                started_at TEXT
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_queue_status ON job_queue (status, created_at)")
+
+            # Migration des bases créées avant l'ajout des demandes d'arrêt
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(job_queue)").fetchall()]
+            if "stop_requested" not in columns:
+                conn.execute("ALTER TABLE job_queue ADD COLUMN stop_requested INTEGER DEFAULT 0")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        data = dict(row)
+        for column in JSON_COLUMNS:
+            if column in data and data[column] is not None:
+                data[column] = json.loads(data[column])
+        return data
+
+    def enqueue(
+        self,
+        job_id: str,
+        kind: str,
+        payload: Dict[str, Any],
+        requirements: Optional[List[str]] = None,
+        max_attempts: int = 3
+    ) -> Dict[str, Any]:
+        """
+        Ajoute un job à la file.
+
+        Args:
+            job_id: Identifiant du job (identique à celui retourné par l'API)
+            kind: Type de job ("finetune", "preprocess", "export", "evaluate")
+            payload: Arguments JSON du job
+            requirements: Capacités exigées du worker (ex: ["gpu"])
+            max_attempts: Nombre maximal de tentatives (remises en file comprises)
+
+        Returns:
+            Dict[str, Any]: Enregistrement du job dans la file
+        """
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        try:
+            conn.execute(
+                '''INSERT INTO job_queue (job_id, kind, payload, requirements, status, attempts,
+                                          max_attempts, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, 'queued', 0, ?, ?, ?)''',
+                (job_id, kind, json.dumps(payload), json.dumps(requirements or []), max_attempts, now, now)
+            )
+        finally:
+            conn.close()
+        logger.info(f"Job {job_id} ({kind}) ajouté à la file")
+        return self.get(job_id)
+
+    def lease(self, worker_id: str, capabilities: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Loue le plus ancien job en file compatible avec les capacités du worker.
+
+        Args:
+            worker_id: Identifiant du worker
+            capabilities: Capacités du worker (ex: ["cpu"], ["cpu", "gpu"])
+
+        Returns:
+            Optional[Dict[str, Any]]: Job loué, ou None si aucun job compatible n'est en file
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._requeue_expired(conn)
+
+            rows = conn.execute(
+                "SELECT job_id, requirements FROM job_queue WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+            job_id = None
+            for row in rows:
+                if set(json.loads(row["requirements"] or "[]")) <= set(capabilities):
+                    job_id = row["job_id"]
+                    break
+
+            if job_id is None:
+                conn.execute("COMMIT")
+                return None
+
+            now = time.time()
+            conn.execute(
+                '''UPDATE job_queue
+                   SET status = 'leased', worker_id = ?, lease_expires_at = ?, heartbeat_at = ?,
+                       attempts = attempts + 1, updated_at = ?
+                   WHERE job_id = ?''',
+                (worker_id, now + self.lease_seconds, now, datetime.now().isoformat(), job_id)
+            )
+            conn.execute(
+                "UPDATE workers SET current_job = ?, heartbeat_at = ? WHERE worker_id = ?",
+                (job_id, now, worker_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        logger.info(f"Job {job_id} loué par le worker {worker_id}")
+        return self.get(job_id)
+
+    def retry(self, job_id: str) -> bool:
+        """
+        Remet en file un job terminé ou échoué (ex: reprise depuis son dernier checkpoint).
+
+        Args:
+            job_id: Identifiant du job
+
+        Returns:
+            bool: False si le job n'existe pas ou est encore en file / en cours
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                '''UPDATE job_queue
+                   SET status = 'queued', worker_id = NULL, lease_expires_at = NULL, attempts = 0,
+                       error = NULL, stop_requested = 0, updated_at = ?
+                   WHERE job_id = ? AND status IN ('completed', 'failed', 'cancelled')''',
+                (datetime.now().isoformat(), job_id)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def request_stop(self, job_id: str) -> bool:
+        """
+        Demande l'arrêt d'un job: un job en file est annulé, un job loué est signalé à son worker.
+
+        Args:
+            job_id: Identifiant du job
+
+        Returns:
+            bool: False si le job n'existe pas ou est déjà terminé
+        """
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                '''UPDATE job_queue SET status = 'cancelled', stop_requested = 1, updated_at = ?
+                   WHERE job_id = ? AND status = 'queued' ''',
+                (now, job_id)
+            )
+            if cursor.rowcount == 0:
+                cursor = conn.execute(
+                    "UPDATE job_queue SET stop_requested = 1, updated_at = ? WHERE job_id = ? AND status = 'leased'",
+                    (now, job_id)
+                )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def is_stop_requested(self, job_id: str) -> bool:
+        """Indique si l'arrêt d'un job a été demandé."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT stop_requested FROM job_queue WHERE job_id = ?", (job_id,)).fetchone()
+            return bool(row and row["stop_requested"])
+        finally:
+            conn.close()
+
+    def heartbeat(self, worker_id: str, job_id: str, record: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Prolonge le bail d'un job et publie l'état courant de son enregistrement.
+
+        Args:
+            worker_id: Identifiant du worker
+            job_id: Identifiant du job loué
+            record: Instantané de l'enregistrement de statut (progression, métriques)
+
+        Returns:
+            bool: False si le worker ne détient plus le bail (job remis en file)
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                '''UPDATE job_queue
+                   SET lease_expires_at = ?, heartbeat_at = ?, record = COALESCE(?, record), updated_at = ?
+                   WHERE job_id = ? AND worker_id = ? AND status = 'leased' ''',
+                (now + self.lease_seconds, now, json.dumps(record, default=str) if record is not None else None,
+                 datetime.now().isoformat(), job_id, worker_id)
+            )
+            conn.execute("UPDATE workers SET heartbeat_at = ? WHERE worker_id = ?", (now, worker_id))
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def _finish(self, job_id: str, worker_id: str, status: str, record: Optional[Dict[str, Any]], error: Optional[str]) -> bool:
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                '''UPDATE job_queue
+                   SET status = ?, record = COALESCE(?, record), error = ?, lease_expires_at = NULL, updated_at = ?
+                   WHERE job_id = ? AND worker_id = ? AND status = 'leased' ''',
+                (status, json.dumps(record, default=str) if record is not None else None, error,
+                 datetime.now().isoformat(), job_id, worker_id)
+            )
+            conn.execute("UPDATE workers SET current_job = NULL WHERE worker_id = ?", (worker_id,))
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def complete(self, job_id: str, worker_id: str, record: Optional[Dict[str, Any]] = None) -> bool:
+        """Marque un job loué comme terminé."""
+        return self._finish(job_id, worker_id, "completed", record, None)
+
+    def fail(self, job_id: str, worker_id: str, error: str, record: Optional[Dict[str, Any]] = None) -> bool:
+        """Marque un job loué comme échoué."""
+        return self._finish(job_id, worker_id, "failed", record, error)
+
+    def _requeue_expired(self, conn: sqlite3.Connection) -> int:
+        """Remet en file les jobs dont le bail a expiré (worker mort ou bloqué)."""
+        now = time.time()
+        expired = conn.execute(
+            "SELECT job_id, worker_id, attempts, max_attempts FROM job_queue WHERE status = 'leased' AND lease_expires_at < ?",
+            (now,)
+        ).fetchall()
+
+        for row in expired:
+            if row["attempts"] >= row["max_attempts"]:
+                conn.execute(
+                    '''UPDATE job_queue SET status = 'failed', error = ?, lease_expires_at = NULL, updated_at = ?
+                       WHERE job_id = ?''',
+                    (f"Bail expiré après {row['attempts']} tentatives (dernier worker: {row['worker_id']})",
+                     datetime.now().isoformat(), row["job_id"])
+                )
+                logger.warning(f"Job {row['job_id']} abandonné après {row['attempts']} tentatives")
+            else:
+                conn.execute(
+                    '''UPDATE job_queue SET status = 'queued', worker_id = NULL, lease_expires_at = NULL, updated_at = ?
+                       WHERE job_id = ?''',
+                    (datetime.now().isoformat(), row["job_id"])
+                )
+                logger.warning(f"Bail du job {row['job_id']} expiré (worker {row['worker_id']}), job remis en file")
+            conn.execute("UPDATE workers SET status = 'dead', current_job = NULL WHERE worker_id = ?", (row["worker_id"],))
+
+        return len(expired)
+
+    def requeue_expired(self) -> int:
+        """
+        Remet en file les jobs dont le bail a expiré.
+
+        Returns:
+            int: Nombre de jobs traités
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            count = self._requeue_expired(conn)
+            conn.execute("COMMIT")
+            return count
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Retourne l'enregistrement d'un job de la file, ou None."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM job_queue WHERE job_id = ?", (job_id,)).fetchone()
+            return self._row_to_dict(row) if row else None
+        finally:
+            conn.close()
+
+    def list(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Liste les jobs de la file, éventuellement filtrés par type."""
+        conn = self._connect()
+        try:
+            if kind is None:
+                rows = conn.execute("SELECT * FROM job_queue ORDER BY created_at").fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM job_queue WHERE kind = ? ORDER BY created_at", (kind,)).fetchall()
+            return [self._row_to_dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def register_worker(self, worker_id: str, capabilities: List[str]):
+        """Enregistre (ou réenregistre) un worker."""
+        conn = self._connect()
+        try:
+            conn.execute(
+                '''INSERT OR REPLACE INTO workers (worker_id, hostname, capabilities, status, current_job, heartbeat_at, started_at)
+                   VALUES (?, ?, ?, 'idle', NULL, ?, ?)''',
+                (worker_id, socket.gethostname(), json.dumps(capabilities), time.time(), datetime.now().isoformat())
+            )
+        finally:
+            conn.close()
+
+    def update_worker(self, worker_id: str, status: str):
+        """Met à jour le statut d'un worker et son heartbeat."""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE workers SET status = ?, heartbeat_at = ? WHERE worker_id = ?",
+                (status, time.time(), worker_id)
+            )
+        finally:
+            conn.close()
+
+    def list_workers(self) -> List[Dict[str, Any]]:
+        """Liste les workers; un worker sans heartbeat depuis la durée d'un bail est considéré mort."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM workers ORDER BY started_at").fetchall()
+        finally:
+            conn.close()
+
+        workers = []
+        now = time.time()
+        for row in rows:
+            worker = self._row_to_dict(row)
+            if worker["status"] != "stopped" and now - (worker["heartbeat_at"] or 0) > self.lease_seconds:
+                worker["status"] = "dead"
+            workers.append(worker)
+        return workers
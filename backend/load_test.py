@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import logging
+import http.client
+from urllib.parse import urlencode, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("load_test.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("load-test")
+
+# Modèle construit localement lorsqu'aucun modèle n'est fourni (aucun téléchargement)
+DEFAULT_TINY_MODEL_DIR = os.path.join("outputs", "load_test", "tiny_model")
+
+SYNTHETIC_SUBJECTS = ["le fine-tuning", "la quantification", "un adaptateur LoRA", "le batching continu", "le cache clé/valeur", "un GPU", "la perplexité", "un tokenizer"]
+SYNTHETIC_TEMPLATES = [
+    "Explique {subject} en une phrase.",
+    "Donne trois avantages et trois limites de {subject} pour un modèle de langage déployé en production.",
+    "Question: quel est le rôle de {subject}? Réponse:",
+    "Rédige un court paragraphe technique sur {subject}, destiné à une équipe d'ingénieurs qui découvre le sujet et doit choisir entre plusieurs approches.",
+]
+
+
+def synthetic_prompts(count: int = 64, seed: int = 0) -> List[str]:
+    """Corpus de prompts de longueurs variées, reproductible (utilisé sans fichier de prompts)."""
+    rng = random.Random(seed)
+    return [rng.choice(SYNTHETIC_TEMPLATES).format(subject=rng.choice(SYNTHETIC_SUBJECTS)) for _ in range(count)]
+
+
+def load_prompts(path: Optional[str], prompt_column: Optional[str] = None) -> List[str]:
+    """Charge le corpus de prompts (CSV ou JSONL, mêmes formats que l'inférence par lots)."""
+    if path is None:
+        return synthetic_prompts()
+    from batch_inference import iter_prompts
+
+    return [item["prompt"] for item in iter_prompts(path, prompt_column)]
+
+
+def build_tiny_model(output_dir: str, texts: List[str], vocab_size: int = 512) -> str:
+    """
+    Construit un petit modèle Llama aléatoire et son tokenizer BPE, entraîné sur le corpus.
+
+    Le modèle ne produit pas de texte utile mais exerce tout le chemin d'inférence
+    (pool, batching continu, caches) sans réseau ni GPU. Le répertoire est réutilisé
+    s'il existe déjà.
+
+    Returns:
+        str: Répertoire du modèle
+    """
+    if os.path.exists(os.path.join(output_dir, "config.json")):
+        return output_dir
+
+    import torch
+    from tokenizers import Tokenizer, models, trainers, pre_tokenizers, decoders
+    from transformers import PreTrainedTokenizerFast, LlamaConfig, LlamaForCausalLM
+
+    tokenizer = Tokenizer(models.BPE(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(texts, trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=["<unk>", "<s>", "</s>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    ))
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>", unk_token="<unk>")
+
+    torch.manual_seed(0)
+    model = LlamaForCausalLM(LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=2048,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id
+    ))
+    os.makedirs(output_dir, exist_ok=True)
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    logger.info(f"Modèle de test construit dans {output_dir}")
+    return output_dir
+
+
+def start_local_server(host: str = "127.0.0.1"):
+    """
+    Démarre l'API dans ce processus, sur un port libre, dans un thread.
+
+    Returns:
+        Tuple[str, uvicorn.Server]: URL de l'API et serveur (server.should_exit = True pour l'arrêter)
+    """
+    import uvicorn
+    import app
+
+    with socket.socket() as s:
+        s.bind((host, 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app.app, host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://{host}:{port}", server
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Moyenne, p50, p95, p99 et maximum (interpolation linéaire entre rangs)."""
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def at(fraction: float) -> float:
+        position = fraction * (len(ordered) - 1)
+        low = int(position)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+    return {
+        "mean": sum(ordered) / len(ordered),
+        "p50": at(0.50),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": ordered[-1]
+    }
+
+
+def send_request(base_url: str, form: Dict[str, Any], stream: bool, scheduled_at: float, timeout: float) -> Dict[str, Any]:
+    """
+    Envoie une requête d'inférence et mesure sa latence.
+
+    La latence est comptée depuis l'instant où la requête devait partir (scheduled_at):
+    en débit fixe, l'attente d'une connexion libre fait partie de la latence observée.
+
+    Returns:
+        Dict[str, Any]: {"ok", "status", "latency", "time_to_first_token", "tokens", "error"}
+    """
+    url = urlsplit(base_url)
+    path = "/api/inference/stream" if stream else "/api/inference"
+    body = urlencode({k: v for k, v in form.items() if v is not None})
+    result = {"ok": False, "status": None, "latency": None, "time_to_first_token": None, "tokens": None, "error": None}
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+    try:
+        conn.request("POST", path, body=body, headers={"Content-Type": "application/x-www-form-urlencoded"})
+        response = conn.getresponse()
+        result["status"] = response.status
+        if response.status != 200:
+            result["error"] = response.read().decode("utf-8", errors="replace")[:200]
+        elif stream:
+            # Premier morceau: premier événement "data" reçu par le client
+            event, chunks = None, 0
+            for raw in response:
+                line = raw.decode("utf-8").strip()
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    if event is None:
+                        chunks += 1
+                        if result["time_to_first_token"] is None:
+                            result["time_to_first_token"] = time.perf_counter() - scheduled_at
+                    elif event == "error":
+                        result["error"] = json.loads(line[len("data:"):]).get("error")
+                    event = None
+            result["tokens"] = chunks
+            result["ok"] = result["error"] is None
+        else:
+            payload = json.loads(response.read())
+            metrics = payload.get("metrics") or {}
+            # Sans flux, le délai du premier token est celui mesuré par le serveur (si disponible)
+            result["time_to_first_token"] = metrics.get("time_to_first_token")
+            result["tokens"] = metrics.get("tokens")
+            result["ok"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        conn.close()
+    result["latency"] = time.perf_counter() - scheduled_at
+    return result
+
+
+def run_load_test(
+    base_url: str,
+    model_path: str,
+    prompts: List[str],
+    requests: int = 100,
+    concurrency: Optional[int] = 8,
+    rate: Optional[float] = None,
+    max_tokens: int = 32,
+    temperature: float = 0.7,
+    top_p: float = 0.9,
+    stream: bool = False,
+    timeout: float = 300.0
+) -> Dict[str, Any]:
+    """
+    Rejoue le corpus de prompts contre l'API, à concurrence fixe ou à débit fixe.
+
+    À concurrence fixe, `concurrency` clients envoient chacun leur requête suivante dès
+    la réponse reçue (boucle fermée). À débit fixe, une requête part toutes les 1/rate
+    secondes quelle que soit la durée des précédentes (boucle ouverte), ce qui révèle
+    la saturation: file d'attente, refus 429 et latences croissantes.
+
+    Returns:
+        Dict[str, Any]: Rapport (latences p50/p95/p99, premier token, tokens/s, taux d'erreur)
+    """
+    forms = [
+        {"model_path": model_path, "prompt": prompts[i % len(prompts)], "max_tokens": max_tokens, "temperature": temperature, "top_p": top_p}
+        for i in range(requests)
+    ]
+    results: List[Dict[str, Any]] = []
+    results_lock = threading.Lock()
+
+    def record(result: Dict[str, Any]):
+        with results_lock:
+            results.append(result)
+
+    start = time.perf_counter()
+    if rate:
+        with ThreadPoolExecutor(max_workers=min(requests, 256)) as executor:
+            for i, form in enumerate(forms):
+                scheduled_at = start + i / rate
+                time.sleep(max(0.0, scheduled_at - time.perf_counter()))
+                executor.submit(lambda f=form, t=scheduled_at: record(send_request(base_url, f, stream, t, timeout)))
+    else:
+        pending = iter(forms)
+        pending_lock = threading.Lock()
+
+        def client():
+            while True:
+                with pending_lock:
+                    form = next(pending, None)
+                if form is None:
+                    return
+                record(send_request(base_url, form, stream, time.perf_counter(), timeout))
+
+        threads = [threading.Thread(target=client) for _ in range(max(1, concurrency or 1))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    duration = time.perf_counter() - start
+
+    succeeded = [r for r in results if r["ok"]]
+    status_codes: Dict[str, int] = {}
+    for r in results:
+        key = str(r["status"]) if r["status"] is not None else "connection_error"
+        status_codes[key] = status_codes.get(key, 0) + 1
+    tokens = sum(r["tokens"] or 0 for r in succeeded)
+    errors = [r["error"] for r in results if not r["ok"]]
+    return {
+        "config": {
+            "base_url": base_url,
+            "model_path": model_path,
+            "mode": "rate" if rate else "concurrency",
+            "concurrency": None if rate else concurrency,
+            "rate": rate,
+            "requests": requests,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": top_p,
+            "stream": stream,
+            "prompts": len(prompts)
+        },
+        "duration": duration,
+        "requests": len(results),
+        "succeeded": len(succeeded),
+        "errors": len(results) - len(succeeded),
+        "error_rate": (len(results) - len(succeeded)) / len(results) if results else 0.0,
+        "status_codes": status_codes,
+        "throughput_rps": len(succeeded) / duration if duration > 0 else 0.0,
+        "generated_tokens": tokens,
+        "tokens_per_sec": tokens / duration if duration > 0 else 0.0,
+        "latency": percentiles([r["latency"] for r in succeeded]),
+        "time_to_first_token": percentiles([r["time_to_first_token"] for r in succeeded if r["time_to_first_token"] is not None]),
+        "sample_errors": errors[:5]
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Test de charge de /api/inference (rapport JSON comparable entre commits)")
+    parser.add_argument("--url", type=str, default=None, help="URL de l'API (par défaut: API démarrée dans ce processus)")
+    parser.add_argument("--model-path", type=str, default=None, help="Modèle à interroger (par défaut: petit modèle construit localement)")
+    parser.add_argument("--tiny-model-dir", type=str, default=DEFAULT_TINY_MODEL_DIR, help="Répertoire du petit modèle construit localement")
+    parser.add_argument("--prompts", type=str, default=None, help="Corpus de prompts CSV ou JSONL (par défaut: corpus synthétique)")
+    parser.add_argument("--prompt-column", type=str, default=None, help="Colonne du prompt")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, default=8, help="Nombre de clients simultanés (boucle fermée)")
+    mode.add_argument("--rate", type=float, default=None, help="Requêtes par seconde (boucle ouverte)")
+    parser.add_argument("--requests", type=int, default=100, help="Nombre de requêtes mesurées")
+    parser.add_argument("--warmup", type=int, default=2, help="Requêtes non mesurées envoyées avant le test (chargement du modèle)")
+    parser.add_argument("--max-tokens", type=int, default=32, help="Tokens générés par requête")
+    parser.add_argument("--temperature", type=float, default=0.7, help="Température (0 active le cache des réponses)")
+    parser.add_argument("--top-p", type=float, default=0.9, help="Masse de probabilité conservée")
+    parser.add_argument("--stream", action="store_true", help="Utiliser /api/inference/stream (premier token mesuré par le client)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Délai maximal d'une requête en secondes")
+    parser.add_argument("--output", type=str, default=None, help="Fichier du rapport JSON (par défaut: sortie standard)")
+    args = parser.parse_args()
+
+    prompts = load_prompts(args.prompts, args.prompt_column)
+    if not prompts:
+        logger.error("Corpus de prompts vide")
+        return False
+    model_path = args.model_path or os.path.abspath(build_tiny_model(args.tiny_model_dir, prompts))
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        base_url, server = start_local_server()
+        logger.info(f"API démarrée localement sur {base_url}")
+
+    try:
+        if args.warmup > 0:
+            run_load_test(base_url, model_path, prompts, requests=args.warmup, concurrency=1,
+                          max_tokens=args.max_tokens, temperature=args.temperature, top_p=args.top_p,
+                          stream=args.stream, timeout=args.timeout)
+        report = run_load_test(
+            base_url,
+            model_path,
+            prompts,
+            requests=args.requests,
+            concurrency=None if args.rate else args.concurrency,
+            rate=args.rate,
+            max_tokens=args.max_tokens,
+            temperature=args.temperature,
+            top_p=args.top_p,
+            stream=args.stream,
+            timeout=args.timeout
+        )
+    finally:
+        if server is not None:
+            server.should_exit = True
+
+    report["git_commit"] = _git_commit()
+    report["created_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        logger.info(f"Rapport écrit dans {args.output}")
+    else:
+        print(output)
+
+    latency = report["latency"]
+    if latency["p50"] is not None:
+        logger.info(
+            f"{report['succeeded']}/{report['requests']} requêtes réussies, "
+            f"latence p50 {latency['p50']:.3f}s p95 {latency['p95']:.3f}s p99 {latency['p99']:.3f}s, "
+            f"{report['tokens_per_sec']:.1f} tokens/s"
+        )
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,423 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import socket
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("model_cache.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("model-cache")
+
+# Marqueur écrit en dernier dans une copie complète du cache
+COMPLETE_MARKER = ".complete"
+
+# Budget disque par défaut du cache (100 Go)
+DEFAULT_MAX_DISK_BYTES = 100 * 1024 ** 3
+
+# Fichiers d'un dépôt transformers téléchargés en plus des poids (configuration, tokenizer, code distant)
+METADATA_EXTENSIONS = (".json", ".model", ".txt", ".py", ".tiktoken")
+
+# Formats de poids par ordre de préférence: un seul est téléchargé
+WEIGHT_EXTENSIONS = (".safetensors", ".bin")
+
+# Durée (en secondes) d'un bail d'utilisation sans heartbeat avant qu'il ne protège plus le modèle
+LEASE_SECONDS = 120.0
+
+
+def _directory_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if not os.path.islink(file_path):
+                total += os.path.getsize(file_path)
+    return total
+
+
+def _split_gguf_name(name: str):
+    """Sépare "organisation/depot/fichier.gguf" en identifiant de dépôt et nom de fichier."""
+    parts = name.split("/")
+    return "/".join(parts[:2]), "/".join(parts[2:])
+
+
+def _select_repo_files(files: List[str]) -> List[str]:
+    """
+    Choisit les fichiers d'un dépôt transformers à télécharger.
+
+    Seuls les fichiers à la racine sont retenus (pas de variantes onnx/, flax/, original/...),
+    et un seul format de poids: safetensors si disponible, sinon .bin.
+    """
+    root_files = [f for f in files if "/" not in f]
+    selected = [f for f in root_files if f.endswith(METADATA_EXTENSIONS)]
+    for extension in WEIGHT_EXTENSIONS:
+        weights = [f for f in root_files if f.endswith(extension) and not f.startswith("training_args")]
+        if weights:
+            return selected + weights
+    return selected
+
+
+def _model_format(path: str) -> str:
+    if path.endswith(".gguf"):
+        return "gguf"
+    if os.path.exists(os.path.join(path, "adapter_config.json")):
+        return "lora"
+    return "huggingface"
+
+
+class ModelCache:
+    def __init__(
+        self,
+        cache_dir: str = os.path.join("models", "cache"),
+        db_path: str = "unsloth.db",
+        max_disk_bytes: Optional[int] = None,
+        lease_seconds: float = LEASE_SECONDS
+    ):
+        """
+        Initialise le cache local partagé des modèles de base.
+
+        Les modèles du Hub sont téléchargés une fois sous cache_dir et enregistrés dans
+        la table models; les jobs suivants (fine-tuning, évaluation, inférence, export)
+        chargent la copie locale. Les chemins locaux sont seulement enregistrés, jamais
+        copiés ni supprimés. Au-delà du budget disque, les copies les moins récemment
+        utilisées sont supprimées.
+
+        Le répertoire et la base sont partagés avec les workers (worker.py): un modèle
+        utilisé est protégé par un bail dans la table model_leases (processus, heartbeat),
+        visible de tous les processus. Le bail d'un processus mort expire après
+        lease_seconds sans heartbeat.
+
+        Args:
+            cache_dir: Répertoire des copies locales
+            db_path: Base SQLite contenant la table models (voir setup.py)
+            max_disk_bytes: Budget disque du cache (UNSLOTH_MODEL_CACHE_BYTES, 100 Go par défaut)
+            lease_seconds: Durée d'un bail d'utilisation sans heartbeat
+        """
+        self.cache_dir = cache_dir
+        self.db_path = db_path
+        self.max_disk_bytes = max_disk_bytes or int(os.environ.get("UNSLOTH_MODEL_CACHE_BYTES", DEFAULT_MAX_DISK_BYTES))
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._model_locks: Dict[str, threading.Lock] = {}
+        self._leases: Dict[str, List[str]] = {}
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._create_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _create_table(self):
+        conn = self._connect()
+        try:
+            # Même schéma que setup.py, complété par les colonnes du cache
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS models (
+                model_id TEXT PRIMARY KEY,
+                name TEXT,
+                base_model TEXT,
+                file_path TEXT,
+                format TEXT,
+                size INTEGER,
+                created_at TEXT
+            )
+            ''')
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(models)").fetchall()]
+            for column, definition in (
+                ("source", "TEXT"),
+                ("last_used_at", "REAL"),
+                ("use_count", "INTEGER DEFAULT 0")
+            ):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE models ADD COLUMN {column} {definition}")
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS model_leases (
+                lease_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                hostname TEXT,
+                pid INTEGER,
+                heartbeat_at REAL
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_model_leases_name ON model_leases(name)")
+        finally:
+            conn.close()
+
+    def _heartbeat_loop(self):
+        """Prolonge les baux du processus; s'arrête quand il n'en détient plus."""
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._lock:
+                lease_ids = [lease_id for ids in self._leases.values() for lease_id in ids]
+                if not lease_ids:
+                    self._heartbeat_thread = None
+                    return
+            try:
+                conn = self._connect()
+                try:
+                    conn.executemany(
+                        "UPDATE model_leases SET heartbeat_at = ? WHERE lease_id = ?",
+                        [(time.time(), lease_id) for lease_id in lease_ids]
+                    )
+                finally:
+                    conn.close()
+            except Exception as e:
+                logger.warning(f"Échec du heartbeat des baux du cache: {str(e)}")
+
+    def _leased_names(self, conn: sqlite3.Connection) -> set:
+        """Modèles protégés par un bail vivant, quel que soit le processus qui le détient."""
+        rows = conn.execute(
+            "SELECT DISTINCT name FROM model_leases WHERE heartbeat_at >= ?",
+            (time.time() - self.lease_seconds,)
+        ).fetchall()
+        return {row["name"] for row in rows}
+
+    def _model_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._model_locks.setdefault(name, threading.Lock())
+
+    def _cache_path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, re.sub(r"[^A-Za-z0-9_.\-]", "--", name))
+
+    def _get_entry(self, name: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM models WHERE name = ? AND source IS NOT NULL", (name,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def _register(self, name: str, path: str, source: str):
+        """Enregistre (ou met à jour) un modèle dans la table models et note son utilisation."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            updated = conn.execute(
+                '''UPDATE models SET file_path = ?, last_used_at = ?, use_count = COALESCE(use_count, 0) + 1
+                   WHERE name = ? AND source IS NOT NULL''',
+                (path, now, name)
+            ).rowcount
+            if updated == 0:
+                conn.execute(
+                    '''INSERT INTO models (model_id, name, base_model, file_path, format, size, created_at,
+                                           source, last_used_at, use_count)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)''',
+                    (str(uuid.uuid4()), name, name, path, _model_format(path), _directory_size(path),
+                     datetime.now().isoformat(), source, now)
+                )
+        finally:
+            conn.close()
+
+    def _download(self, name: str, path: str):
+        """Télécharge un modèle du Hub dans un répertoire temporaire puis le rend visible d'un coup."""
+        from huggingface_hub import HfApi, hf_hub_download, snapshot_download
+
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+        try:
+            if name.endswith(".gguf"):
+                # Dépôt GGUF: seule la quantification demandée est téléchargée
+                repo_id, filename = _split_gguf_name(name)
+                hf_hub_download(repo_id=repo_id, filename=filename, local_dir=tmp_path)
+            else:
+                files = _select_repo_files(HfApi().list_repo_files(name))
+                snapshot_download(repo_id=name, local_dir=tmp_path, allow_patterns=files)
+            open(os.path.join(tmp_path, COMPLETE_MARKER), "w").close()
+            if os.path.exists(os.path.join(path, COMPLETE_MARKER)):
+                # Téléchargé entre-temps par un autre processus
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                return
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    def resolve(self, name: str) -> str:
+        """
+        Retourne le chemin local d'un modèle, en le téléchargeant dans le cache si nécessaire.
+
+        Args:
+            name: Identifiant Hub (ex: "unsloth/llama-3-8b-bnb-4bit"), fichier GGUF d'un dépôt
+                  (ex: "TheBloke/Llama-2-7B-GGUF/llama-2-7b.Q4_K_M.gguf") ou chemin local
+
+        Returns:
+            str: Chemin local à passer à from_pretrained / Llama
+        """
+        if os.path.exists(name):
+            self._register(name, name, "local")
+            return name
+
+        path = self._cache_path(name)
+        with self._model_lock(name):
+            if os.path.exists(os.path.join(path, COMPLETE_MARKER)):
+                self.hits += 1
+            else:
+                self.misses += 1
+                logger.info(f"Téléchargement de {name} dans le cache ({path})")
+                start = time.time()
+                self._download(name, path)
+                logger.info(f"{name} mis en cache en {time.time() - start:.1f}s")
+            if name.endswith(".gguf"):
+                path = os.path.join(path, _split_gguf_name(name)[1])
+            self._register(name, path, "hub")
+
+        self.evict(keep=[name])
+        return path
+
+    def acquire(self, name: str) -> str:
+        """Résout un modèle et le protège de l'éviction (dans tous les processus) jusqu'à l'appel de release."""
+        lease_id = uuid.uuid4().hex
+        # Le bail est enregistré avant la résolution: une éviction concurrente le voit
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO model_leases (lease_id, name, hostname, pid, heartbeat_at) VALUES (?, ?, ?, ?, ?)",
+                (lease_id, name, socket.gethostname(), os.getpid(), time.time())
+            )
+        finally:
+            conn.close()
+        with self._lock:
+            self._leases.setdefault(name, []).append(lease_id)
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+                self._heartbeat_thread.start()
+        try:
+            return self.resolve(name)
+        except Exception:
+            self.release(name)
+            raise
+
+    def release(self, name: str):
+        """Lève la protection posée par acquire."""
+        with self._lock:
+            lease_ids = self._leases.get(name)
+            if not lease_ids:
+                return
+            lease_id = lease_ids.pop()
+            if not lease_ids:
+                self._leases.pop(name, None)
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM model_leases WHERE lease_id = ?", (lease_id,))
+        finally:
+            conn.close()
+
+    def prewarm(self, names: List[str]) -> List[Dict[str, Any]]:
+        """
+        Télécharge à l'avance une liste de modèles.
+
+        Returns:
+            List[Dict[str, Any]]: Résultat par modèle ({"name", "status", "path" | "error"})
+        """
+        results = []
+        for name in names:
+            try:
+                results.append({"name": name, "status": "ready", "path": self.resolve(name)})
+            except Exception as e:
+                logger.error(f"Échec du pré-chargement de {name}: {str(e)}")
+                results.append({"name": name, "status": "failed", "error": str(e)})
+        return results
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        """Liste les modèles enregistrés par le cache, du plus récemment utilisé au plus ancien."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT * FROM models WHERE source IS NOT NULL ORDER BY last_used_at DESC"
+            ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def evict(self, keep: Optional[List[str]] = None) -> List[str]:
+        """
+        Supprime les copies du Hub les moins récemment utilisées jusqu'à respecter le budget disque.
+
+        Les modèles sous bail (acquire, dans n'importe quel processus) et ceux de keep ne sont
+        jamais supprimés.
+
+        Returns:
+            List[str]: Noms des modèles supprimés
+        """
+        keep = set(keep or [])
+        entries = [e for e in self.list_entries() if e["source"] == "hub"]
+        total = sum(e["size"] or 0 for e in entries)
+        evicted = []
+
+        for entry in sorted(entries, key=lambda e: e["last_used_at"] or 0):
+            if total <= self.max_disk_bytes:
+                break
+            if entry["name"] in keep:
+                continue
+
+            with self._model_lock(entry["name"]):
+                # Le répertoire de la copie (file_path désigne le fichier pour un modèle GGUF)
+                path = self._cache_path(entry["name"])
+                trash_path = f"{path}.evicted-{uuid.uuid4().hex[:8]}"
+                conn = self._connect()
+                try:
+                    # Transaction d'écriture: aucun bail ne peut être pris entre la vérification et
+                    # le retrait de la copie, renommée pour qu'un acquire ultérieur la retélécharge
+                    conn.execute("BEGIN IMMEDIATE")
+                    if entry["name"] in self._leased_names(conn):
+                        conn.execute("ROLLBACK")
+                        continue
+                    if os.path.exists(path):
+                        os.replace(path, trash_path)
+                    conn.execute("DELETE FROM models WHERE model_id = ?", (entry["model_id"],))
+                    conn.execute("COMMIT")
+                except Exception:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    raise
+                finally:
+                    conn.close()
+                shutil.rmtree(trash_path, ignore_errors=True)
+            total -= entry["size"] or 0
+            evicted.append(entry["name"])
+            logger.info(f"Modèle {entry['name']} évincé du cache ({(entry['size'] or 0) / 1024 ** 3:.1f} Go)")
+
+        return evicted
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne l'état du cache (taille, budget, succès/échecs, baux, modèles enregistrés)."""
+        entries = self.list_entries()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT name, COUNT(*) AS leases FROM model_leases WHERE heartbeat_at >= ? GROUP BY name",
+                (time.time() - self.lease_seconds,)
+            ).fetchall()
+            in_use = {row["name"]: row["leases"] for row in rows}
+        finally:
+            conn.close()
+        requests = self.hits + self.misses
+        return {
+            "cache_dir": self.cache_dir,
+            "max_disk_bytes": self.max_disk_bytes,
+            "disk_bytes": sum(e["size"] or 0 for e in entries if e["source"] == "hub"),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "in_use": in_use,
+            "models": entries
+        }
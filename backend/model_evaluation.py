@@ -1,5 +1,6 @@
 import os
 import json
+import hashlib
 import logging
 import numpy as np
 import pandas as pd
@@ -18,19 +19,105 @@ logging.basicConfig(
 )
 logger = logging.getLogger("model-evaluation")
 
+# Longueur maximale des fenêtres d'évaluation de la perplexité (tokens)
+PERPLEXITY_MAX_LENGTH = 2048
+
+# Paramètres de décodage des réponses générées pour les métriques (précision, BLEU)
+GENERATION_PARAMS = {"max_new_tokens": 100, "temperature": 0.7, "top_p": 0.9}
+
+
+class GenerationCache:
+    def __init__(self, path: Optional[str] = None):
+        """
+        Réponses générées pendant une évaluation, partagées par les métriques.
+        
+        La clé combine le modèle, le prompt et les paramètres de décodage: une métrique
+        qui demande une réponse déjà générée la relit au lieu de la régénérer. Si path est
+        fourni, chaque réponse est ajoutée à ce fichier JSONL, rechargé par une évaluation
+        ultérieure du même modèle sur le même fichier de test.
+        
+        Args:
+            path: Fichier JSONL des réponses (None: mémoire uniquement)
+        """
+        self.path = None
+        self._entries: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        if path is not None:
+            self.open(path)
+    
+    def open(self, path: str):
+        """Associe le cache à un fichier: les réponses qu'il contient sont rechargées, les suivantes y sont ajoutées."""
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry["text"]
+                    except (ValueError, KeyError):
+                        # Ligne incomplète (interruption pendant l'écriture)
+                        continue
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                for key, text in self._entries.items():
+                    f.write(json.dumps({"key": key, "text": text}, ensure_ascii=False) + "\n")
+        self.path = path
+    
+    @staticmethod
+    def file_name(model: str, test_file: str, params: Dict[str, Any]) -> str:
+        """
+        Nom stable du fichier des réponses: empreinte du modèle, du contenu du fichier de test
+        et des paramètres de décodage (une relance ou une reprise relit les mêmes réponses).
+        """
+        digest = hashlib.sha256()
+        with open(test_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        payload = json.dumps({"model": model, "test_file": digest.hexdigest(), "params": params}, sort_keys=True)
+        return f"{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]}.jsonl"
+    
+    @staticmethod
+    def make_key(model: str, prompt: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps({"model": model, "prompt": prompt, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        text = self._entries.get(key)
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return text
+    
+    def put(self, key: str, prompt: str, text: str):
+        self._entries[key] = text
+        if self.path is not None:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "prompt": prompt, "text": text}, ensure_ascii=False) + "\n")
+    
+    def get_status(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
 class ModelEvaluator:
-    def __init__(self, model_path: str, output_dir: str = "evaluation_results"):
+    def __init__(self, model_path: str, output_dir: str = "evaluation_results", generation_cache_dir: Optional[str] = None):
         """
         Initialise l'évaluateur de modèles.
         
         Args:
             model_path: Chemin vers le modèle à évaluer
             output_dir: Répertoire de sortie pour les résultats d'évaluation
+            generation_cache_dir: Répertoire des réponses générées (par défaut output_dir/generations)
         """
         self.model_path = model_path
         self.output_dir = output_dir
+        self.generation_cache_dir = generation_cache_dir or os.path.join(output_dir, "generations")
         self.model = None
         self.tokenizer = None
+        # Réponses générées partagées par les métriques (précision, BLEU) et par les évaluations successives
+        self.generation_cache = GenerationCache()
+        self._model_id = None
+        self._test_data: Dict[Tuple[str, str], List[Any]] = {}
         
         # Créer le répertoire de sortie s'il n'existe pas
         os.makedirs(output_dir, exist_ok=True)
@@ -67,7 +154,8 @@ class ModelEvaluator:
                     subprocess.run(["pip", "install", "llama-cpp-python"], check=True)
                     from llama_cpp import Llama
                 
-                self.model = Llama(model_path=self.model_path, n_ctx=2048)
+                # logits_all: les logits de toutes les positions sont conservés (perplexité en une passe)
+                self.model = Llama(model_path=self.model_path, n_ctx=2048, logits_all=True)
                 self.tokenizer = None  # Pas de tokenizer séparé pour GGUF
             else:
                 # Charger avec Hugging Face
@@ -84,12 +172,25 @@ class ModelEvaluator:
             logger.error(f"Erreur lors du chargement du modèle: {str(e)}")
             return False
     
-    def evaluate_perplexity(self, test_file: str) -> Dict[str, Any]:
+    def evaluate_perplexity(
+        self,
+        test_file: str,
+        batch_size: int = 8,
+        max_length: Optional[int] = None,
+        stride: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         Évalue la perplexité du modèle sur un ensemble de test.
         
+        La perplexité est calculée sur l'ensemble du corpus (log-vraisemblance négative
+        totale divisée par le nombre total de tokens prédits): chaque token pèse autant,
+        quelle que soit la longueur du texte qui le contient.
+        
         Args:
             test_file: Chemin vers le fichier de test
+            batch_size: Nombre de fenêtres évaluées par passe (Hugging Face)
+            max_length: Longueur maximale d'une fenêtre (contexte du modèle au plus)
+            stride: Décalage entre fenêtres successives d'un texte trop long (max_length / 2 par défaut)
         
         Returns:
             Dict[str, Any]: Résultats de l'évaluation
@@ -104,45 +205,12 @@ class ModelEvaluator:
             
             # Calculer la perplexité
             if self.model_path.endswith(".gguf"):
-                # Méthode pour GGUF
-                perplexities = []
-                for text in test_data:
-                    try:
-                        # Utiliser llama_cpp pour calculer la perplexité
-                        tokens = self.model.tokenize(text.encode())
-                        logits = []
-                        
-                        for i in range(len(tokens) - 1):
-                            output = self.model.eval(tokens[:i+1])
-                            next_token_logits = output[tokens[i+1]]
-                            logits.append(next_token_logits)
-                        
-                        # Calculer la perplexité à partir des logits
-                        log_likelihood = np.mean(logits)
-                        perplexity = np.exp(-log_likelihood)
-                        perplexities.append(perplexity)
-                    except Exception as e:
-                        logger.warning(f"Erreur lors du calcul de la perplexité pour un texte: {str(e)}")
-                
-                avg_perplexity = np.mean(perplexities) if perplexities else float('inf')
+                # Méthode pour GGUF: une passe par fenêtre, tous les logits conservés
+                total_nll, num_tokens = self._gguf_nll(test_data, max_length, stride)
             else:
-                # Méthode pour Hugging Face
-                import torch
-                
-                perplexities = []
-                for text in test_data:
-                    try:
-                        inputs = self.tokenizer(text, return_tensors="pt").to(self.model.device)
-                        with torch.no_grad():
-                            outputs = self.model(**inputs, labels=inputs["input_ids"])
-                        
-                        loss = outputs.loss.item()
-                        perplexity = np.exp(loss)
-                        perplexities.append(perplexity)
-                    except Exception as e:
-                        logger.warning(f"Erreur lors du calcul de la perplexité pour un texte: {str(e)}")
-                
-                avg_perplexity = np.mean(perplexities) if perplexities else float('inf')
+                # Méthode pour Hugging Face: passes par batchs
+                total_nll, num_tokens = self._transformers_nll(test_data, batch_size, max_length, stride)
+            avg_perplexity = float(np.exp(total_nll / num_tokens)) if num_tokens else float('inf')
             
             # Enregistrer les résultats
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -152,7 +220,8 @@ class ModelEvaluator:
                 "value": float(avg_perplexity),
                 "model_path": self.model_path,
                 "test_file": test_file,
-                "timestamp": timestamp
+                "timestamp": timestamp,
+                "num_tokens": num_tokens
             }
             
             # Sauvegarder les résultats
@@ -169,6 +238,132 @@ class ModelEvaluator:
                 "error": str(e)
             }
     
+    def _perplexity_windows(self, token_ids: List[int], max_length: int, stride: int) -> List[Tuple[List[int], int]]:
+        """
+        Découpe un texte en fenêtres d'au plus max_length tokens.
+        
+        Un texte plus long que le contexte est évalué par fenêtres glissantes décalées de
+        stride tokens: chaque fenêtre ne compte que les tokens qui n'ont pas encore été
+        prédits, les précédents servant uniquement de contexte.
+        
+        Returns:
+            List[Tuple[List[int], int]]: (tokens de la fenêtre, position du premier token compté)
+        """
+        if len(token_ids) <= max_length:
+            return [(token_ids, 1)]
+        windows = []
+        previous_end = 1
+        for begin in range(0, len(token_ids), stride):
+            end = min(begin + max_length, len(token_ids))
+            windows.append((token_ids[begin:end], max(1, previous_end - begin)))
+            previous_end = end
+            if end == len(token_ids):
+                break
+        return windows
+    
+    def _transformers_nll(
+        self,
+        texts: List[str],
+        batch_size: int = 8,
+        max_length: Optional[int] = None,
+        stride: Optional[int] = None
+    ) -> Tuple[float, int]:
+        """
+        Log-vraisemblance négative totale des textes et nombre de tokens prédits (Hugging Face).
+        
+        Les fenêtres sont triées par longueur puis évaluées par batchs avec padding et masque
+        d'attention: les textes de longueurs voisines partagent une passe sans padding inutile.
+        
+        Returns:
+            Tuple[float, int]: (somme des log-vraisemblances négatives, nombre de tokens comptés)
+        """
+        import torch
+        import torch.nn.functional as F
+        
+        context = getattr(self.model.config, "max_position_embeddings", None) or PERPLEXITY_MAX_LENGTH
+        max_length = min(max_length or context, context, PERPLEXITY_MAX_LENGTH)
+        stride = max(1, min(stride or max_length // 2, max_length - 1))
+        pad_token_id = self.tokenizer.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = self.tokenizer.eos_token_id or 0
+        
+        windows = []
+        for text in texts:
+            token_ids = self.tokenizer(str(text))["input_ids"]
+            if len(token_ids) < 2:
+                continue
+            windows.extend(self._perplexity_windows(token_ids, max_length, stride))
+        windows.sort(key=lambda w: len(w[0]), reverse=True)
+        
+        total_nll, num_tokens = 0.0, 0
+        device = self.model.device
+        for start in range(0, len(windows), batch_size):
+            batch = windows[start:start + batch_size]
+            width = len(batch[0][0])
+            input_ids = torch.full((len(batch), width), pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+            # Masque des tokens comptés (position dans la fenêtre >= premier token compté, hors padding)
+            scored = torch.zeros((len(batch), width), dtype=torch.bool)
+            for row, (token_ids, first_scored) in enumerate(batch):
+                input_ids[row, :len(token_ids)] = torch.tensor(token_ids)
+                attention_mask[row, :len(token_ids)] = 1
+                scored[row, first_scored:len(token_ids)] = True
+            input_ids, attention_mask = input_ids.to(device), attention_mask.to(device)
+            
+            with torch.no_grad():
+                logits = self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+            
+            # Le logit de la position i prédit le token i + 1; conversion en float32 ligne par ligne
+            for row in range(len(batch)):
+                mask = scored[row, 1:].to(logits.device)
+                nll = F.cross_entropy(logits[row, :-1].float(), input_ids[row, 1:], reduction="none")
+                total_nll += float(nll[mask].sum().item())
+                num_tokens += int(mask.sum().item())
+        
+        return total_nll, num_tokens
+    
+    def _gguf_nll(
+        self,
+        texts: List[str],
+        max_length: Optional[int] = None,
+        stride: Optional[int] = None
+    ) -> Tuple[float, int]:
+        """
+        Log-vraisemblance négative totale des textes et nombre de tokens prédits (GGUF).
+        
+        Chaque fenêtre est évaluée une seule fois par llama-cpp (le modèle est chargé avec
+        logits_all): le log-softmax et les log-probabilités des tokens cibles sont ensuite
+        calculés en NumPy pour toutes les positions à la fois. Le coût est linéaire en
+        nombre de tokens.
+        
+        Returns:
+            Tuple[float, int]: (somme des log-vraisemblances négatives, nombre de tokens comptés)
+        """
+        n_ctx = self.model.n_ctx()
+        max_length = min(max_length or n_ctx, n_ctx)
+        stride = max(1, min(stride or max_length // 2, max_length - 1))
+        
+        total_nll, num_tokens = 0.0, 0
+        for text in texts:
+            token_ids = self.model.tokenize(str(text).encode("utf-8"))
+            if len(token_ids) < 2:
+                continue
+            for window, first_scored in self._perplexity_windows(token_ids, max_length, stride):
+                self.model.reset()
+                self.model.eval(window)
+                
+                # Le logit de la position i prédit le token i + 1
+                logits = np.asarray(self.model.scores[:len(window) - 1], dtype=np.float32)
+                targets = np.asarray(window[1:])
+                peak = logits.max(axis=1, keepdims=True)
+                log_normalizer = peak[:, 0] + np.log(np.exp(logits - peak).sum(axis=1))
+                log_probs = logits[np.arange(len(targets)), targets] - log_normalizer
+                
+                total_nll -= float(log_probs[first_scored - 1:].sum())
+                num_tokens += len(targets) - (first_scored - 1)
+        
+        return total_nll, num_tokens
+    
     def evaluate_accuracy(self, test_file: str) -> Dict[str, Any]:
         """
         Évalue la précision du modèle sur un ensemble de test.
@@ -186,6 +381,7 @@ class ModelEvaluator:
         try:
             # Charger les données de test
             test_data = self._load_test_data(test_file, format_type="qa")
+            self._open_generation_cache(test_file)
             
             # Évaluer la précision
             correct = 0
@@ -196,28 +392,8 @@ class ModelEvaluator:
                 question = item["question"]
                 expected_answer = item["answer"]
                 
-                # Générer une réponse
-                if self.model_path.endswith(".gguf"):
-                    # Méthode pour GGUF
-                    prompt = f"Question: {question}\nAnswer:"
-                    response = self.model(prompt, max_tokens=100)
-                    predicted_answer = response["choices"][0]["text"].strip()
-                else:
-                    # Méthode pour Hugging Face
-                    prompt = f"Question: {question}\nAnswer:"
-                    inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
-                    
-                    import torch
-                    with torch.no_grad():
-                        outputs = self.model.generate(
-                            inputs["input_ids"],
-                            max_new_tokens=100,
-                            temperature=0.7,
-                            top_p=0.9
-                        )
-                    
-                    predicted_answer = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-                    predicted_answer = predicted_answer.replace(prompt, "").strip()
+                # Générer une réponse (ou relire celle générée pour une autre métrique)
+                predicted_answer = self._generate_answer(question)
                 
                 # Comparer avec la réponse attendue
                 is_correct = self._compare_answers(predicted_answer, expected_answer)
@@ -242,6 +418,7 @@ class ModelEvaluator:
                 "model_path": self.model_path,
                 "test_file": test_file,
                 "timestamp": timestamp,
+                "generation_cache": self.generation_cache.get_status(),
                 "details": predictions
             }
             
@@ -287,6 +464,7 @@ class ModelEvaluator:
             
             # Charger les données de test
             test_data = self._load_test_data(test_file, format_type="qa")
+            self._open_generation_cache(test_file)
             
             # Évaluer le score BLEU
             bleu_scores = []
@@ -296,28 +474,8 @@ class ModelEvaluator:
                 question = item["question"]
                 expected_answer = item["answer"]
                 
-                # Générer une réponse
-                if self.model_path.endswith(".gguf"):
-                    # Méthode pour GGUF
-                    prompt = f"Question: {question}\nAnswer:"
-                    response = self.model(prompt, max_tokens=100)
-                    predicted_answer = response["choices"][0]["text"].strip()
-                else:
-                    # Méthode pour Hugging Face
-                    prompt = f"Question: {question}\nAnswer:"
-                    inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
-                    
-                    import torch
-                    with torch.no_grad():
-                        outputs = self.model.generate(
-                            inputs["input_ids"],
-                            max_new_tokens=100,
-                            temperature=0.7,
-                            top_p=0.9
-                        )
-                    
-                    predicted_answer = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-                    predicted_answer = predicted_answer.replace(prompt, "").strip()
+                # Générer une réponse (ou relire celle générée pour une autre métrique)
+                predicted_answer = self._generate_answer(question)
                 
                 # Calculer le score BLEU
                 from nltk.tokenize import word_tokenize
@@ -346,6 +504,7 @@ class ModelEvaluator:
                 "model_path": self.model_path,
                 "test_file": test_file,
                 "timestamp": timestamp,
+                "generation_cache": self.generation_cache.get_status(),
                 "details": predictions
             }
             
@@ -410,9 +569,59 @@ class ModelEvaluator:
         logger.info("Évaluation complète terminée")
         return results
     
+    def _generate_answer(self, question: str) -> str:
+        """
+        Génère la réponse du modèle à une question, une seule fois par évaluation.
+        
+        Args:
+            question: Question du jeu de test
+        
+        Returns:
+            str: Réponse générée (relue dans le cache de génération si elle existe déjà)
+        """
+        prompt = f"Question: {question}\nAnswer:"
+        key = GenerationCache.make_key(self._model_identity(), prompt, GENERATION_PARAMS)
+        cached = self.generation_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        if self.model_path.endswith(".gguf"):
+            # Méthode pour GGUF
+            response = self.model(prompt, max_tokens=GENERATION_PARAMS["max_new_tokens"])
+            answer = response["choices"][0]["text"].strip()
+        else:
+            # Méthode pour Hugging Face
+            import torch
+            
+            inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
+            with torch.no_grad():
+                outputs = self.model.generate(inputs["input_ids"], **GENERATION_PARAMS)
+            
+            answer = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            answer = answer.replace(prompt, "").strip()
+        
+        self.generation_cache.put(key, prompt, answer)
+        return answer
+    
+    def _model_identity(self) -> str:
+        if self._model_id is None:
+            # Empreinte du contenu: un modèle ré-entraîné au même chemin ne relit pas d'anciennes réponses
+            from response_cache import model_fingerprint
+            self._model_id = model_fingerprint(self.model_path) if os.path.exists(self.model_path) else self.model_path
+        return self._model_id
+    
+    def _open_generation_cache(self, test_file: str):
+        """Associe le cache de génération au fichier des réponses de ce modèle sur ce fichier de test."""
+        path = os.path.join(
+            self.generation_cache_dir,
+            GenerationCache.file_name(self._model_identity(), test_file, GENERATION_PARAMS)
+        )
+        if self.generation_cache.path != path:
+            self.generation_cache.open(path)
+
     def _load_test_data(self, test_file: str, format_type: str = "text") -> List[Any]:
         """
-        Charge les données de test depuis un fichier.
+        Charge les données de test depuis un fichier (une seule lecture par fichier et par format).
         
         Args:
             test_file: Chemin vers le fichier de test
@@ -421,6 +630,12 @@ class ModelEvaluator:
         Returns:
             List[Any]: Données de test
         """
+        key = (test_file, format_type)
+        if key not in self._test_data:
+            self._test_data[key] = self._read_test_data(test_file, format_type)
+        return self._test_data[key]
+    
+    def _read_test_data(self, test_file: str, format_type: str) -> List[Any]:
         file_extension = Path(test_file).suffix.lower()
         
         if format_type == "text":
@@ -0,0 +1,289 @@
+import gc
+import sys
+import time
+import logging
+import threading
+import subprocess
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("model_pool.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("model-pool")
+
+# Budget mémoire par défaut des modèles résidents (16 Go)
+DEFAULT_MAX_MEMORY_BYTES = 16 * 1024 ** 3
+
+# Durée par défaut (en secondes) après laquelle un modèle inutilisé est déchargé
+DEFAULT_TTL = 1800.0
+
+
+def inference_load_options(model_path: str, n_ctx: int = 2048) -> Dict[str, Any]:
+    """Options de chargement d'un modèle d'inférence (elles font partie de la clé du pool)."""
+    if model_path.endswith(".gguf"):
+        return {"n_ctx": n_ctx}
+    return {"torch_dtype": "float16", "device_map": "auto"}
+
+
+def load_inference_model(local_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Charge un modèle d'inférence: llama-cpp-python pour les fichiers GGUF, transformers sinon.
+
+    Args:
+        local_path: Chemin local du modèle (voir ModelCache.resolve)
+        options: Options de chargement (inference_load_options)
+
+    Returns:
+        Dict[str, Any]: {"kind": "gguf" | "transformers", "model", "tokenizer"}
+    """
+    if local_path.endswith(".gguf"):
+        try:
+            from llama_cpp import Llama
+        except ImportError:
+            subprocess.run([sys.executable, "-m", "pip", "install", "llama-cpp-python"], check=True)
+            from llama_cpp import Llama
+
+        return {"kind": "gguf", "model": Llama(model_path=local_path, **options), "tokenizer": None}
+
+    try:
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        import torch
+    except ImportError:
+        subprocess.run([sys.executable, "-m", "pip", "install", "transformers", "torch"], check=True)
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        import torch
+
+    load_kwargs = dict(options)
+    if "torch_dtype" in load_kwargs:
+        load_kwargs["torch_dtype"] = getattr(torch, load_kwargs["torch_dtype"])
+    model = AutoModelForCausalLM.from_pretrained(local_path, **load_kwargs)
+    tokenizer = AutoTokenizer.from_pretrained(local_path)
+    return {"kind": "transformers", "model": model, "tokenizer": tokenizer}
+
+
+def _free_memory():
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+class ModelPool:
+    def __init__(
+        self,
+        max_memory_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        on_unload: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        """
+        Initialise le pool des modèles d'inférence résidents en mémoire.
+
+        Les modèles sont indexés par chemin et options de chargement: après la première
+        requête, les suivantes réutilisent l'instance chargée. Au-delà du budget mémoire
+        (tailles estimées), les modèles les moins récemment utilisés sont déchargés; un
+        modèle inutilisé depuis plus de ttl secondes l'est aussi. Un modèle en cours
+        d'utilisation n'est jamais déchargé.
+
+        Args:
+            max_memory_bytes: Budget mémoire des modèles résidents (16 Go par défaut)
+            ttl: Durée d'inactivité avant déchargement (0: jamais)
+            on_unload: Fonction appelée avec l'entrée de chaque modèle déchargé
+        """
+        self.max_memory_bytes = max_memory_bytes or DEFAULT_MAX_MEMORY_BYTES
+        self.ttl = DEFAULT_TTL if ttl is None else ttl
+        self.on_unload = on_unload
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Tuple, threading.Lock] = {}
+        # Entrées dans l'ordre LRU (la plus récemment utilisée en dernier)
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    @staticmethod
+    def key(model_path: str, options: Dict[str, Any]) -> Tuple:
+        return (model_path, tuple(sorted(options.items())))
+
+    def acquire(
+        self,
+        model_path: str,
+        options: Dict[str, Any],
+        size: int,
+        loader: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Retourne le modèle résident, en le chargeant si nécessaire, et le protège du déchargement.
+
+        Args:
+            model_path: Chemin (ou identifiant) du modèle demandé
+            options: Options de chargement
+            size: Mémoire estimée du modèle chargé (octets)
+            loader: Fonction de chargement, appelée uniquement si le modèle n'est pas résident
+
+        Returns:
+            Dict[str, Any]: Entrée du pool ("kind", "model", "tokenizer", ...), à rendre avec release
+        """
+        key = self.key(model_path, options)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Un seul chargement par clé: les requêtes concurrentes attendent l'instance chargée
+        with load_lock:
+            entry = self.acquire_resident(model_path, options)
+            if entry is not None:
+                return entry
+
+            self.misses += 1
+            self.evict_expired()
+            self._evict_to_fit(size)
+            logger.info(f"Chargement de {model_path} dans le pool ({size / 1024 ** 3:.1f} Go estimés)")
+            start = time.time()
+            loaded = loader()
+            elapsed = time.time() - start
+            now = time.time()
+            entry = dict(
+                loaded,
+                model_path=model_path,
+                options=dict(options),
+                size=int(size),
+                in_use=1,
+                use_count=1,
+                loaded_at=now,
+                last_used_at=now,
+                load_seconds=elapsed
+            )
+            with self._lock:
+                self.load_time += elapsed
+                self._entries[key] = entry
+            logger.info(f"{model_path} chargé en {elapsed:.1f}s")
+            return entry
+
+    def acquire_resident(self, model_path: str, options: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Comme acquire, mais sans chargement: retourne None si le modèle n'est pas résident."""
+        key = self.key(model_path, options)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self.hits += 1
+            entry["in_use"] += 1
+            entry["use_count"] += 1
+            entry["last_used_at"] = time.time()
+            self._entries.move_to_end(key)
+            return entry
+
+    def release(self, entry: Dict[str, Any]):
+        """Rend un modèle obtenu par acquire."""
+        with self._lock:
+            entry["in_use"] = max(0, entry["in_use"] - 1)
+            entry["last_used_at"] = time.time()
+
+    def _unload(self, key: Tuple, reason: str):
+        entry = self._entries.pop(key)
+        self.evictions += 1
+        logger.info(f"Modèle {entry['model_path']} déchargé du pool ({reason})")
+        engine = entry.pop("engine", None)
+        if engine is not None:
+            engine.shutdown()
+        entry.pop("model", None)
+        entry.pop("tokenizer", None)
+        if self.on_unload is not None:
+            self.on_unload(entry)
+
+    def _evict_to_fit(self, size: int):
+        """Décharge les modèles inutilisés les plus anciens jusqu'à pouvoir accueillir size octets."""
+        unloaded = False
+        with self._lock:
+            for key in list(self._entries):
+                resident = sum(e["size"] for e in self._entries.values())
+                if resident + size <= self.max_memory_bytes:
+                    break
+                if self._entries[key]["in_use"] == 0:
+                    self._unload(key, "budget mémoire")
+                    unloaded = True
+            resident = sum(e["size"] for e in self._entries.values())
+        if resident + size > self.max_memory_bytes:
+            logger.warning(
+                f"Budget du pool dépassé: {(resident + size) / 1024 ** 3:.1f} Go pour "
+                f"{self.max_memory_bytes / 1024 ** 3:.1f} Go (modèles en cours d'utilisation)"
+            )
+        if unloaded:
+            _free_memory()
+
+    def evict_expired(self) -> List[str]:
+        """Décharge les modèles inutilisés depuis plus de ttl secondes."""
+        if not self.ttl:
+            return []
+        now = time.time()
+        expired = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry["in_use"] == 0 and now - entry["last_used_at"] > self.ttl:
+                    expired.append(entry["model_path"])
+                    self._unload(key, "inactivité")
+        if expired:
+            _free_memory()
+        return expired
+
+    def unload(self, model_path: str) -> Dict[str, List[str]]:
+        """
+        Décharge toutes les instances d'un modèle (quelles que soient leurs options).
+
+        Returns:
+            Dict[str, List[str]]: Modèles déchargés et modèles ignorés car en cours d'utilisation
+        """
+        result = {"unloaded": [], "busy": []}
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry["model_path"] != model_path:
+                    continue
+                if entry["in_use"] > 0:
+                    result["busy"].append(model_path)
+                    continue
+                self._unload(key, "demande explicite")
+                result["unloaded"].append(model_path)
+        if result["unloaded"]:
+            _free_memory()
+        return result
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne l'état du pool (mémoire résidente, succès/échecs, modèles chargés)."""
+        self.evict_expired()
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "max_memory_bytes": self.max_memory_bytes,
+                "resident_bytes": sum(e["size"] for e in self._entries.values()),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+                "load_seconds": self.load_time,
+                "models": [
+                    {
+                        "model_path": e["model_path"],
+                        "kind": e["kind"],
+                        "options": e["options"],
+                        "size": e["size"],
+                        "in_use": e["in_use"],
+                        "use_count": e["use_count"],
+                        "loaded_at": e["loaded_at"],
+                        "last_used_at": e["last_used_at"],
+                        "load_seconds": e["load_seconds"],
+                        "engine": e["engine"].get_status() if e.get("engine") is not None else None
+                    }
+                    for e in reversed(self._entries.values())
+                ]
+            }
@@ -0,0 +1,207 @@
+import uuid
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("multi_adapter.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("multi-adapter")
+
+
+def group_key(config: Dict[str, Any]) -> Tuple:
+    """Clé de compatibilité: deux jobs partagent le modèle de base s'il est chargé à l'identique."""
+    return (config["model_name"], config.get("load_in_4bit", True))
+
+
+def adapter_name_for(index: int) -> str:
+    """Nom PEFT de l'adaptateur d'un membre (le premier réutilise l'adaptateur créé au chargement)."""
+    return "default" if index == 0 else f"adapter_{index}"
+
+
+def add_lora_adapter(model, adapter_name: str, config: Dict[str, Any]):
+    """
+    Ajoute un adaptateur LoRA au modèle PEFT, sur les mêmes modules que l'adaptateur initial.
+
+    Args:
+        model: Modèle PEFT (adaptateur "default" déjà présent)
+        adapter_name: Nom du nouvel adaptateur
+        config: Configuration du fine-tuning du membre (lora_r, lora_alpha, lora_dropout)
+    """
+    from peft import LoraConfig
+
+    model.add_adapter(adapter_name, LoraConfig(
+        r=config["lora_r"],
+        lora_alpha=config["lora_alpha"],
+        lora_dropout=config["lora_dropout"],
+        target_modules=model.peft_config["default"].target_modules,
+        bias="none",
+        task_type="CAUSAL_LM",
+    ))
+
+
+def estimate_group_memory(estimates: List[Dict[str, Any]]) -> int:
+    """
+    Estime le pic mémoire d'un groupe d'adaptateurs entraînés sur un même modèle de base.
+
+    Les poids du modèle, les activations et les logits ne sont présents qu'une fois (les
+    pas des adaptateurs sont entrelacés); seul l'état LoRA (poids, gradients, moments
+    de l'optimiseur) s'ajoute pour chaque adaptateur supplémentaire.
+
+    Args:
+        estimates: Estimations individuelles des membres (estimate_finetune_memory)
+
+    Returns:
+        int: Pic mémoire estimé du groupe en octets
+    """
+    largest = max(estimates, key=lambda e: e["total"])
+    return int(largest["total"] + sum(
+        e["breakdown"]["lora_state"] for e in estimates if e is not largest
+    ))
+
+
+def interleave_training(model, trainers: Dict[str, Tuple[str, Any]]) -> Dict[str, Optional[Exception]]:
+    """
+    Entraîne plusieurs adaptateurs en alternant leurs pas d'optimisation.
+
+    Avant chaque pas, l'adaptateur du membre est activé: le forward ne traverse que
+    ses matrices LoRA et seuls ses paramètres reçoivent des gradients. L'échec d'un
+    membre n'interrompt pas les autres.
+
+    Args:
+        model: Modèle PEFT portant tous les adaptateurs
+        trainers: {job_id: (nom de l'adaptateur, FineTuningTrainer)}
+
+    Returns:
+        Dict[str, Optional[Exception]]: Erreur de chaque membre (None en cas de succès)
+    """
+    iterators = {job_id: trainer.run_steps() for job_id, (_, trainer) in trainers.items()}
+    errors: Dict[str, Optional[Exception]] = {}
+
+    while iterators:
+        for job_id in list(iterators):
+            adapter_name = trainers[job_id][0]
+            model.set_adapter(adapter_name)
+            try:
+                next(iterators[job_id])
+            except StopIteration:
+                errors[job_id] = None
+                del iterators[job_id]
+            except Exception as e:
+                logger.error(f"Erreur lors de l'entraînement de l'adaptateur {adapter_name} (job {job_id}): {str(e)}")
+                errors[job_id] = e
+                del iterators[job_id]
+                # Gradients partiels du pas interrompu
+                model.zero_grad(set_to_none=True)
+
+    return errors
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdapterGroupScheduler:
+    def __init__(self, window: float = 5.0, max_adapters: int = 4):
+        """
+        Regroupe les jobs de fine-tuning compatibles pour les exécuter sur un même modèle de base.
+
+        Le premier job d'une clé ouvre un groupe et attend window secondes que d'autres
+        jobs compatibles le rejoignent; le groupe est ensuite fermé et entraîné en un
+        seul processus. Les jobs arrivés après la fermeture ouvrent un nouveau groupe.
+
+        Args:
+            window: Durée (en secondes) pendant laquelle un groupe accepte de nouveaux membres
+            max_adapters: Nombre maximal d'adaptateurs par groupe
+        """
+        self.window = window
+        self.max_adapters = max(1, max_adapters)
+        self._lock = threading.Lock()
+        self._open: Dict[Tuple, Dict[str, Any]] = {}
+        self._groups: Dict[str, Dict[str, Any]] = {}
+
+    def join(self, job_id: str, config: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """
+        Ajoute un job au groupe ouvert de sa clé, ou ouvre un nouveau groupe.
+
+        Returns:
+            Tuple[Dict[str, Any], bool]: Groupe rejoint, et True si le job en est le leader
+        """
+        key = group_key(config)
+        with self._lock:
+            group = self._open.get(key)
+            if group is not None and len(group["members"]) < self.max_adapters:
+                group["members"].append(job_id)
+                if len(group["members"]) == self.max_adapters:
+                    self._close(group)
+                return group, False
+
+            group = {
+                "group_id": str(uuid.uuid4()),
+                "key": key,
+                "members": [job_id],
+                "status": "collecting",
+                "opened_at": time.time(),
+                "created_at": datetime.now().isoformat(),
+                "waiters": []
+            }
+            self._open[key] = group
+            self._groups[group["group_id"]] = group
+            if self.max_adapters == 1:
+                self._close(group)
+            return group, True
+
+    def _close(self, group: Dict[str, Any]):
+        if self._open.get(group["key"]) is group:
+            del self._open[group["key"]]
+        group["status"] = "running"
+
+    def close(self, group: Dict[str, Any]) -> List[str]:
+        """Ferme le groupe aux nouveaux membres et retourne ses membres."""
+        with self._lock:
+            self._close(group)
+            return list(group["members"])
+
+    def finish(self, group: Dict[str, Any]):
+        """Marque le groupe comme terminé et réveille ses membres."""
+        with self._lock:
+            group["status"] = "completed"
+            self._groups.pop(group["group_id"], None)
+            waiters, group["waiters"] = group["waiters"], []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    async def wait(self, group: Dict[str, Any]):
+        """Attend la fin du groupe sans occuper de thread (réveil par finish)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if group["status"] == "completed":
+                return
+            group["waiters"].append((loop, future))
+        await future
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        """Retourne les groupes en cours de constitution ou d'entraînement."""
+        with self._lock:
+            return [
+                {
+                    "group_id": g["group_id"],
+                    "model_name": g["key"][0],
+                    "load_in_4bit": g["key"][1],
+                    "members": list(g["members"]),
+                    "status": g["status"],
+                    "created_at": g["created_at"]
+                }
+                for g in self._groups.values()
+            ]
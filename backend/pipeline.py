@@ -0,0 +1,331 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Callable, Set
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("pipeline.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("pipeline")
+
+# Types d'étapes pris en charge (une étape = une fonction run_* de l'API)
+STEP_TYPES = ("preprocess", "finetune", "export", "evaluate")
+
+# Référence à un artefact produit par une autre étape: ${step_id.cle}
+REFERENCE_PATTERN = re.compile(r"\$\{([A-Za-z0-9_\-]+)\.([A-Za-z0-9_]+)\}")
+
+# Paramètres désignant les artefacts produits par une étape: leur valeur fait partie de la
+# configuration, mais leur contenu n'est pas une entrée (sinon la clé change après chaque exécution)
+OUTPUT_PARAMS = ("output_path", "output_dir")
+
+
+def _find_references(value: Any) -> Set[str]:
+    """Retourne les identifiants d'étapes référencés dans une valeur de paramètre."""
+    references = set()
+    if isinstance(value, str):
+        references.update(match.group(1) for match in REFERENCE_PATTERN.finditer(value))
+    elif isinstance(value, dict):
+        for item in value.values():
+            references.update(_find_references(item))
+    elif isinstance(value, list):
+        for item in value:
+            references.update(_find_references(item))
+    return references
+
+
+def _resolve_references(value: Any, outputs: Dict[str, Dict[str, Any]]) -> Any:
+    """Remplace les références ${step_id.cle} par les artefacts des étapes terminées."""
+    if isinstance(value, str):
+        match = REFERENCE_PATTERN.fullmatch(value)
+        if match:
+            # Une référence seule conserve le type de l'artefact (liste, nombre...)
+            return outputs[match.group(1)][match.group(2)]
+        return REFERENCE_PATTERN.sub(lambda m: str(outputs[m.group(1)][m.group(2)]), value)
+    if isinstance(value, dict):
+        return {key: _resolve_references(item, outputs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_resolve_references(item, outputs) for item in value]
+    return value
+
+
+def _fingerprint_path(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Calcule une empreinte légère (taille, date de modification) d'un fichier ou d'un répertoire.
+
+    Args:
+        path: Chemin à analyser
+
+    Returns:
+        Optional[Dict[str, Any]]: Empreinte, ou None si le chemin n'existe pas
+    """
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+    if os.path.isdir(path):
+        entries = []
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                stat = os.stat(file_path)
+                entries.append([os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns])
+        return {"files": sorted(entries)}
+    return None
+
+
+def _collect_input_fingerprints(params: Any, fingerprints: Dict[str, Any]) -> Dict[str, Any]:
+    """Collecte les empreintes des chemins d'entrée existants présents dans les paramètres (hors OUTPUT_PARAMS)."""
+    if isinstance(params, str):
+        if params and os.path.exists(params):
+            fingerprints[params] = _fingerprint_path(params)
+    elif isinstance(params, dict):
+        for key, item in params.items():
+            if key not in OUTPUT_PARAMS:
+                _collect_input_fingerprints(item, fingerprints)
+    elif isinstance(params, list):
+        for item in params:
+            _collect_input_fingerprints(item, fingerprints)
+    return fingerprints
+
+
+def _outputs_exist(outputs: Dict[str, Any]) -> bool:
+    """Vérifie que les artefacts de type chemin d'une exécution précédente existent toujours."""
+    for key, value in outputs.items():
+        if key.endswith("_path") and isinstance(value, str) and not os.path.exists(value):
+            return False
+    return True
+
+
+class PipelineRunner:
+    def __init__(
+        self,
+        executors: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]],
+        cache_dir: str = "pipelines",
+        max_parallel: int = 4
+    ):
+        """
+        Initialise l'exécuteur de pipelines.
+
+        Args:
+            executors: Fonction d'exécution par type d'étape (paramètres résolus -> artefacts)
+            cache_dir: Répertoire contenant l'index des étapes déjà exécutées
+            max_parallel: Nombre maximal d'étapes exécutées simultanément
+        """
+        self.executors = executors
+        self.cache_dir = cache_dir
+        self.cache_path = os.path.join(cache_dir, "step_cache.json")
+        self.max_parallel = max_parallel
+        self._cache_lock = threading.Lock()
+
+        # Créer le répertoire du cache s'il n'existe pas
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def validate(self, spec: Dict[str, Any]) -> Dict[str, List[str]]:
+        """
+        Valide une spécification de pipeline et calcule les dépendances de chaque étape.
+
+        Args:
+            spec: Spécification ({"steps": [{"id", "type", "params", "depends_on"}]})
+
+        Returns:
+            Dict[str, List[str]]: Dépendances de chaque étape
+
+        Raises:
+            ValueError: Si la spécification est invalide (type inconnu, référence inconnue, cycle)
+        """
+        steps = spec.get("steps") or []
+        if not steps:
+            raise ValueError("Le pipeline ne contient aucune étape")
+
+        step_ids = [step["id"] for step in steps]
+        if len(step_ids) != len(set(step_ids)):
+            raise ValueError("Les identifiants d'étapes doivent être uniques")
+
+        dependencies = {}
+        for step in steps:
+            if step["type"] not in self.executors:
+                raise ValueError(f"Type d'étape non pris en charge: {step['type']}")
+
+            deps = set(step.get("depends_on") or []) | _find_references(step.get("params") or {})
+            unknown = deps - set(step_ids)
+            if unknown:
+                raise ValueError(f"L'étape {step['id']} dépend d'étapes inconnues: {sorted(unknown)}")
+            if step["id"] in deps:
+                raise ValueError(f"L'étape {step['id']} dépend d'elle-même")
+            dependencies[step["id"]] = sorted(deps)
+
+        # Détecter les cycles (tri topologique de Kahn)
+        remaining = {step_id: set(deps) for step_id, deps in dependencies.items()}
+        while remaining:
+            ready = [step_id for step_id, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Cycle détecté entre les étapes: {sorted(remaining)}")
+            for step_id in ready:
+                del remaining[step_id]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+        return dependencies
+
+    def run(self, pipeline_id: str, spec: Dict[str, Any], record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Exécute un pipeline sous forme de DAG, en parallélisant les branches indépendantes.
+
+        Args:
+            pipeline_id: Identifiant du pipeline
+            spec: Spécification du pipeline
+            record: Enregistrement de statut mis à jour au fil de l'exécution
+
+        Returns:
+            Dict[str, Any]: Enregistrement de statut final
+        """
+        dependencies = self.validate(spec)
+        steps = {step["id"]: step for step in spec["steps"]}
+        reuse = spec.get("reuse_artifacts", True)
+        max_parallel = spec.get("max_parallel") or self.max_parallel
+
+        record["status"] = "running"
+        record["steps"] = {
+            step_id: {"status": "pending", "type": step["type"], "depends_on": dependencies[step_id]}
+            for step_id, step in steps.items()
+        }
+        record["updated_at"] = datetime.now().isoformat()
+
+        outputs: Dict[str, Dict[str, Any]] = {}
+        pending = set(steps)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix=f"pipeline-{pipeline_id[:8]}") as executor:
+            while pending or running:
+                # Lancer toutes les étapes dont les dépendances sont terminées
+                for step_id in sorted(pending):
+                    deps = dependencies[step_id]
+                    if any(record["steps"][dep]["status"] in ("failed", "cancelled") for dep in deps):
+                        record["steps"][step_id]["status"] = "cancelled"
+                        record["steps"][step_id]["error"] = "Une dépendance a échoué"
+                        pending.discard(step_id)
+                    elif all(dep in outputs for dep in deps):
+                        pending.discard(step_id)
+                        record["steps"][step_id]["status"] = "running"
+                        record["steps"][step_id]["started_at"] = datetime.now().isoformat()
+                        future = executor.submit(self._run_step, steps[step_id], outputs, reuse, record["steps"][step_id])
+                        running[future] = step_id
+
+                record["updated_at"] = datetime.now().isoformat()
+                if not running:
+                    continue
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    step_id = running.pop(future)
+                    step_record = record["steps"][step_id]
+                    step_record["finished_at"] = datetime.now().isoformat()
+                    try:
+                        outputs[step_id] = future.result()
+                        step_record["outputs"] = outputs[step_id]
+                        if step_record["status"] == "running":
+                            step_record["status"] = "completed"
+                    except Exception as e:
+                        logger.error(f"Échec de l'étape {step_id} du pipeline {pipeline_id}: {str(e)}")
+                        step_record["status"] = "failed"
+                        step_record["error"] = str(e)
+
+                completed = sum(1 for s in record["steps"].values() if s["status"] in ("completed", "cached"))
+                record["progress"] = completed / len(steps)
+                record["updated_at"] = datetime.now().isoformat()
+
+        failed = [step_id for step_id, s in record["steps"].items() if s["status"] in ("failed", "cancelled")]
+        record["status"] = "failed" if failed else "completed"
+        if failed:
+            record["error"] = f"Étapes en échec: {', '.join(sorted(failed))}"
+        record["outputs"] = outputs
+        record["updated_at"] = datetime.now().isoformat()
+        return record
+
+    def _run_step(
+        self,
+        step: Dict[str, Any],
+        outputs: Dict[str, Dict[str, Any]],
+        reuse: bool,
+        step_record: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Exécute une étape, ou réutilise les artefacts d'une exécution identique précédente."""
+        params = _resolve_references(step.get("params") or {}, outputs)
+        cache_key = self.compute_cache_key(step["type"], params)
+        step_record["cache_key"] = cache_key
+
+        if reuse:
+            cached = self._get_cached(cache_key)
+            if cached is not None:
+                logger.info(f"Étape {step['id']} ignorée: artefacts réutilisés ({cache_key[:12]})")
+                step_record["status"] = "cached"
+                step_record["reused_from"] = cached.get("completed_at")
+                return cached["outputs"]
+
+        logger.info(f"Exécution de l'étape {step['id']} ({step['type']})")
+        result = self.executors[step["type"]](params) or {}
+        if self.compute_cache_key(step["type"], params) != cache_key:
+            # Une étape qui modifie ses propres entrées ne sera jamais réutilisée
+            logger.warning(f"Les entrées de l'étape {step['id']} ont changé pendant son exécution: elle sera ré-exécutée au prochain lancement")
+        self._store_cached(cache_key, step["type"], result)
+        return result
+
+    def compute_cache_key(self, step_type: str, params: Dict[str, Any]) -> str:
+        """
+        Calcule la clé de cache d'une étape à partir de sa configuration et de ses entrées.
+
+        Args:
+            step_type: Type de l'étape
+            params: Paramètres résolus de l'étape
+
+        Returns:
+            str: Empreinte SHA-256
+        """
+        payload = {
+            "type": step_type,
+            "params": params,
+            "inputs": _collect_input_fingerprints(params, {})
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _load_cache(self) -> Dict[str, Any]:
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Index du cache de pipeline illisible, ignoré: {str(e)}")
+            return {}
+
+    def _get_cached(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        with self._cache_lock:
+            entry = self._load_cache().get(cache_key)
+        if entry is None or not _outputs_exist(entry.get("outputs", {})):
+            return None
+        return entry
+
+    def _store_cached(self, cache_key: str, step_type: str, outputs: Dict[str, Any]):
+        with self._cache_lock:
+            cache = self._load_cache()
+            cache[cache_key] = {
+                "step_type": step_type,
+                "outputs": outputs,
+                "completed_at": datetime.now().isoformat()
+            }
+            # Écriture atomique pour ne jamais laisser un index tronqué
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(cache, f, indent=2, default=str)
+            os.replace(tmp_path, self.cache_path)
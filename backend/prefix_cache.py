@@ -0,0 +1,155 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Hashable
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("prefix_cache.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("prefix-cache")
+
+# Budget mémoire par défaut des préfixes conservés (2 Go)
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# En dessous de cette longueur commune, recalculer le préfixe coûte moins que le restaurer
+DEFAULT_MIN_TOKENS = 32
+
+
+def common_prefix_length(a, b) -> int:
+    """Longueur du plus long préfixe commun de deux séquences de tokens."""
+    length = min(len(a), len(b))
+    for i in range(length):
+        if a[i] != b[i]:
+            return i
+    return length
+
+
+def kv_size(layers: List[tuple]) -> int:
+    """Taille en octets des tenseurs (clés, valeurs) d'un cache."""
+    return sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in layers)
+
+
+class PrefixCache:
+    def __init__(self, max_bytes: Optional[int] = None, min_tokens: int = DEFAULT_MIN_TOKENS):
+        """
+        Cache des états clé/valeur des prompts déjà pré-remplis, partagé par les modèles d'inférence.
+
+        Une entrée associe (modèle, tokens du prompt) à l'état calculé pour ces tokens: les
+        tenseurs (clés, valeurs) de chaque couche pour transformers, l'état sauvegardé par
+        save_state pour llama-cpp. Une requête réutilise l'entrée ayant le plus long préfixe
+        commun avec son prompt (prompt système, exemples few-shot) et ne pré-remplit que la
+        suite. Au-delà du budget mémoire, les entrées les moins récemment utilisées sont supprimées.
+
+        Args:
+            max_bytes: Budget mémoire des états conservés (2 Go par défaut)
+            min_tokens: Longueur commune minimale pour réutiliser une entrée
+        """
+        self.max_bytes = max_bytes or DEFAULT_MAX_BYTES
+        self.min_tokens = max(1, min_tokens)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reused_tokens = 0
+        self.prompt_tokens = 0
+
+    def lookup(self, model_key: Hashable, tokens: List[int], max_length: Optional[int] = None) -> Tuple[Any, int]:
+        """
+        Cherche l'entrée partageant le plus long préfixe avec le prompt.
+
+        Args:
+            model_key: Clé du modèle (voir ModelPool.key)
+            tokens: Tokens du prompt
+            max_length: Longueur réutilisable maximale (ex: len(tokens) - 1 pour garder un token à pré-remplir)
+
+        Returns:
+            Tuple[Any, int]: État de l'entrée et nombre de tokens réutilisables (None, 0 si aucune)
+        """
+        limit = len(tokens) if max_length is None else min(max_length, len(tokens))
+        with self._lock:
+            best_key, best_length = None, 0
+            for key, entry in self._entries.items():
+                if key[0] != model_key:
+                    continue
+                length = min(common_prefix_length(entry["tokens"], tokens), limit)
+                if length > best_length:
+                    best_key, best_length = key, length
+
+            self.prompt_tokens += len(tokens)
+            if best_key is None or best_length < self.min_tokens:
+                self.misses += 1
+                return None, 0
+            self.hits += 1
+            self.reused_tokens += best_length
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key]["state"], best_length
+
+    def store(self, model_key: Hashable, tokens: List[int], state: Any, size: int):
+        """Conserve l'état calculé pour un prompt (ignoré s'il est trop court ou dépasse le budget)."""
+        if len(tokens) < self.min_tokens or size > self.max_bytes:
+            return
+        key = (model_key, tuple(tokens))
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = {"tokens": key[1], "state": state, "size": int(size)}
+            total = sum(e["size"] for e in self._entries.values())
+            while total > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                total -= evicted["size"]
+                self.evictions += 1
+
+    def drop(self, model_key: Hashable):
+        """Supprime les entrées d'un modèle (déchargé du pool)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == model_key]:
+                del self._entries[key]
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne l'état du cache (entrées, mémoire, taux de succès, tokens réutilisés)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "max_bytes": self.max_bytes,
+                "bytes": sum(e["size"] for e in self._entries.values()),
+                "entries": len(self._entries),
+                "min_tokens": self.min_tokens,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "reused_tokens": self.reused_tokens,
+                "prompt_tokens": self.prompt_tokens,
+                "token_reuse_rate": self.reused_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+            }
+
+
+def restore_gguf_prefix(cache: PrefixCache, model_key: Hashable, model, prompt: str) -> int:
+    """
+    Restaure dans un modèle llama-cpp l'état partageant le plus long préfixe avec le prompt.
+
+    llama-cpp ne ré-évalue que les tokens qui suivent le préfixe commun entre le prompt et
+    son état courant: l'état n'est chargé que s'il partage un préfixe plus long que celui-ci.
+
+    Returns:
+        int: Nombre de tokens du prompt qui ne seront pas ré-évalués
+    """
+    tokens = model.tokenize(prompt.encode("utf-8"))
+    current = common_prefix_length(list(model.input_ids[:model.n_tokens]), tokens)
+    state, length = cache.lookup(model_key, tokens, max_length=len(tokens) - 1)
+    if state is not None and length > current:
+        model.load_state(state)
+        return length
+    return current
+
+
+def save_gguf_prefix(cache: PrefixCache, model_key: Hashable, model):
+    """Conserve l'état courant d'un modèle llama-cpp (prompt et tokens générés)."""
+    state = model.save_state()
+    cache.store(model_key, [int(t) for t in state.input_ids[:state.n_tokens]], state, state.llama_state_size)
@@ -0,0 +1,408 @@
+import os
+import re
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("resource_estimator.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("resource-estimator")
+
+GIB = 1024 ** 3
+
+# Nombre de paramètres déduit du nom du modèle (ex: "llama-2-7b", "Qwen2-0.5B", "opt-125m")
+PARAMETER_COUNT_PATTERN = re.compile(r"(?<![0-9.])(\d+(?:\.\d+)?)\s*([bm])(?![a-z])", re.IGNORECASE)
+
+# Architectures typiques (taille cachée, nombre de couches, vocabulaire) par nombre de paramètres
+TYPICAL_ARCHITECTURES = [
+    (0.2e9, (768, 12, 50257)),
+    (0.6e9, (1024, 24, 151936)),
+    (1.5e9, (2048, 24, 151936)),
+    (4e9, (3072, 28, 128256)),
+    (9e9, (4096, 32, 128256)),
+    (15e9, (5120, 40, 32000)),
+    (40e9, (6656, 60, 32000)),
+    (float("inf"), (8192, 80, 128256)),
+]
+
+DEFAULT_PARAMETER_COUNT = 7e9
+
+# Octets par paramètre des poids figés
+BYTES_PER_PARAM_4BIT = 0.55  # 4 bits + constantes de quantification
+BYTES_PER_PARAM_16BIT = 2.0
+
+# Paramètres LoRA entraînables: poids fp32 + gradients fp32 + 2 moments Adam fp32
+BYTES_PER_TRAINABLE_PARAM = 16
+
+# Modules ciblés par LoRA dans run_finetune_job (q_proj, k_proj, v_proj, o_proj)
+LORA_TARGET_MODULES = 4
+
+# Activations par token, par dimension cachée (avec gradient checkpointing) et par couche
+ACTIVATION_BYTES_PER_LAYER = 2
+ACTIVATION_BYTES_FULL_LAYER = 34
+
+# Surcoût fixe (contexte CUDA, allocateur, tampons) en octets
+FRAMEWORK_OVERHEAD = {"gpu": int(0.8 * GIB), "cpu": int(0.5 * GIB)}
+
+
+def parse_parameter_count(model_name: str) -> Optional[float]:
+    """
+    Déduit le nombre de paramètres d'un modèle à partir de son nom.
+
+    Args:
+        model_name: Nom ou chemin du modèle
+
+    Returns:
+        Optional[float]: Nombre de paramètres, ou None si le nom ne l'indique pas
+    """
+    matches = PARAMETER_COUNT_PATTERN.findall(os.path.basename(model_name.rstrip("/")))
+    if not matches:
+        return None
+    value, unit = matches[-1]
+    return float(value) * (1e9 if unit.lower() == "b" else 1e6)
+
+
+def get_model_dimensions(model_name: str) -> Dict[str, Any]:
+    """
+    Retourne le nombre de paramètres et les dimensions (taille cachée, couches, vocabulaire) d'un modèle.
+
+    La configuration Hugging Face est utilisée quand elle est disponible localement,
+    sinon les dimensions sont déduites du nombre de paramètres indiqué par le nom.
+
+    Args:
+        model_name: Nom ou chemin du modèle
+
+    Returns:
+        Dict[str, Any]: Dimensions du modèle et source de l'estimation
+    """
+    try:
+        from transformers import AutoConfig
+        config = AutoConfig.from_pretrained(model_name, local_files_only=True)
+        hidden_size = config.hidden_size
+        num_layers = config.num_hidden_layers
+        vocab_size = config.vocab_size
+        intermediate_size = getattr(config, "intermediate_size", None) or 4 * hidden_size
+        parameter_count = (
+            num_layers * (4 * hidden_size ** 2 + 3 * hidden_size * intermediate_size)
+            + 2 * vocab_size * hidden_size
+        )
+        return {
+            "parameter_count": parameter_count,
+            "hidden_size": hidden_size,
+            "num_layers": num_layers,
+            "vocab_size": vocab_size,
+            "source": "config"
+        }
+    except Exception:
+        pass
+
+    parameter_count = parse_parameter_count(model_name)
+    source = "name"
+    if parameter_count is None:
+        parameter_count = DEFAULT_PARAMETER_COUNT
+        source = "default"
+
+    for max_params, (hidden_size, num_layers, vocab_size) in TYPICAL_ARCHITECTURES:
+        if parameter_count <= max_params:
+            break
+
+    return {
+        "parameter_count": parameter_count,
+        "hidden_size": hidden_size,
+        "num_layers": num_layers,
+        "vocab_size": vocab_size,
+        "source": source
+    }
+
+
+def estimate_finetune_memory(
+    model_name: str,
+    max_seq_length: int,
+    batch_size: int,
+    lora_r: int,
+    load_in_4bit: bool = True,
+    gradient_accumulation: int = 1,
+    device: str = "gpu",
+    dimensions: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Estime le pic mémoire d'un job de fine-tuning LoRA.
+
+    L'accumulation de gradients n'augmente pas le pic: seuls les gradients LoRA
+    (déjà comptés) sont conservés entre les micro-batchs.
+
+    Args:
+        model_name: Nom ou chemin du modèle de base
+        max_seq_length: Longueur maximale des séquences
+        batch_size: Taille du micro-batch
+        lora_r: Rang LoRA
+        load_in_4bit: Si True, les poids figés sont chargés en 4 bits
+        gradient_accumulation: Nombre de pas d'accumulation
+        device: "gpu" ou "cpu"
+        dimensions: Dimensions du modèle (calculées si absentes)
+
+    Returns:
+        Dict[str, Any]: Estimation totale (octets) et détail par poste
+    """
+    dims = dimensions or get_model_dimensions(model_name)
+    hidden_size = dims["hidden_size"]
+    num_layers = dims["num_layers"]
+    tokens = batch_size * max_seq_length
+
+    bytes_per_param = BYTES_PER_PARAM_4BIT if load_in_4bit else BYTES_PER_PARAM_16BIT
+    weights = dims["parameter_count"] * bytes_per_param
+
+    lora_params = LORA_TARGET_MODULES * num_layers * lora_r * 2 * hidden_size
+    lora_state = lora_params * BYTES_PER_TRAINABLE_PARAM
+
+    activations = tokens * hidden_size * (
+        ACTIVATION_BYTES_PER_LAYER * num_layers + ACTIVATION_BYTES_FULL_LAYER
+    )
+    # Logits fp32 et leur gradient pour la perte d'entropie croisée
+    logits = tokens * dims["vocab_size"] * 4 * 2
+
+    breakdown = {
+        "weights": int(weights),
+        "lora_state": int(lora_state),
+        "activations": int(activations),
+        "logits": int(logits),
+        "overhead": FRAMEWORK_OVERHEAD.get(device, 0)
+    }
+
+    return {
+        "kind": "finetune",
+        "device": device,
+        "total": int(sum(breakdown.values())),
+        "breakdown": breakdown,
+        "parameter_count": int(dims["parameter_count"]),
+        "lora_parameters": int(lora_params),
+        "gradient_accumulation": gradient_accumulation,
+        "dimensions_source": dims["source"]
+    }
+
+
+def estimate_inference_memory(model_path: str, n_ctx: int = 2048, device: str = "gpu") -> Dict[str, Any]:
+    """
+    Estime le pic mémoire d'une inférence à partir de la taille du modèle sur disque.
+
+    Args:
+        model_path: Chemin du modèle (fichier GGUF, répertoire Hugging Face ou identifiant du Hub)
+        n_ctx: Taille du contexte
+        device: "gpu" ou "cpu"
+
+    Returns:
+        Dict[str, Any]: Estimation totale (octets) et détail par poste
+    """
+    dims = get_model_dimensions(model_path)
+
+    if os.path.isfile(model_path):
+        weights = os.path.getsize(model_path)
+    elif os.path.isdir(model_path):
+        weights = 0
+        for root, _, files in os.walk(model_path):
+            for name in files:
+                if name.endswith((".safetensors", ".bin", ".pt", ".gguf")):
+                    weights += os.path.getsize(os.path.join(root, name))
+    else:
+        weights = dims["parameter_count"] * BYTES_PER_PARAM_16BIT
+
+    # Cache clé/valeur fp16 pour tout le contexte
+    kv_cache = 2 * dims["num_layers"] * n_ctx * dims["hidden_size"] * 2
+
+    breakdown = {
+        "weights": int(weights),
+        "kv_cache": int(kv_cache),
+        "overhead": FRAMEWORK_OVERHEAD.get(device, 0)
+    }
+
+    return {
+        "kind": "inference",
+        "device": device,
+        "total": int(sum(breakdown.values())),
+        "breakdown": breakdown,
+        "n_ctx": n_ctx,
+        "dimensions_source": dims["source"]
+    }
+
+
+def estimate_request_kv_cache(estimate: Dict[str, Any], context_tokens: Optional[int] = None) -> int:
+    """
+    Part du cache clé/valeur d'une estimation d'inférence utilisée par une requête.
+
+    Args:
+        estimate: Estimation retournée par estimate_inference_memory
+        context_tokens: Tokens du prompt et de la réponse (None: contexte complet)
+
+    Returns:
+        int: Mémoire du cache clé/valeur de la requête en octets
+    """
+    n_ctx = estimate.get("n_ctx", 2048)
+    tokens = n_ctx if context_tokens is None else min(context_tokens, n_ctx)
+    return int(estimate["breakdown"]["kv_cache"] * tokens / n_ctx)
+
+
+class MemoryCalibrator:
+    def __init__(self, calibration_file: str = "resource_calibration.json", window: int = 20):
+        """
+        Initialise le calibrateur des estimations mémoire.
+
+        Args:
+            calibration_file: Fichier JSON contenant les mesures (estimation, pic réel)
+            window: Nombre de mesures récentes utilisées pour le facteur de correction
+        """
+        self.calibration_file = calibration_file
+        self.window = window
+        self._lock = threading.Lock()
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.calibration_file):
+            return []
+        try:
+            with open(self.calibration_file, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Fichier de calibration illisible, ignoré: {str(e)}")
+            return []
+
+    def record(self, kind: str, model_name: str, estimate: int, actual_peak: int, device: str):
+        """
+        Enregistre une mesure de pic mémoire réel pour une estimation donnée.
+
+        Args:
+            kind: Type de job ("finetune" ou "inference")
+            model_name: Nom du modèle
+            estimate: Estimation brute (avant correction) en octets
+            actual_peak: Pic mesuré en octets
+            device: "gpu" ou "cpu"
+        """
+        if estimate <= 0 or actual_peak <= 0:
+            return
+
+        with self._lock:
+            records = self._load()
+            records.append({
+                "kind": kind,
+                "model_name": model_name,
+                "device": device,
+                "estimate": int(estimate),
+                "actual_peak": int(actual_peak),
+                "ratio": actual_peak / estimate,
+                "timestamp": datetime.now().isoformat()
+            })
+            tmp_path = f"{self.calibration_file}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(records[-1000:], f, indent=2)
+            os.replace(tmp_path, self.calibration_file)
+
+        logger.info(f"Calibration {kind}/{device}: estimation {estimate / GIB:.2f} Go, pic réel {actual_peak / GIB:.2f} Go")
+
+    def get_factor(self, kind: str, device: str) -> float:
+        """
+        Retourne le facteur de correction (médiane des ratios pic réel / estimation).
+
+        Args:
+            kind: Type de job
+            device: "gpu" ou "cpu"
+
+        Returns:
+            float: Facteur de correction borné entre 0.5 et 3.0 (1.0 sans mesure)
+        """
+        with self._lock:
+            records = self._load()
+        recent = [r for r in records if r["kind"] == kind and r["device"] == device][-self.window:]
+        ratios = sorted(r["ratio"] for r in recent)
+        if not ratios:
+            return 1.0
+        median = ratios[len(ratios) // 2]
+        return min(max(median, 0.5), 3.0)
+
+    def calibrate(self, estimate: Dict[str, Any]) -> Dict[str, Any]:
+        """Applique le facteur de correction à une estimation brute."""
+        factor = self.get_factor(estimate["kind"], estimate["device"])
+        calibrated = dict(estimate)
+        calibrated["raw_total"] = estimate["total"]
+        calibrated["calibration_factor"] = factor
+        calibrated["total"] = int(estimate["total"] * factor)
+        return calibrated
+
+
+# Pic GPU atteint avant une réinitialisation des statistiques de torch par le profileur
+_gpu_peak_carry = 0
+
+
+def reset_gpu_peak():
+    """Réinitialise le pic GPU de torch (mesure par pas) sans le perdre pour PeakMemoryTracker."""
+    global _gpu_peak_carry
+    import torch
+    _gpu_peak_carry = max(_gpu_peak_carry, torch.cuda.max_memory_allocated())
+    torch.cuda.reset_peak_memory_stats()
+
+
+class PeakMemoryTracker:
+    def __init__(self, device: str, interval: float = 0.5):
+        """
+        Mesure le pic mémoire atteint pendant l'exécution d'un job.
+
+        Sur GPU, le pic provient de torch.cuda.max_memory_allocated; sur CPU, la RSS
+        du processus est échantillonnée. Le pic est relatif à la mémoire déjà utilisée
+        au démarrage; des jobs concurrents dans le même processus faussent la mesure.
+
+        Args:
+            device: "gpu" ou "cpu"
+            interval: Intervalle d'échantillonnage en secondes (CPU)
+        """
+        self.device = device
+        self.interval = interval
+        self.baseline = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _current_usage(self) -> int:
+        if self.device == "gpu":
+            import torch
+            return max(_gpu_peak_carry, torch.cuda.max_memory_allocated())
+        import psutil
+        return psutil.Process().memory_info().rss
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.peak = max(self.peak, self._current_usage())
+            except Exception:
+                return
+
+    def start(self):
+        global _gpu_peak_carry
+        try:
+            if self.device == "gpu":
+                import torch
+                torch.cuda.reset_peak_memory_stats()
+                _gpu_peak_carry = 0
+            self.baseline = self._current_usage()
+            self.peak = self.baseline
+        except Exception as e:
+            logger.warning(f"Mesure du pic mémoire indisponible: {str(e)}")
+            return
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> int:
+        """Arrête la mesure et retourne le pic (en octets) au-dessus de la mémoire initiale."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            try:
+                self.peak = max(self.peak, self._current_usage())
+            except Exception:
+                pass
+        return max(0, self.peak - self.baseline)
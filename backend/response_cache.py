@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("response_cache.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("response-cache")
+
+# Octets lus au début et à la fin de chaque fichier de poids pour l'empreinte du modèle
+FINGERPRINT_SAMPLE_BYTES = 1024 * 1024
+
+# Extensions des fichiers prises en compte dans l'empreinte d'un répertoire de modèle
+MODEL_FILE_EXTENSIONS = (".safetensors", ".bin", ".gguf", ".json", ".model", ".pt")
+
+_fingerprints: Dict[Tuple, str] = {}
+_fingerprints_lock = threading.Lock()
+
+
+def _model_files(path: str):
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            if name.endswith(MODEL_FILE_EXTENSIONS):
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+
+def model_fingerprint(path: str) -> str:
+    """
+    Empreinte du contenu d'un modèle local (fichier GGUF ou répertoire Hugging Face).
+
+    Hacher intégralement plusieurs Go de poids à chaque démarrage serait trop long:
+    l'empreinte couvre le nom et la taille de chaque fichier, le contenu complet des
+    petits fichiers (configuration, tokenizer, adaptateurs) et le début et la fin des
+    gros. Elle est mémorisée tant que les dates de modification ne changent pas.
+
+    Args:
+        path: Chemin local du modèle
+
+    Returns:
+        str: Empreinte SHA-256 (hexadécimale)
+    """
+    files = _model_files(path)
+    stamp = (path, tuple((f, os.path.getsize(f), os.path.getmtime(f)) for f in files))
+    with _fingerprints_lock:
+        if stamp in _fingerprints:
+            return _fingerprints[stamp]
+
+    digest = hashlib.sha256()
+    for file_path, size, _ in stamp[1]:
+        digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+        digest.update(str(size).encode("utf-8"))
+        with open(file_path, "rb") as f:
+            if size <= 2 * FINGERPRINT_SAMPLE_BYTES:
+                digest.update(f.read())
+            else:
+                digest.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+                f.seek(-FINGERPRINT_SAMPLE_BYTES, os.SEEK_END)
+                digest.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+    fingerprint = digest.hexdigest()
+
+    with _fingerprints_lock:
+        _fingerprints[stamp] = fingerprint
+    return fingerprint
+
+
+def is_deterministic(temperature: float) -> bool:
+    """Seul le décodage glouton produit toujours la même réponse pour un même prompt."""
+    return temperature <= 0
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, db_path: Optional[str] = None, max_disk_entries: int = 100000):
+        """
+        Cache des réponses d'inférence déterministes (température nulle).
+
+        La clé combine l'empreinte du contenu du modèle, le prompt et les paramètres de
+        génération: un modèle ré-entraîné au même chemin ne sert donc pas d'anciennes
+        réponses. Les requêtes identiques simultanées sont regroupées: une seule génération
+        s'exécute et toutes reçoivent son résultat. Les réponses sont gardées en mémoire
+        (LRU) et, si db_path est fourni, dans une table SQLite qui survit aux redémarrages.
+
+        Args:
+            max_entries: Nombre maximal de réponses en mémoire
+            db_path: Base SQLite de persistance (None: mémoire uniquement)
+            max_disk_entries: Nombre maximal de réponses persistées
+        """
+        self.max_entries = max(1, max_entries)
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        if db_path:
+            self._create_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _create_table(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS response_cache (
+                cache_key TEXT PRIMARY KEY,
+                response TEXT,
+                created_at REAL
+            )
+            ''')
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(fingerprint: str, prompt: str, params: Dict[str, Any]) -> str:
+        """Clé d'une requête: empreinte du modèle, prompt et paramètres de génération."""
+        payload = json.dumps({"model": fingerprint, "prompt": prompt, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, response: Dict[str, Any]):
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT response FROM response_cache WHERE cache_key = ?", (key,)).fetchone()
+            return json.loads(row[0]) if row else None
+        finally:
+            conn.close()
+
+    def _persist(self, key: str, response: Dict[str, Any]):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (cache_key, response, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(response, ensure_ascii=False), time.time())
+            )
+            # Supprimer les réponses les plus anciennes au-delà de la limite
+            conn.execute(
+                '''DELETE FROM response_cache WHERE cache_key IN (
+                       SELECT cache_key FROM response_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                   )''',
+                (self.max_disk_entries,)
+            )
+        finally:
+            conn.close()
+
+    async def get_or_generate(
+        self,
+        key: str,
+        generate: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Retourne la réponse en cache, attend une génération identique en cours, ou génère.
+
+        Args:
+            key: Clé de la requête (make_key)
+            generate: Coroutine de génération, appelée uniquement en cas d'échec du cache
+
+        Returns:
+            Tuple[Dict[str, Any], str]: Réponse et origine ("hit", "disk", "coalesced" ou "miss")
+        """
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key], "hit"
+
+        if key in self._in_flight:
+            self.coalesced += 1
+            return await asyncio.shield(self._in_flight[key]), "coalesced"
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            if self.db_path:
+                response = await asyncio.get_running_loop().run_in_executor(None, self._load, key)
+                if response is not None:
+                    self.disk_hits += 1
+                    self._remember(key, response)
+                    future.set_result(response)
+                    return response, "disk"
+
+            self.misses += 1
+            response = await generate()
+            self._remember(key, response)
+            if self.db_path:
+                await asyncio.get_running_loop().run_in_executor(None, self._persist, key, response)
+            future.set_result(response)
+            return response, "miss"
+        except BaseException as e:
+            # Les requêtes regroupées reçoivent la même erreur; rien n'est mis en cache
+            if not future.done():
+                future.set_exception(e)
+                # Éviter l'avertissement "exception never retrieved" si personne n'attendait
+                future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne l'état du cache (entrées, succès, requêtes regroupées)."""
+        lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "persistent": bool(self.db_path),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "hit_rate": (self.hits + self.disk_hits + self.coalesced) / lookups if lookups else 0.0
+        }
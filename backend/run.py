@@ -59,9 +59,14 @@ def main():
     parser.add_argument("--port", type=int, default=8000, help="Port sur lequel écouter")
     parser.add_argument("--reload", action="store_true", help="Activer le rechargement automatique")
     parser.add_argument("--setup", action="store_true", help="Exécuter le script d'installation avant de démarrer")
+    parser.add_argument("--job-backend", choices=["local", "queue"], default=None, help="Exécuter les jobs dans l'API (local) ou les confier aux workers via la file partagée (queue)")
     
     args = parser.parse_args()
     
+    # Le backend d'exécution est lu par app.py à l'import
+    if args.job_backend:
+        os.environ["UNSLOTH_JOB_BACKEND"] = args.job_backend
+    
     # Exécuter le script d'installation si demandé
     if args.setup:
         logger.info("Exécution du script d'installation...")
@@ -0,0 +1,259 @@
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from hardware_detection import get_memory_info, get_gpu_info
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("scheduler.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("scheduler")
+
+MIB = 1024 ** 2
+
+
+def _to_bytes(value: Any) -> Optional[int]:
+    """Convertit une quantité mémoire de get_gpu_info (MiB en texte pour nvidia-smi, octets pour torch)."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(float(str(value).strip()) * MIB)
+    except ValueError:
+        return None
+
+
+def get_device_memory(device: str) -> Dict[str, Optional[int]]:
+    """
+    Retourne la mémoire totale et libre (en octets) d'un type de périphérique.
+
+    Pour le GPU, le périphérique ayant le plus de mémoire libre est retenu.
+
+    Args:
+        device: "gpu" ou "cpu"
+
+    Returns:
+        Dict[str, Optional[int]]: {"total", "free"}
+    """
+    if device == "gpu":
+        best = {"total": None, "free": None}
+        gpu_info = get_gpu_info()
+        for vendor in ("nvidia", "amd"):
+            for gpu in gpu_info[vendor]["devices"]:
+                total = _to_bytes(gpu.get("memory_total"))
+                free = _to_bytes(gpu.get("memory_free"))
+                if free is None and total is not None:
+                    used = _to_bytes(gpu.get("memory_used")) or _to_bytes(gpu.get("memory_reserved")) or 0
+                    free = total - used
+                if free is not None and (best["free"] is None or free > best["free"]):
+                    best = {"total": total, "free": free}
+        return best
+
+    memory_info = get_memory_info()
+    return {"total": memory_info.get("total"), "free": memory_info.get("available")}
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+    def __init__(self, poll_interval: float = 5.0, safety_margin: float = 0.1, memory_ttl: float = 1.0):
+        """
+        Initialise le contrôleur d'admission mémoire des jobs.
+
+        Un job n'est admis que si son estimation tient dans la mémoire libre mesurée,
+        diminuée des réservations des jobs admis qui n'ont pas encore atteint leur régime.
+        Les jobs en attente sont admis dans l'ordre d'arrivée; ils sont réveillés dès qu'une
+        réservation est libérée ou réduite, et au plus tard toutes les poll_interval secondes
+        (mémoire libérée hors du contrôleur).
+
+        La mémoire libre est mesurée hors de la boucle d'événements et hors du verrou
+        (nvidia-smi, rocm-smi), puis réutilisée pendant memory_ttl secondes.
+
+        Args:
+            poll_interval: Intervalle maximal (en secondes) entre deux vérifications de la mémoire libre
+            safety_margin: Fraction de la mémoire totale gardée en réserve
+            memory_ttl: Durée (en secondes) de validité d'une mesure de mémoire libre
+        """
+        self.poll_interval = poll_interval
+        self.safety_margin = safety_margin
+        self.memory_ttl = memory_ttl
+        self._lock = threading.Lock()
+        self._waiting: List[Dict[str, Any]] = []
+        self._admitted: Dict[str, Dict[str, Any]] = {}
+        self._memory_samples: Dict[str, Dict[str, Any]] = {}
+        self._waiters: List[Any] = []
+
+    async def sample_memory(self, device: str) -> Dict[str, Optional[int]]:
+        """Retourne la mémoire totale et libre du périphérique (mesure récente réutilisée)."""
+        sample = self._memory_samples.get(device)
+        if sample is not None and time.monotonic() - sample["at"] < self.memory_ttl:
+            return sample["memory"]
+        memory = await asyncio.get_running_loop().run_in_executor(None, get_device_memory, device)
+        self._memory_samples[device] = {"at": time.monotonic(), "memory": memory}
+        return memory
+
+    def _invalidate_memory(self, device: Optional[str]):
+        # La mémoire d'un job qui atteint son régime ou se termine n'est pas dans l'ancienne mesure
+        if device is not None:
+            self._memory_samples.pop(device, None)
+
+    def _notify(self):
+        """Réveille les jobs en attente (appelé sous le verrou); chacun réévalue sa situation."""
+        for loop, future in self._waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        self._waiters = []
+
+    def _pending_reservations(self, device: str) -> int:
+        """Somme des réservations des jobs admis dont la mémoire n'est pas encore visible."""
+        return sum(
+            r["estimate"] for r in self._admitted.values()
+            if r["device"] == device and not r["steady"]
+        )
+
+    def _try_admit(self, entry: Dict[str, Any], memory: Dict[str, Optional[int]]) -> Optional[Dict[str, Any]]:
+        """Tente d'admettre un job avec la mémoire mesurée; retourne la décision ou None s'il doit attendre."""
+        device = entry["device"]
+        if memory["free"] is None:
+            # Mémoire inconnue: ne pas bloquer le job
+            return {"free_memory": None, "available_for_job": None}
+
+        margin = int((memory["total"] or 0) * self.safety_margin)
+        available = memory["free"] - margin - self._pending_reservations(device)
+        entry["last_free_memory"] = memory["free"]
+        entry["last_available"] = available
+
+        if memory["total"] is not None and entry["estimate"] > memory["total"] - margin:
+            raise Exception(
+                f"Mémoire insuffisante: le job nécessite environ {entry['estimate'] / MIB:.0f} Mo "
+                f"pour {(memory['total'] - margin) / MIB:.0f} Mo utilisables sur {device}"
+            )
+
+        if entry["estimate"] <= available:
+            return {"free_memory": memory["free"], "available_for_job": available}
+        return None
+
+    async def acquire(self, job_id: str, estimate: int, device: str, on_wait=None) -> Dict[str, Any]:
+        """
+        Attend que le job tienne en mémoire puis le réserve.
+
+        Args:
+            job_id: Identifiant du job
+            estimate: Pic mémoire estimé en octets
+            device: "gpu" ou "cpu"
+            on_wait: Fonction appelée (avec l'entrée d'attente) à chaque vérification infructueuse
+
+        Returns:
+            Dict[str, Any]: Décision d'admission (mémoire libre, temps d'attente)
+
+        Raises:
+            Exception: Si le job ne peut jamais tenir dans la mémoire du périphérique
+        """
+        entry = {
+            "job_id": job_id,
+            "estimate": int(estimate),
+            "device": device,
+            "queued_at": time.time()
+        }
+        with self._lock:
+            self._waiting.append(entry)
+
+        try:
+            while True:
+                with self._lock:
+                    # Ordre d'arrivée: seul le premier job en attente sur ce périphérique est examiné
+                    is_head = next(e for e in self._waiting if e["device"] == device) is entry
+                # Mesure hors du verrou: elle peut lancer nvidia-smi / rocm-smi
+                memory = await self.sample_memory(device) if is_head else None
+                wakeup = None
+                with self._lock:
+                    decision = self._try_admit(entry, memory) if is_head else None
+                    if decision is not None:
+                        self._waiting.remove(entry)
+                        self._admitted[job_id] = {
+                            "job_id": job_id,
+                            "estimate": entry["estimate"],
+                            "device": device,
+                            "steady": False,
+                            "admitted_at": datetime.now().isoformat()
+                        }
+                        # Le job suivant devient tête de file
+                        self._notify()
+                    else:
+                        # Enregistré sous le verrou: aucune libération ne peut être manquée
+                        loop = asyncio.get_running_loop()
+                        wakeup = loop.create_future()
+                        self._waiters = [w for w in self._waiters if not w[1].done()] + [(loop, wakeup)]
+
+                if decision is not None:
+                    decision["wait_seconds"] = time.time() - entry["queued_at"]
+                    logger.info(f"Job {job_id} admis sur {device} ({entry['estimate'] / MIB:.0f} Mo estimés)")
+                    return decision
+
+                if on_wait is not None:
+                    on_wait(entry)
+                try:
+                    await asyncio.wait_for(wakeup, self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._lock:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    self._notify()
+            raise
+
+    def mark_steady(self, job_id: str):
+        """Indique que la mémoire du job est désormais visible dans les mesures de mémoire libre."""
+        with self._lock:
+            if job_id in self._admitted:
+                self._admitted[job_id]["steady"] = True
+                self._invalidate_memory(self._admitted[job_id]["device"])
+                self._notify()
+
+    def resize(self, job_id: str, estimate: int):
+        """
+        Remplace la réservation d'un job admis (ex: modèle chargé, seule la mémoire de
+        génération de la requête reste à venir).
+        """
+        with self._lock:
+            if job_id in self._admitted:
+                self._admitted[job_id]["estimate"] = int(estimate)
+                self._invalidate_memory(self._admitted[job_id]["device"])
+                self._notify()
+
+    def release(self, job_id: str):
+        """Libère la réservation d'un job terminé."""
+        with self._lock:
+            admitted = self._admitted.pop(job_id, None)
+            self._invalidate_memory(admitted["device"] if admitted else None)
+            self._notify()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne l'état du contrôleur (jobs en attente et admis)."""
+        with self._lock:
+            return {
+                "waiting": [
+                    {
+                        "job_id": e["job_id"],
+                        "estimate": e["estimate"],
+                        "device": e["device"],
+                        "waiting_seconds": time.time() - e["queued_at"],
+                        "last_available": e.get("last_available")
+                    }
+                    for e in self._waiting
+                ],
+                "admitted": list(self._admitted.values())
+            }
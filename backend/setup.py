@@ -23,7 +23,8 @@ def create_directories():
         "processed_datasets",
         "models",
         "exported_models",
-        "evaluation_results"
+        "evaluation_results",
+        "pipelines"
     ]
     
     for directory in directories:
@@ -83,7 +84,10 @@ def setup_database():
             file_path TEXT,
             format TEXT,
             size INTEGER,
-            created_at TEXT
+            created_at TEXT,
+            source TEXT,
+            last_used_at REAL,
+            use_count INTEGER DEFAULT 0
         )
         ''')
         
@@ -0,0 +1,208 @@
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+from inference_engine import token_probabilities
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("speculative_decoding.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("speculative-decoding")
+
+# Nombre de tokens proposés par le modèle brouillon à chaque vérification
+DEFAULT_DRAFT_TOKENS = 4
+
+# Nombre d'étapes de décodage classique du modèle cible servant de référence de vitesse
+BASELINE_STEPS = 4
+
+
+def check_draft_tokenizer(tokenizer, draft_tokenizer):
+    """Le modèle brouillon doit partager le vocabulaire du modèle cible (mêmes identifiants de tokens)."""
+    if draft_tokenizer is None:
+        return
+    if len(draft_tokenizer) != len(tokenizer) or draft_tokenizer.eos_token_id != tokenizer.eos_token_id:
+        raise ValueError(
+            f"Le modèle brouillon n'utilise pas le vocabulaire du modèle cible "
+            f"({len(draft_tokenizer)} tokens contre {len(tokenizer)})"
+        )
+
+
+def _forward(model, cache, token_ids: List[int], vocab_size: int):
+    import torch
+
+    input_ids = torch.tensor([token_ids], device=model.device)
+    with torch.no_grad():
+        outputs = model(input_ids=input_ids, past_key_values=cache, use_cache=True)
+    # Les logits au-delà du vocabulaire (lignes d'embedding de remplissage) sont ignorés
+    return outputs.logits[0, :, :vocab_size].float()
+
+
+def _truncate(cache, length: int):
+    """Tronque un DynamicCache à length tokens (décalage négatif de crop, seule forme non dépréciée)."""
+    excess = cache.get_seq_length() - length
+    if excess > 0:
+        cache.crop(-excess)
+
+
+def _median(values: List[float]) -> float:
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def speculative_generate(
+    model,
+    draft_model,
+    tokenizer,
+    prompt: str,
+    max_tokens: int = 100,
+    temperature: float = 0.7,
+    top_p: float = 0.9,
+    num_draft_tokens: int = DEFAULT_DRAFT_TOKENS,
+    draft_tokenizer=None,
+    generator=None
+) -> Dict[str, Any]:
+    """
+    Génère la suite d'un prompt par décodage spéculatif.
+
+    À chaque itération, le modèle brouillon propose num_draft_tokens tokens, un à la fois;
+    le modèle cible les vérifie tous en une seule passe. Les tokens proposés sont acceptés
+    tant qu'ils sont compatibles avec la distribution du modèle cible (égalité avec son
+    argmax en décodage glouton, test d'acceptation probabiliste sinon); au premier rejet,
+    le token est remplacé par un tirage du modèle cible. Le texte suit donc la distribution
+    du modèle cible. Les caches clé/valeur des deux modèles sont tronqués aux tokens acceptés.
+
+    Les BASELINE_STEPS premiers tokens sont générés par le modèle cible seul: la durée
+    médiane de ces étapes sert de référence pour estimer l'accélération par rapport au
+    décodage token par token (estimation: la référence n'est mesurée que sur ces étapes).
+
+    Args:
+        model: Modèle cible (transformers)
+        draft_model: Petit modèle brouillon partageant le vocabulaire du modèle cible
+        tokenizer: Tokenizer du modèle cible
+        prompt: Prompt
+        max_tokens: Nombre maximal de tokens générés
+        temperature: Température (0: décodage glouton)
+        top_p: Masse de probabilité conservée
+        num_draft_tokens: Nombre de tokens proposés par vérification
+        draft_tokenizer: Tokenizer du modèle brouillon (vérification du vocabulaire)
+        generator: Générateur aléatoire torch
+
+    Returns:
+        Dict[str, Any]: Texte généré et métriques (taux d'acceptation, tokens/s, accélération)
+    """
+    import torch
+    from transformers import DynamicCache
+
+    check_draft_tokenizer(tokenizer, draft_tokenizer)
+    start = time.perf_counter()
+    greedy = temperature <= 0
+    vocab_size = len(tokenizer)
+    eos_token_id = tokenizer.eos_token_id
+    tokens = tokenizer(prompt)["input_ids"]
+    target_cache, draft_cache = DynamicCache(), DynamicCache()
+
+    def choose(logits) -> int:
+        if greedy:
+            return int(torch.argmax(logits).item())
+        return int(torch.multinomial(token_probabilities(logits, temperature, top_p), 1, generator=generator).item())
+
+    # Pré-remplissage du prompt (sauf le dernier token) dans le modèle cible
+    if len(tokens) > 1:
+        _forward(model, target_cache, tokens[:-1], vocab_size)
+    decode_start = time.perf_counter()
+
+    # Premiers tokens: étapes de décodage classique du modèle cible, chronométrées
+    generated, baseline_steps = [], []
+    time_to_first_token = None
+    while len(generated) < min(BASELINE_STEPS, max(1, max_tokens)) and (not generated or generated[-1] != eos_token_id):
+        step_start = time.perf_counter()
+        generated.append(choose(_forward(model, target_cache, tokens[-1:], vocab_size)[-1]))
+        baseline_steps.append(time.perf_counter() - step_start)
+        if time_to_first_token is None:
+            time_to_first_token = time.perf_counter() - start
+        tokens.append(generated[-1])
+    baseline_step = _median(baseline_steps)
+    proposed = accepted = 0
+    target_passes = len(baseline_steps)
+
+    while len(generated) < max_tokens and generated[-1] != eos_token_id:
+        # Chaque vérification produit au plus k + 1 tokens
+        k = max(0, min(num_draft_tokens, max_tokens - len(generated) - 1))
+
+        # Propositions du modèle brouillon
+        draft_tokens, draft_probs = [], []
+        feed = tokens[draft_cache.get_seq_length():]
+        for _ in range(k):
+            logits = _forward(draft_model, draft_cache, feed, vocab_size)[-1]
+            if greedy:
+                token = int(torch.argmax(logits).item())
+            else:
+                probs = token_probabilities(logits, temperature, top_p)
+                token = int(torch.multinomial(probs, 1, generator=generator).item())
+                draft_probs.append(probs)
+            draft_tokens.append(token)
+            feed = [token]
+
+        # Vérification de toutes les propositions en une passe du modèle cible
+        logits = _forward(model, target_cache, tokens[target_cache.get_seq_length():] + draft_tokens, vocab_size)
+        logits = logits[-(k + 1):]
+        target_passes += 1
+        proposed += k
+
+        new_tokens = []
+        for i, token in enumerate(draft_tokens):
+            if greedy:
+                best = int(torch.argmax(logits[i]).item())
+                if best != token:
+                    new_tokens.append(best)
+                    break
+            else:
+                p = token_probabilities(logits[i], temperature, top_p)
+                q = draft_probs[i]
+                if torch.rand(1, generator=generator).item() * q[token].item() > p[token].item():
+                    # Rejet: tirage dans la distribution résiduelle max(0, p - q)
+                    residual = torch.clamp(p - q, min=0.0)
+                    residual = residual if residual.sum() > 0 else p
+                    new_tokens.append(int(torch.multinomial(residual, 1, generator=generator).item()))
+                    break
+            new_tokens.append(token)
+            accepted += 1
+        else:
+            # Toutes les propositions acceptées: le modèle cible fournit un token supplémentaire
+            new_tokens.append(choose(logits[k]))
+
+        if eos_token_id in new_tokens:
+            new_tokens = new_tokens[:new_tokens.index(eos_token_id) + 1]
+        new_tokens = new_tokens[:max_tokens - len(generated)]
+        generated.extend(new_tokens)
+        tokens.extend(new_tokens)
+
+        # Les caches ne conservent que les tokens acceptés (le dernier token reste à évaluer)
+        _truncate(target_cache, len(tokens) - 1)
+        _truncate(draft_cache, len(tokens) - 1)
+
+    elapsed = time.perf_counter() - start
+    decode_elapsed = time.perf_counter() - decode_start
+    tokens_per_sec = len(generated) / decode_elapsed if decode_elapsed > 0 else 0.0
+    baseline_tokens_per_sec = 1.0 / baseline_step if baseline_step > 0 else 0.0
+    return {
+        "generated_text": tokenizer.decode(generated, skip_special_tokens=True),
+        "tokens": len(generated),
+        "draft_tokens": proposed,
+        "accepted_tokens": accepted,
+        "acceptance_rate": accepted / proposed if proposed else 0.0,
+        "tokens_per_target_pass": len(generated) / target_passes,
+        "tokens_per_sec": tokens_per_sec,
+        "baseline_tokens_per_sec": baseline_tokens_per_sec,
+        "baseline_steps": len(baseline_steps),
+        "speedup": tokens_per_sec / baseline_tokens_per_sec if baseline_tokens_per_sec else None,
+        "time_to_first_token": time_to_first_token,
+        "latency": elapsed
+    }
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# Les modules du backend s'importent entre eux par leur nom (exécution depuis backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Corpus du petit modèle de test (tokenizer BPE entraîné dessus)
+TINY_CORPUS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Le renard brun saute par-dessus le chien paresseux.",
+    "Question: What is the capital of France?\nAnswer: Paris",
+    "Fine-tuning adapts a pretrained language model to a new task.",
+] * 8
+
+
+@pytest.fixture(scope="session")
+def tiny_model(tmp_path_factory):
+    """Petit modèle Llama aléatoire (CPU, hors ligne) et son tokenizer."""
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    from load_test import build_tiny_model
+
+    path = build_tiny_model(str(tmp_path_factory.mktemp("tiny-model")), TINY_CORPUS)
+    torch.manual_seed(0)
+    model = AutoModelForCausalLM.from_pretrained(path)
+    model.eval()
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    return model, tokenizer, path
@@ -0,0 +1,61 @@
+import pytest
+
+from inference_engine import ContinuousBatchingEngine
+from prefix_cache import PrefixCache
+
+PROMPTS = [
+    "The quick brown fox",
+    "Question: What is the capital of France?\nAnswer:",
+    "Fine-tuning adapts",
+    "Le renard brun saute par-dessus le chien paresseux. Le renard brun saute",
+]
+
+
+def _generate(model, tokenizer, prompt: str, max_tokens: int) -> str:
+    import torch
+
+    inputs = tokenizer(prompt, return_tensors="pt")
+    with torch.no_grad():
+        outputs = model.generate(**inputs, max_new_tokens=max_tokens, do_sample=False, pad_token_id=tokenizer.pad_token_id)
+    return tokenizer.decode(outputs[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+
+@pytest.fixture
+def engine(tiny_model):
+    model, tokenizer, _ = tiny_model
+    engine = ContinuousBatchingEngine(model, tokenizer, max_batch_size=4, name="tiny", prefix_cache=PrefixCache(min_tokens=4))
+    yield engine
+    engine.shutdown()
+
+
+def test_greedy_engine_matches_generate(tiny_model, engine):
+    model, tokenizer, _ = tiny_model
+    for prompt in PROMPTS:
+        result = engine.submit(prompt, max_tokens=12, temperature=0).result(timeout=120)
+        assert result["generated_text"] == _generate(model, tokenizer, prompt, 12)
+
+
+def test_concurrent_requests_match_generate(tiny_model, engine):
+    model, tokenizer, _ = tiny_model
+    # Longueurs de prompt et de réponse différentes: les requêtes entrent et quittent le batch à des pas différents
+    futures = [engine.submit(prompt, max_tokens=4 + 3 * i, temperature=0) for i, prompt in enumerate(PROMPTS)]
+    for i, (prompt, future) in enumerate(zip(PROMPTS, futures)):
+        assert future.result(timeout=120)["generated_text"] == _generate(model, tokenizer, prompt, 4 + 3 * i)
+
+
+def test_prefix_cache_reuse_keeps_output(tiny_model, engine):
+    model, tokenizer, _ = tiny_model
+    prompt = PROMPTS[3]
+    first = engine.submit(prompt, max_tokens=8, temperature=0).result(timeout=120)
+    second = engine.submit(prompt + " par-dessus", max_tokens=8, temperature=0).result(timeout=120)
+    assert second["cached_tokens"] > 0
+    assert first["generated_text"] == _generate(model, tokenizer, prompt, 8)
+    assert second["generated_text"] == _generate(model, tokenizer, prompt + " par-dessus", 8)
+
+
+def test_shutdown_rejects_new_requests(tiny_model):
+    model, tokenizer, _ = tiny_model
+    engine = ContinuousBatchingEngine(model, tokenizer, max_batch_size=2)
+    engine.shutdown()
+    with pytest.raises(RuntimeError):
+        engine.submit("hello", max_tokens=2).result(timeout=10)
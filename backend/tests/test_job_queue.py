@@ -0,0 +1,58 @@
+import time
+
+from job_queue import JobQueue
+
+
+def _queue(tmp_path, lease_seconds: float = 0.2) -> JobQueue:
+    return JobQueue(str(tmp_path / "queue.db"), lease_seconds=lease_seconds)
+
+
+def test_lease_respects_capabilities(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue("gpu-job", "finetune", {}, requirements=["gpu"])
+    queue.enqueue("cpu-job", "preprocess", {})
+
+    assert queue.lease("w1", ["cpu"])["job_id"] == "cpu-job"
+    assert queue.lease("w1", ["cpu"]) is None
+    assert queue.lease("w2", ["cpu", "gpu"])["job_id"] == "gpu-job"
+
+
+def test_expired_lease_is_requeued_and_old_worker_loses_it(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue("job", "preprocess", {})
+    assert queue.lease("dead-worker", ["cpu"])["attempts"] == 1
+
+    time.sleep(0.3)
+    leased = queue.lease("new-worker", ["cpu"])
+    assert leased["job_id"] == "job"
+    assert leased["worker_id"] == "new-worker"
+    assert leased["attempts"] == 2
+
+    # L'ancien worker ne peut plus prolonger ni terminer le job
+    assert queue.heartbeat("dead-worker", "job") is False
+    assert queue.complete("job", "dead-worker") is False
+    assert queue.complete("job", "new-worker") is True
+    assert queue.get("job")["status"] == "completed"
+
+
+def test_heartbeat_keeps_lease(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue("job", "preprocess", {})
+    queue.lease("worker", ["cpu"])
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.heartbeat("worker", "job", {"progress": 0.5}) is True
+    assert queue.requeue_expired() == 0
+    assert queue.get("job")["status"] == "leased"
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue("job", "preprocess", {}, max_attempts=1)
+    queue.lease("worker", ["cpu"])
+
+    time.sleep(0.3)
+    assert queue.requeue_expired() == 1
+    job = queue.get("job")
+    assert job["status"] == "failed"
+    assert queue.lease("other", ["cpu"]) is None
@@ -0,0 +1,69 @@
+import pytest
+
+from conftest import TINY_CORPUS
+from model_evaluation import ModelEvaluator
+
+
+def _evaluator(tmp_path, model=None, tokenizer=None) -> ModelEvaluator:
+    evaluator = ModelEvaluator("tiny-model", output_dir=str(tmp_path))
+    evaluator.model = model
+    evaluator.tokenizer = tokenizer
+    return evaluator
+
+
+@pytest.mark.parametrize("length,max_length,stride", [(5, 8, 4), (20, 8, 4), (21, 8, 3), (17, 6, 5), (9, 8, 7)])
+def test_perplexity_windows_score_each_token_once(tmp_path, length, max_length, stride):
+    token_ids = list(range(length))
+    windows = _evaluator(tmp_path)._perplexity_windows(token_ids, max_length, stride)
+
+    scored = []
+    for window, first_scored in windows:
+        assert 1 <= len(window) <= max_length
+        assert 1 <= first_scored <= len(window)
+        # Le premier token d'une fenêtre n'a pas de contexte: il n'est jamais compté
+        scored.extend(window[first_scored:])
+    assert scored == token_ids[1:]
+
+
+def _naive_nll(model, tokenizer, texts, max_length, stride):
+    """Boucle de référence: une fenêtre glissante à la fois, sans padding (méthode Hugging Face)."""
+    import torch
+
+    total_nll, num_tokens = 0.0, 0
+    for text in texts:
+        input_ids = torch.tensor([tokenizer(text)["input_ids"]])
+        seq_len = input_ids.shape[1]
+        if seq_len < 2:
+            continue
+        previous_end = 0
+        for begin in range(0, seq_len, stride):
+            end = min(begin + max_length, seq_len)
+            target_length = end - previous_end
+            window = input_ids[:, begin:end]
+            labels = window.clone()
+            labels[:, :-target_length] = -100
+            with torch.no_grad():
+                logits = model(input_ids=window).logits
+            nll = torch.nn.functional.cross_entropy(
+                logits[0, :-1].float(), labels[0, 1:], ignore_index=-100, reduction="sum"
+            )
+            total_nll += float(nll)
+            num_tokens += int((labels[0, 1:] != -100).sum())
+            previous_end = end
+            if end == seq_len:
+                break
+    return total_nll, num_tokens
+
+
+@pytest.mark.parametrize("batch_size,max_length,stride", [(1, 2048, None), (4, 2048, None), (3, 8, 4), (8, 6, 5)])
+def test_transformers_nll_matches_naive_loop(tmp_path, tiny_model, batch_size, max_length, stride):
+    model, tokenizer, _ = tiny_model
+    texts = sorted(set(TINY_CORPUS)) + ["short", " ".join(TINY_CORPUS[:3])]
+    evaluator = _evaluator(tmp_path, model, tokenizer)
+
+    total_nll, num_tokens = evaluator._transformers_nll(texts, batch_size=batch_size, max_length=max_length, stride=stride)
+
+    context = min(max_length, model.config.max_position_embeddings)
+    expected_nll, expected_tokens = _naive_nll(model, tokenizer, texts, context, stride or context // 2)
+    assert num_tokens == expected_tokens
+    assert total_nll == pytest.approx(expected_nll, rel=1e-4)
@@ -0,0 +1,76 @@
+import pytest
+
+from pipeline import PipelineRunner
+
+
+def _runner(tmp_path, executors=None) -> PipelineRunner:
+    executors = executors or {step_type: (lambda params: {}) for step_type in ("preprocess", "finetune", "evaluate")}
+    return PipelineRunner(executors, cache_dir=str(tmp_path / "pipelines"))
+
+
+def test_validate_returns_dependencies_from_references(tmp_path):
+    spec = {"steps": [
+        {"id": "prep", "type": "preprocess", "params": {}},
+        {"id": "train", "type": "finetune", "params": {"dataset_path": "${prep.output_path}"}},
+        {"id": "eval", "type": "evaluate", "params": {"model_path": "${train.model_path}"}, "depends_on": ["prep"]}
+    ]}
+    assert _runner(tmp_path).validate(spec) == {"prep": [], "train": ["prep"], "eval": ["prep", "train"]}
+
+
+@pytest.mark.parametrize("steps", [
+    [
+        {"id": "a", "type": "preprocess", "params": {"x": "${b.output_path}"}},
+        {"id": "b", "type": "finetune", "params": {"x": "${a.output_path}"}}
+    ],
+    [
+        {"id": "a", "type": "preprocess", "depends_on": ["c"]},
+        {"id": "b", "type": "finetune", "depends_on": ["a"]},
+        {"id": "c", "type": "evaluate", "depends_on": ["b"]}
+    ],
+    [{"id": "a", "type": "preprocess", "params": {"x": "${a.output_path}"}}]
+])
+def test_validate_rejects_cycles(tmp_path, steps):
+    with pytest.raises(ValueError):
+        _runner(tmp_path).validate({"steps": steps})
+
+
+def test_validate_rejects_unknown_dependency(tmp_path):
+    with pytest.raises(ValueError, match="inconnues"):
+        _runner(tmp_path).validate({"steps": [{"id": "a", "type": "preprocess", "depends_on": ["missing"]}]})
+
+
+def test_cache_key_ignores_outputs_and_tracks_inputs(tmp_path):
+    runner = _runner(tmp_path)
+    data = tmp_path / "data.csv"
+    data.write_text("text\nhello\n")
+    output = tmp_path / "clean.csv"
+    params = {"file_path": str(data), "output_path": str(output)}
+
+    key = runner.compute_cache_key("preprocess", params)
+    # Écrire l'artefact de sortie ne change pas la clé (sinon l'étape ne serait jamais réutilisée)
+    output.write_text("text\nhello\n")
+    assert runner.compute_cache_key("preprocess", params) == key
+    # Modifier une entrée la change
+    data.write_text("text\nhello\nworld\n")
+    assert runner.compute_cache_key("preprocess", params) != key
+    # Tout comme la configuration de l'étape
+    assert runner.compute_cache_key("preprocess", dict(params, remove_duplicates=False)) != runner.compute_cache_key("preprocess", params)
+
+
+def test_run_reuses_unchanged_steps(tmp_path):
+    calls = []
+    output = tmp_path / "clean.csv"
+
+    def preprocess(params):
+        calls.append(params)
+        output.write_text("done")
+        return {"output_path": params["output_path"]}
+
+    runner = _runner(tmp_path, {"preprocess": preprocess})
+    spec = {"steps": [{"id": "prep", "type": "preprocess", "params": {"output_path": str(output)}}]}
+
+    first = runner.run("p1", spec, {})
+    second = runner.run("p2", spec, {})
+    assert first["status"] == second["status"] == "completed"
+    assert second["steps"]["prep"]["status"] == "cached"
+    assert len(calls) == 1
@@ -0,0 +1,51 @@
+from prefix_cache import PrefixCache, common_prefix_length
+
+
+def test_common_prefix_length():
+    assert common_prefix_length([1, 2, 3], [1, 2, 4]) == 2
+    assert common_prefix_length([1, 2], [1, 2, 3]) == 2
+    assert common_prefix_length([], [1]) == 0
+
+
+def test_lookup_returns_longest_prefix_of_same_model():
+    cache = PrefixCache(max_bytes=1000, min_tokens=2)
+    cache.store("m", [1, 2, 3], "short", 10)
+    cache.store("m", [1, 2, 3, 4, 5], "long", 10)
+    cache.store("other", [1, 2, 3, 4, 5, 6], "other-model", 10)
+
+    assert cache.lookup("m", [1, 2, 3, 4, 5, 6]) == ("long", 5)
+    # max_length laisse au moins un token à pré-remplir
+    assert cache.lookup("m", [1, 2, 3, 4, 5], max_length=4) == ("long", 4)
+    assert cache.lookup("m", [1, 9]) == (None, 0)
+
+
+def test_eviction_removes_least_recently_used():
+    cache = PrefixCache(max_bytes=25, min_tokens=1)
+    cache.store("m", [1], "a", 10)
+    cache.store("m", [2], "b", 10)
+    # Utiliser "a": "b" devient la moins récemment utilisée
+    assert cache.lookup("m", [1]) == ("a", 1)
+    cache.store("m", [3], "c", 10)
+
+    assert cache.lookup("m", [2]) == (None, 0)
+    assert cache.lookup("m", [1]) == ("a", 1)
+    assert cache.lookup("m", [3]) == ("c", 1)
+    status = cache.get_status()
+    assert status["evictions"] == 1
+    assert status["bytes"] <= cache.max_bytes
+
+
+def test_store_ignores_short_and_oversized_entries():
+    cache = PrefixCache(max_bytes=100, min_tokens=3)
+    cache.store("m", [1, 2], "too-short", 10)
+    cache.store("m", [1, 2, 3], "too-big", 101)
+    assert cache.get_status()["entries"] == 0
+
+
+def test_drop_removes_model_entries():
+    cache = PrefixCache(max_bytes=100, min_tokens=1)
+    cache.store("m", [1], "a", 10)
+    cache.store("other", [1], "b", 10)
+    cache.drop("m")
+    assert cache.lookup("m", [1]) == (None, 0)
+    assert cache.lookup("other", [1]) == ("b", 1)
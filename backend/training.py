@@ -0,0 +1,1031 @@
+import os
+import json
+import math
+import time
+import logging
+from pathlib import Path
+from contextlib import nullcontext
+from typing import Dict, List, Any, Optional, Iterator, Callable, Tuple
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("training.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("training")
+
+# Modules ciblés par LoRA pour les architectures de type LLaMA
+DEFAULT_LORA_TARGET_MODULES = ["q_proj", "k_proj", "v_proj", "o_proj"]
+
+# Au-delà de ce nombre de paramètres, l'entraînement sur CPU est déconseillé
+CPU_PARAMETER_WARNING_THRESHOLD = 3e9
+
+# Colonnes reconnues pour les données d'instruction
+INSTRUCTION_COLUMNS = ("instruction", "prompt", "question", "input")
+RESPONSE_COLUMNS = ("response", "output", "answer", "completion")
+
+
+def iter_dataset_records(dataset_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Lit un jeu de données prétraité ligne par ligne, sans le charger entièrement en mémoire.
+
+    Args:
+        dataset_path: Chemin du fichier (.jsonl, .json, .csv, .txt)
+
+    Yields:
+        Dict[str, Any]: Un enregistrement par exemple
+    """
+    file_extension = Path(dataset_path).suffix.lower()
+
+    if file_extension == ".jsonl":
+        with open(dataset_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif file_extension == ".json":
+        # Les fichiers .json de DataPreprocessor.save_processed_data sont des tableaux d'enregistrements
+        with open(dataset_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for record in data if isinstance(data, list) else []:
+            yield record if isinstance(record, dict) else {"text": str(record)}
+    elif file_extension == ".csv":
+        import pandas as pd
+        for chunk in pd.read_csv(dataset_path, chunksize=1000):
+            for record in chunk.to_dict(orient="records"):
+                yield record
+    elif file_extension == ".txt":
+        with open(dataset_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield {"text": line.strip()}
+    else:
+        raise ValueError(f"Format de fichier non pris en charge: {file_extension}")
+
+
+def is_holdout_example(position: int, holdout_stride: int) -> bool:
+    """Indique si l'exemple à la position donnée (à partir de 1) appartient à la partition de validation."""
+    return holdout_stride > 0 and position % holdout_stride == 0
+
+
+def count_dataset_records(dataset_path: str, holdout_stride: int = 0, split: str = "train") -> int:
+    """Compte les exemples d'une partition d'un jeu de données en un passage en flux."""
+    count = 0
+    for position, _ in enumerate(iter_dataset_records(dataset_path), start=1):
+        if is_holdout_example(position, holdout_stride) == (split == "validation"):
+            count += 1
+    return count
+
+
+def record_to_text(record: Dict[str, Any], tokenizer=None) -> Optional[str]:
+    """
+    Convertit un enregistrement en texte d'entraînement.
+
+    Reconnaît la sortie de DataPreprocessor.format_for_unsloth (colonne "formatted_data"),
+    les conversations ("messages"), les paires instruction/réponse et le texte brut.
+
+    Args:
+        record: Enregistrement du jeu de données
+        tokenizer: Tokenizer (utilisé pour son modèle de chat s'il en a un)
+
+    Returns:
+        Optional[str]: Texte, ou None si l'enregistrement est vide
+    """
+    if "formatted_data" in record and isinstance(record["formatted_data"], str):
+        record = json.loads(record["formatted_data"])
+
+    if "messages" in record:
+        messages = [m for m in record["messages"] if m.get("content")]
+        if getattr(tokenizer, "chat_template", None):
+            return tokenizer.apply_chat_template(messages, tokenize=False)
+        return "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+
+    if "text" in record and isinstance(record["text"], str):
+        return record["text"]
+
+    instruction = next((record[c] for c in INSTRUCTION_COLUMNS if isinstance(record.get(c), str)), None)
+    response = next((record[c] for c in RESPONSE_COLUMNS if isinstance(record.get(c), str)), None)
+    if instruction is not None and response is not None:
+        return f"### Instruction:\n{instruction}\n\n### Response:\n{response}"
+
+    # Par défaut: première colonne textuelle
+    return next((value for value in record.values() if isinstance(value, str) and value.strip()), None)
+
+
+class StreamingBatchIterator:
+    def __init__(
+        self,
+        dataset_path: str,
+        tokenizer,
+        batch_size: int,
+        max_seq_length: int,
+        skip_examples: int = 0,
+        holdout_stride: int = 0,
+        split: str = "train",
+        shard_index: int = 0,
+        num_shards: int = 1
+    ):
+        """
+        Itère sur les micro-batchs tokenisés d'un jeu de données lu en flux.
+
+        En mode partitionné (num_shards > 1), les exemples sont répartis par groupes
+        de num_shards: chaque processus prend l'exemple d'indice shard_index de chaque
+        groupe complet. Tous les processus reçoivent ainsi le même nombre d'exemples (le
+        dernier groupe incomplet est ignoré) et la même position à chaque batch, ce qui
+        garde les pas synchronisés et les checkpoints valables pour tous les processus.
+
+        Args:
+            dataset_path: Chemin du jeu de données prétraité
+            tokenizer: Tokenizer du modèle
+            batch_size: Nombre d'exemples par micro-batch
+            max_seq_length: Longueur maximale (les textes plus longs sont tronqués)
+            skip_examples: Nombre d'exemples à sauter au début (reprise)
+            holdout_stride: Un exemple sur holdout_stride est réservé à la validation (0: aucun)
+            split: Partition lue ("train" ou "validation")
+            shard_index: Rang du processus parmi num_shards (entraînement data-parallel)
+            num_shards: Nombre de processus se partageant les exemples
+        """
+        self.dataset_path = dataset_path
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.max_seq_length = max_seq_length
+        self.skip_examples = skip_examples
+        self.holdout_stride = holdout_stride
+        self.split = split
+        self.shard_index = shard_index
+        self.num_shards = max(1, num_shards)
+        # Nombre d'exemples consommés depuis le début de l'époque (sauts compris)
+        self.position = 0
+
+    def _collate(self, texts: List[str]) -> Dict[str, Any]:
+        batch = self.tokenizer(
+            texts,
+            max_length=self.max_seq_length,
+            truncation=True,
+            padding=True,
+            return_tensors="pt"
+        )
+        labels = batch["input_ids"].clone()
+        labels[batch["attention_mask"] == 0] = -100
+        batch["labels"] = labels
+        return batch
+
+    def iter_texts(self) -> Iterator[str]:
+        """Itère sur les textes de la partition, dans l'ordre du fichier."""
+        if self.num_shards > 1:
+            yield from self._iter_shard_texts()
+            return
+
+        self.position = 0
+        for record in iter_dataset_records(self.dataset_path):
+            self.position += 1
+            if self.position <= self.skip_examples:
+                continue
+            if is_holdout_example(self.position, self.holdout_stride) != (self.split == "validation"):
+                continue
+            text = record_to_text(record, self.tokenizer)
+            if text:
+                yield text
+
+    def _iter_shard_texts(self) -> Iterator[str]:
+        # Les groupes sont comptés depuis le début du fichier (sauts compris) pour rester alignés entre processus
+        self.position = 0
+        group_index = -1
+        own_text = None
+        for record in iter_dataset_records(self.dataset_path):
+            self.position += 1
+            if is_holdout_example(self.position, self.holdout_stride) != (self.split == "validation"):
+                continue
+            text = record_to_text(record, self.tokenizer)
+            if not text:
+                continue
+            group_index += 1
+            if group_index % self.num_shards == self.shard_index:
+                own_text = text
+            if group_index % self.num_shards == self.num_shards - 1:
+                # Fin de groupe: la position est identique pour tous les processus
+                if self.position > self.skip_examples:
+                    yield own_text
+                own_text = None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        texts = []
+        for text in self.iter_texts():
+            texts.append(text)
+            if len(texts) == self.batch_size:
+                yield self._collate(texts)
+                texts = []
+        if texts:
+            yield self._collate(texts)
+
+
+def _find_lora_target_modules(model) -> Optional[List[str]]:
+    """Retourne les modules LoRA par défaut présents dans le modèle, ou None (choix de PEFT)."""
+    leaf_names = {name.split(".")[-1] for name, _ in model.named_modules()}
+    targets = [name for name in DEFAULT_LORA_TARGET_MODULES if name in leaf_names]
+    return targets or None
+
+
+def load_model_for_training(config: Dict[str, Any]) -> Tuple[Any, Any, str]:
+    """
+    Charge le modèle de base et lui ajoute les adaptateurs LoRA.
+
+    Unsloth est utilisé s'il est installé; sinon transformers + PEFT, ce qui permet
+    d'entraîner de petits modèles sur CPU.
+
+    Args:
+        config: Configuration du fine-tuning (FineTuningConfig.dict())
+
+    Returns:
+        Tuple[Any, Any, str]: Modèle, tokenizer et moteur utilisé ("unsloth" ou "transformers")
+    """
+    import torch
+
+    try:
+        from unsloth import FastLanguageModel
+
+        model, tokenizer = FastLanguageModel.from_pretrained(
+            model_name=config["model_name"],
+            max_seq_length=config["max_seq_length"],
+            dtype=torch.bfloat16,
+            load_in_4bit=config["load_in_4bit"],
+        )
+        model = FastLanguageModel.get_peft_model(
+            model,
+            r=config["lora_r"],
+            target_modules=DEFAULT_LORA_TARGET_MODULES,
+            lora_alpha=config["lora_alpha"],
+            lora_dropout=config["lora_dropout"],
+            bias="none",
+        )
+        backend = "unsloth"
+    except ImportError:
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        from peft import LoraConfig, get_peft_model
+
+        logger.info("Unsloth n'est pas installé, utilisation de transformers + PEFT")
+        load_kwargs = {}
+        if torch.cuda.is_available():
+            load_kwargs["torch_dtype"] = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+            load_kwargs["device_map"] = {"": 0}
+            if config["load_in_4bit"]:
+                from transformers import BitsAndBytesConfig
+                load_kwargs["quantization_config"] = BitsAndBytesConfig(
+                    load_in_4bit=True,
+                    bnb_4bit_compute_dtype=load_kwargs["torch_dtype"]
+                )
+        else:
+            load_kwargs["torch_dtype"] = torch.float32
+            if config["load_in_4bit"]:
+                logger.warning("Chargement 4 bits indisponible sur CPU, chargement en float32")
+
+        model = AutoModelForCausalLM.from_pretrained(config["model_name"], **load_kwargs)
+        tokenizer = AutoTokenizer.from_pretrained(config["model_name"])
+
+        parameter_count = sum(p.numel() for p in model.parameters())
+        if not torch.cuda.is_available() and parameter_count > CPU_PARAMETER_WARNING_THRESHOLD:
+            logger.warning(f"Entraînement sur CPU d'un modèle de {parameter_count / 1e9:.1f}B paramètres: ce sera très lent")
+
+        lora_config = LoraConfig(
+            r=config["lora_r"],
+            lora_alpha=config["lora_alpha"],
+            lora_dropout=config["lora_dropout"],
+            target_modules=_find_lora_target_modules(model),
+            bias="none",
+            task_type="CAUSAL_LM",
+        )
+        model = get_peft_model(model, lora_config)
+        backend = "transformers"
+
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "right"
+
+    return model, tokenizer, backend
+
+
+def _probe_memory(device) -> Tuple[int, int]:
+    """Pic mémoire mesurable et mémoire totale du périphérique (octets)."""
+    if device.type == "cuda":
+        import torch
+        return torch.cuda.max_memory_allocated(device), torch.cuda.get_device_properties(device).total_memory
+    import psutil
+    return psutil.Process().memory_info().rss, psutil.virtual_memory().total
+
+
+def _is_out_of_memory(error: Exception) -> bool:
+    return isinstance(error, MemoryError) or "out of memory" in str(error).lower()
+
+
+def tune_batch_size(
+    model,
+    tokenizer,
+    config: Dict[str, Any],
+    effective_batch_size: int,
+    max_batch_size: int = 64,
+    safety_margin: float = 0.1,
+    probe_steps: int = 2
+) -> Dict[str, Any]:
+    """
+    Choisit le micro-batch et l'accumulation de gradients par une courte sonde.
+
+    Des forward/backward sont exécutés sur des séquences de longueur max_seq_length
+    (pire cas) avec des micro-batchs croissants (1, 2, 4...). Le plus grand micro-batch
+    dont le pic mémoire reste sous (1 - safety_margin) de la mémoire du périphérique est
+    retenu, puis l'accumulation est déduite pour atteindre le batch effectif demandé.
+    Les gradients de la sonde sont effacés: les poids ne sont pas modifiés.
+
+    Args:
+        model: Modèle avec adaptateurs LoRA
+        tokenizer: Tokenizer du modèle
+        config: Configuration du fine-tuning (dataset_path, max_seq_length)
+        effective_batch_size: Nombre d'exemples par pas d'optimisation visé
+        max_batch_size: Micro-batch maximal sondé
+        safety_margin: Fraction de la mémoire du périphérique gardée en réserve
+        probe_steps: Nombre de forward/backward par taille sondée
+
+    Returns:
+        Dict[str, Any]: Micro-batch et accumulation retenus, batch effectif obtenu et mesures de la sonde
+    """
+    import torch
+
+    device = next(p.device for p in model.parameters())
+    sample = next(
+        (text for text in (record_to_text(r, tokenizer) for r in iter_dataset_records(config["dataset_path"])) if text),
+        None
+    )
+    if sample is None:
+        raise ValueError("Le jeu de données ne contient aucun exemple")
+
+    limit = max(1, min(max_batch_size, effective_batch_size))
+    probes = []
+    best = None
+    batch_size = 1
+    model.train()
+
+    while batch_size <= limit:
+        batch = tokenizer(
+            [sample] * batch_size,
+            max_length=config["max_seq_length"],
+            truncation=True,
+            padding="max_length",
+            return_tensors="pt"
+        )
+        batch["labels"] = batch["input_ids"].clone()
+        batch = {key: value.to(device) for key, value in batch.items()}
+
+        probe = {"batch_size": batch_size}
+        try:
+            if device.type == "cuda":
+                torch.cuda.empty_cache()
+                torch.cuda.reset_peak_memory_stats(device)
+            start = time.perf_counter()
+            for _ in range(probe_steps):
+                model(**batch).loss.backward()
+            if device.type == "cuda":
+                torch.cuda.synchronize(device)
+            elapsed = time.perf_counter() - start
+            peak, total = _probe_memory(device)
+            probe.update({
+                "fits": peak <= total * (1 - safety_margin),
+                "peak_memory": peak,
+                "tokens_per_sec": batch_size * config["max_seq_length"] * probe_steps / elapsed if elapsed > 0 else 0.0
+            })
+        except Exception as e:
+            if not _is_out_of_memory(e):
+                raise
+            probe.update({"fits": False, "error": "out of memory"})
+        finally:
+            model.zero_grad(set_to_none=True)
+            del batch
+            if device.type == "cuda":
+                torch.cuda.empty_cache()
+
+        probes.append(probe)
+        logger.info(f"Sonde micro-batch {batch_size}: {'OK' if probe['fits'] else 'trop grand'}")
+        if not probe["fits"]:
+            break
+        best = probe
+        batch_size *= 2
+
+    if best is None:
+        raise Exception(
+            f"Aucun micro-batch ne tient en mémoire avec une marge de {safety_margin:.0%} "
+            f"(max_seq_length={config['max_seq_length']})"
+        )
+
+    # Accumulation minimale pour le batch effectif, puis micro-batch réparti au plus juste
+    accumulation = math.ceil(effective_batch_size / best["batch_size"])
+    micro_batch_size = math.ceil(effective_batch_size / accumulation)
+    return {
+        "batch_size": micro_batch_size,
+        "gradient_accumulation": accumulation,
+        "requested_effective_batch_size": effective_batch_size,
+        "effective_batch_size": micro_batch_size * accumulation,
+        "largest_fitting_batch_size": best["batch_size"],
+        "tokens_per_sec": best["tokens_per_sec"],
+        "safety_margin": safety_margin,
+        "probes": probes
+    }
+
+
+class FineTuningTrainer:
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        config: Dict[str, Any],
+        on_step: Optional[Callable[[Dict[str, Any]], None]] = None,
+        on_evaluate: Optional[Callable[[Dict[str, Any]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        max_grad_norm: float = 1.0,
+        checkpoint_manager=None,
+        profiler=None,
+        adapter_name: Optional[str] = None,
+        rank: int = 0,
+        world_size: int = 1
+    ):
+        """
+        Initialise la boucle d'entraînement LoRA.
+
+        Args:
+            model: Modèle avec adaptateurs LoRA
+            tokenizer: Tokenizer du modèle
+            config: Configuration du fine-tuning (FineTuningConfig.dict())
+            on_step: Fonction appelée avec les métriques après chaque pas d'optimisation
+            on_evaluate: Fonction appelée avec le résultat de chaque évaluation de validation
+            should_stop: Fonction consultée après chaque pas; True interrompt l'entraînement
+            max_grad_norm: Norme maximale des gradients (écrêtage)
+            checkpoint_manager: CheckpointManager pour les sauvegardes périodiques et la reprise
+            profiler: TrainingProfiler pour mesurer les phases d'un pas sur N (optionnel)
+            adapter_name: Adaptateur entraîné lorsque plusieurs adaptateurs partagent le modèle de base
+            rank: Rang du processus en entraînement data-parallel (groupe torch.distributed initialisé)
+            world_size: Nombre total de processus (1: entraînement dans un seul processus)
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.config = config
+        self.on_step = on_step
+        self.on_evaluate = on_evaluate
+        self.should_stop = should_stop
+        self.max_grad_norm = max_grad_norm
+        self.checkpoint_manager = checkpoint_manager
+        self.profiler = profiler
+        self.adapter_name = adapter_name
+        self.rank = rank
+        self.world_size = max(1, world_size)
+        # Seul le processus principal écrit les checkpoints et publie les métriques
+        self.is_main = rank == 0
+        self.allreduce_time = 0.0
+        self.resumed_from: Optional[str] = None
+        self.eval_history: List[Dict[str, Any]] = []
+        self._validation_texts: Optional[List[str]] = None
+        # Arrêt précoce: meilleure perte de validation et nombre d'évaluations sans amélioration
+        self.best_val_loss: Optional[float] = None
+        self.best_step: Optional[int] = None
+        self.evals_without_improvement = 0
+        self.stop_reason: Optional[str] = None
+        self._best_adapter_state: Optional[Dict[str, Any]] = None
+        self.device = next(p.device for p in model.parameters())
+
+    def _phase(self, name: str):
+        """Contexte de mesure d'une phase du pas en cours (sans effet sans profileur)."""
+        return self.profiler.phase(name) if self.profiler is not None else nullcontext()
+
+    def _start_step(self) -> Dict[str, Any]:
+        """Accumulateurs du prochain pas d'optimisation."""
+        if self.profiler is not None:
+            self.profiler.start_step(self.step + 1)
+        return {"loss": 0.0, "tokens": 0, "micro": 0, "start": time.perf_counter()}
+
+    def _end_step(self, tokens: int):
+        if self.profiler is not None:
+            self.profiler.end_step(tokens)
+
+    def _trainable_parameters(self) -> List[Tuple[str, Any]]:
+        """
+        Paramètres entraînés par ce trainer.
+
+        Avec plusieurs adaptateurs, seuls ceux de adapter_name sont retenus (quel que soit
+        l'adaptateur actif au moment de l'appel); sinon, tous les paramètres entraînables.
+        """
+        if self.adapter_name is not None:
+            marker = f".{self.adapter_name}."
+            return [(name, param) for name, param in self.model.named_parameters() if marker in name]
+        return [(name, param) for name, param in self.model.named_parameters() if param.requires_grad]
+
+    def _build_optimizer(self):
+        """AdamW avec décroissance des poids, sauf sur les biais et les normalisations."""
+        import torch
+
+        decay, no_decay = [], []
+        for name, param in self._trainable_parameters():
+            if param.ndim < 2 or "bias" in name or "norm" in name.lower():
+                no_decay.append(param)
+            else:
+                decay.append(param)
+
+        return torch.optim.AdamW(
+            [
+                {"params": decay, "weight_decay": self.config["weight_decay"]},
+                {"params": no_decay, "weight_decay": 0.0},
+            ],
+            lr=self.config["learning_rate"]
+        )
+
+    def _build_scheduler(self, optimizer, total_steps: int):
+        """Préchauffage linéaire sur warmup_steps, puis décroissance linéaire jusqu'à 0."""
+        import torch
+
+        warmup_steps = min(self.config["warmup_steps"], total_steps)
+
+        def lr_lambda(step: int) -> float:
+            if step < warmup_steps:
+                return (step + 1) / (warmup_steps + 1)
+            return max(0.0, (total_steps - step) / max(1, total_steps - warmup_steps))
+
+        return torch.optim.lr_scheduler.LambdaLR(optimizer, lr_lambda)
+
+    @property
+    def holdout_stride(self) -> int:
+        """Pas de la partition de validation extraite du jeu d'entraînement (0 si validation_path est fourni)."""
+        split = self.config.get("validation_split") or 0.0
+        if self.config.get("validation_path") or split <= 0:
+            return 0
+        return max(2, round(1 / split))
+
+    @property
+    def has_validation(self) -> bool:
+        return bool(self.config.get("validation_path")) or self.holdout_stride > 0
+
+    def _make_batches(self, skip_examples: int = 0) -> StreamingBatchIterator:
+        return StreamingBatchIterator(
+            self.config["dataset_path"],
+            self.tokenizer,
+            self.config["batch_size"],
+            self.config["max_seq_length"],
+            skip_examples=skip_examples,
+            holdout_stride=self.holdout_stride,
+            shard_index=self.rank,
+            num_shards=self.world_size
+        )
+
+    def _all_reduce_gradients(self):
+        """Moyenne des gradients LoRA entre processus, en un seul all-reduce sur un tampon aplati."""
+        import torch
+        import torch.distributed as dist
+
+        params = [p for _, p in self._trainable_parameters() if p.grad is not None]
+        if not params:
+            return
+        start = time.perf_counter()
+        flat = torch.cat([p.grad.reshape(-1) for p in params])
+        dist.all_reduce(flat, op=dist.ReduceOp.SUM)
+        flat /= self.world_size
+        offset = 0
+        for p in params:
+            numel = p.grad.numel()
+            p.grad.copy_(flat[offset:offset + numel].view_as(p.grad))
+            offset += numel
+        self.allreduce_time += time.perf_counter() - start
+
+    def _all_reduce_values(self, values: List[float], op: str = "sum") -> List[float]:
+        """Réduit quelques scalaires entre processus (pertes, tokens, décision d'arrêt)."""
+        import torch
+        import torch.distributed as dist
+
+        tensor = torch.tensor(values, dtype=torch.float64)
+        dist.all_reduce(tensor, op=dist.ReduceOp.MAX if op == "max" else dist.ReduceOp.SUM)
+        return tensor.tolist()
+
+    def _make_validation_batches(self) -> Iterator[Dict[str, Any]]:
+        """
+        Micro-batchs de validation triés par longueur.
+
+        Les textes de validation sont lus et triés une seule fois: regrouper des
+        séquences de longueurs voisines limite le padding, donc le coût de chaque évaluation.
+        """
+        if self.config.get("validation_path"):
+            source = StreamingBatchIterator(
+                self.config["validation_path"],
+                self.tokenizer,
+                self.config["batch_size"],
+                self.config["max_seq_length"]
+            )
+        else:
+            source = StreamingBatchIterator(
+                self.config["dataset_path"],
+                self.tokenizer,
+                self.config["batch_size"],
+                self.config["max_seq_length"],
+                holdout_stride=self.holdout_stride,
+                split="validation"
+            )
+
+        if self._validation_texts is None:
+            texts = list(source.iter_texts())
+            lengths = [
+                len(ids) for ids in self.tokenizer(
+                    texts, max_length=self.config["max_seq_length"], truncation=True
+                )["input_ids"]
+            ] if texts else []
+            # Les plus longues d'abord: un manque de mémoire apparaît dès le premier batch
+            self._validation_texts = [text for _, text in sorted(zip(lengths, texts), key=lambda item: -item[0])]
+
+        eval_batch_size = self.config.get("eval_batch_size") or self.config["batch_size"]
+        for start in range(0, len(self._validation_texts), eval_batch_size):
+            yield source._collate(self._validation_texts[start:start + eval_batch_size])
+
+    def evaluate(self) -> Dict[str, Any]:
+        """
+        Calcule la perte de validation, pondérée par le nombre de tokens prédits.
+
+        Returns:
+            Dict[str, Any]: {"val_loss", "val_perplexity", "val_tokens", "step"}
+        """
+        import torch
+        import torch.nn.functional as F
+
+        was_training = self.model.training
+        self.model.eval()
+        total_loss = 0.0
+        total_tokens = 0
+        try:
+            with torch.no_grad():
+                for batch in self._make_validation_batches():
+                    batch = {key: value.to(self.device) for key, value in batch.items()}
+                    labels = batch.pop("labels")
+                    logits = self.model(**batch).logits[:, :-1, :]
+                    targets = labels[:, 1:]
+                    total_loss += F.cross_entropy(
+                        logits.reshape(-1, logits.size(-1)).float(),
+                        targets.reshape(-1),
+                        ignore_index=-100,
+                        reduction="sum"
+                    ).item()
+                    total_tokens += int((targets != -100).sum().item())
+        finally:
+            if was_training:
+                self.model.train()
+
+        val_loss = total_loss / total_tokens if total_tokens > 0 else float("nan")
+        result = {
+            "step": self.step,
+            "val_loss": val_loss,
+            "val_perplexity": math.exp(val_loss) if total_tokens > 0 else float("nan"),
+            "val_tokens": total_tokens
+        }
+        self.eval_history.append(result)
+        if self.on_evaluate is not None:
+            self.on_evaluate(result)
+        return result
+
+    def _scale_gradients(self, factor: float):
+        """Multiplie les gradients accumulés des paramètres entraînés."""
+        import torch
+
+        with torch.no_grad():
+            for _, parameter in self._trainable_parameters():
+                if parameter.grad is not None:
+                    parameter.grad.mul_(factor)
+
+    def _optimizer_step(self, optimizer, scheduler, pending: Dict[str, Any], epoch: int, total_steps: int) -> bool:
+        """
+        Applique les gradients accumulés et publie les métriques du pas.
+
+        Returns:
+            bool: True si l'entraînement doit s'arrêter
+        """
+        import torch
+
+        with self._phase("optimizer"):
+            if self.world_size > 1:
+                self._all_reduce_gradients()
+            if self.max_grad_norm:
+                torch.nn.utils.clip_grad_norm_(
+                    [p for _, p in self._trainable_parameters()], self.max_grad_norm
+                )
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad(set_to_none=True)
+
+        self.step += 1
+        if self.world_size > 1:
+            # Perte moyenne et tokens de l'ensemble des processus
+            loss_sum, tokens = self._all_reduce_values([pending["loss"] / pending["micro"], pending["tokens"]])
+            pending = dict(pending, loss=loss_sum / self.world_size * pending["micro"], tokens=int(tokens))
+        step_latency = time.perf_counter() - pending["start"]
+        self.total_tokens += pending["tokens"]
+        self.total_time += step_latency
+
+        self.metrics = {
+            "loss": pending["loss"] / pending["micro"],
+            "step": self.step,
+            "total_steps": total_steps,
+            "epoch": epoch + 1,
+            "learning_rate": scheduler.get_last_lr()[0],
+            "tokens_per_sec": pending["tokens"] / step_latency if step_latency > 0 else 0.0,
+            "step_latency": step_latency,
+            "tokens": pending["tokens"]
+        }
+
+        stop = False
+        eval_steps = self.config.get("eval_steps") or 0
+        if self.has_validation and eval_steps > 0 and self.step % eval_steps == 0:
+            with self._phase("evaluation"):
+                evaluation = self.evaluate()
+            self.metrics["val_loss"] = evaluation["val_loss"]
+            self.metrics["val_perplexity"] = evaluation["val_perplexity"]
+            stop = self._check_early_stopping(evaluation)
+
+        if self.on_step is not None:
+            self.on_step(self.metrics)
+
+        if not stop and self.should_stop is not None and self.should_stop():
+            self.stop_reason = "requested"
+            stop = True
+        if self.world_size > 1:
+            # Une demande d'arrêt reçue par le processus principal arrête tous les processus au même pas
+            stop_requested = self._all_reduce_values([float(self.stop_reason == "requested")], op="max")[0] > 0
+            if stop_requested and not stop:
+                self.stop_reason = "requested"
+                stop = True
+        return stop
+
+    def _check_early_stopping(self, evaluation: Dict[str, Any]) -> bool:
+        """
+        Met à jour le meilleur adaptateur et décide de l'arrêt précoce.
+
+        Une évaluation améliore le meilleur résultat si la perte baisse d'au moins
+        early_stopping_min_delta; après early_stopping_patience évaluations sans
+        amélioration, l'entraînement s'arrête.
+
+        Returns:
+            bool: True si l'entraînement doit s'arrêter
+        """
+        val_loss = evaluation["val_loss"]
+        if math.isnan(val_loss):
+            return False
+
+        min_delta = self.config.get("early_stopping_min_delta") or 0.0
+        if self.best_val_loss is None or val_loss < self.best_val_loss - min_delta:
+            self.best_val_loss = val_loss
+            self.best_step = self.step
+            self.evals_without_improvement = 0
+            self._save_best()
+        else:
+            self.evals_without_improvement += 1
+
+        self.metrics["best_val_loss"] = self.best_val_loss
+        self.metrics["best_step"] = self.best_step
+
+        patience = self.config.get("early_stopping_patience") or 0
+        if patience > 0 and self.evals_without_improvement >= patience:
+            self.stop_reason = "early_stopping"
+            logger.info(
+                f"Arrêt précoce au pas {self.step}: pas d'amélioration depuis {self.evals_without_improvement} "
+                f"évaluation(s) (meilleure perte {self.best_val_loss:.4f} au pas {self.best_step})"
+            )
+            return True
+        return False
+
+    def _save_best(self):
+        """Conserve une copie du meilleur adaptateur (en mémoire et, si possible, sur disque)."""
+        from peft import get_peft_model_state_dict
+
+        if not self.config.get("early_stopping_patience"):
+            return
+        self._best_adapter_state = {
+            key: value.detach().to("cpu", copy=True)
+            for key, value in get_peft_model_state_dict(self.model, adapter_name=self.adapter_name or "default").items()
+        }
+        if self.checkpoint_manager is not None and self.is_main:
+            self.checkpoint_manager.save_best(self.model, {
+                "step": self.best_step,
+                "val_loss": self.best_val_loss
+            })
+
+    def _restore_best(self):
+        """Recharge le meilleur adaptateur dans le modèle avant la sauvegarde finale."""
+        from peft import set_peft_model_state_dict
+
+        if self._best_adapter_state is None or self.best_step == self.step:
+            return
+        set_peft_model_state_dict(self.model, {
+            key: value.to(self.device) for key, value in self._best_adapter_state.items()
+        }, adapter_name=self.adapter_name or "default")
+        logger.info(f"Meilleur adaptateur restauré (pas {self.best_step}, perte {self.best_val_loss:.4f})")
+
+    def _maybe_checkpoint(self, optimizer, scheduler, epoch: int, examples_in_epoch: int):
+        """Sauvegarde un checkpoint tous les checkpoint_steps pas d'optimisation."""
+        every = self.config.get("checkpoint_steps") or 0
+        if self.checkpoint_manager is None or not self.is_main or every <= 0 or self.step % every != 0:
+            return
+
+        # Seule la copie CPU de l'instantané bloque l'entraînement: l'écriture est asynchrone
+        with self._phase("checkpoint"):
+            self.checkpoint_manager.save_async(self.model, optimizer, scheduler, {
+                "step": self.step,
+                "epoch": epoch,
+                "examples_in_epoch": examples_in_epoch,
+                "total_tokens": self.total_tokens,
+                "total_time": self.total_time,
+                "metrics": self.metrics,
+                "eval_history": self.eval_history,
+                "early_stopping": {
+                    "best_val_loss": self.best_val_loss,
+                    "best_step": self.best_step,
+                    "evals_without_improvement": self.evals_without_improvement
+                }
+            })
+
+    def _resume(self, optimizer, scheduler) -> Tuple[int, int]:
+        """
+        Restaure le checkpoint valide le plus récent s'il existe.
+
+        Returns:
+            Tuple[int, int]: Époque de reprise et nombre d'exemples déjà consommés dans cette époque
+        """
+        if self.checkpoint_manager is None or not self.config.get("resume_from_checkpoint", True):
+            return 0, 0
+
+        latest = self.checkpoint_manager.latest()
+        if latest is None:
+            return 0, 0
+
+        state = self.checkpoint_manager.load(latest, self.model, optimizer, scheduler)
+        self.step = state["step"]
+        self.total_tokens = state["total_tokens"]
+        self.total_time = state["total_time"]
+        self.metrics = state.get("metrics") or {}
+        self.eval_history = state.get("eval_history") or []
+        early_stopping = state.get("early_stopping") or {}
+        self.best_val_loss = early_stopping.get("best_val_loss")
+        self.best_step = early_stopping.get("best_step")
+        self.evals_without_improvement = early_stopping.get("evals_without_improvement", 0)
+        best = self.checkpoint_manager.load_best() if self.best_step is not None else None
+        if best is not None:
+            self._best_adapter_state = best
+        self.resumed_from = latest
+        return state["epoch"], state["examples_in_epoch"]
+
+    def train(self) -> Dict[str, Any]:
+        """
+        Exécute l'entraînement sur toutes les époques.
+
+        Returns:
+            Dict[str, Any]: Métriques finales (dernier pas, perte, débit moyen)
+        """
+        for _ in self.run_steps():
+            pass
+        return self.final_metrics
+
+    def run_steps(self) -> Iterator[Dict[str, Any]]:
+        """
+        Exécute l'entraînement pas à pas: rend la main après chaque pas d'optimisation.
+
+        Permet d'entrelacer plusieurs trainers sur un même modèle de base; les métriques
+        finales sont disponibles dans final_metrics une fois l'itération terminée.
+
+        Yields:
+            Dict[str, Any]: Métriques du pas d'optimisation qui vient de se terminer
+        """
+        try:
+            yield from self._run_steps()
+        finally:
+            # La trace est écrite même si l'entraînement échoue ou est interrompu
+            if self.profiler is not None:
+                try:
+                    self.profiler.close()
+                except Exception as e:
+                    logger.warning(f"Écriture de la trace de profilage impossible: {str(e)}")
+
+    def _run_steps(self) -> Iterator[Dict[str, Any]]:
+        num_examples = count_dataset_records(self.config["dataset_path"], self.holdout_stride) // self.world_size
+        if num_examples == 0:
+            raise ValueError("Le jeu de données ne contient aucun exemple")
+
+        accumulation = max(1, self.config["gradient_accumulation"])
+        micro_batches_per_epoch = math.ceil(num_examples / self.config["batch_size"])
+        steps_per_epoch = math.ceil(micro_batches_per_epoch / accumulation)
+        total_steps = steps_per_epoch * self.config["epochs"]
+
+        optimizer = self._build_optimizer()
+        scheduler = self._build_scheduler(optimizer, total_steps)
+
+        logger.info(
+            f"Entraînement: {num_examples} exemples, {self.config['epochs']} époque(s), "
+            f"{total_steps} pas (micro-batch {self.config['batch_size']}, accumulation {accumulation})"
+        )
+
+        self.step = 0
+        self.total_tokens = 0
+        self.total_time = 0.0
+        self.metrics: Dict[str, Any] = {}
+        start_epoch, skip_examples = self._resume(optimizer, scheduler)
+
+        self.model.train()
+        optimizer.zero_grad(set_to_none=True)
+        stopped = False
+
+        for epoch in range(start_epoch, self.config["epochs"]):
+            pending = self._start_step()
+            # Position du chargeur de données restaurée pour l'époque reprise
+            batches = self._make_batches(skip_examples if epoch == start_epoch else 0)
+
+            wait_start = time.perf_counter()
+            for batch in batches:
+                if self.profiler is not None:
+                    self.profiler.record("data_wait", wait_start, time.perf_counter())
+
+                with self._phase("forward"):
+                    batch = {key: value.to(self.device) for key, value in batch.items()}
+                    outputs = self.model(**batch)
+                with self._phase("backward"):
+                    (outputs.loss / accumulation).backward()
+
+                pending["loss"] += outputs.loss.item()
+                pending["tokens"] += int(batch["attention_mask"].sum().item())
+                pending["micro"] += 1
+
+                if pending["micro"] == accumulation:
+                    stopped = self._optimizer_step(optimizer, scheduler, pending, epoch, total_steps)
+                    self._maybe_checkpoint(optimizer, scheduler, epoch, batches.position)
+                    self._end_step(pending["tokens"])
+                    yield self.metrics
+                    if stopped:
+                        break
+                    pending = self._start_step()
+                wait_start = time.perf_counter()
+
+            # Micro-batchs restants en fin d'époque
+            if not stopped and pending["micro"] > 0:
+                if pending["micro"] < accumulation:
+                    # Les pertes ont été divisées par accumulation: ramener le gradient à la moyenne
+                    # des micro-batchs du groupe incomplet, comme pour un groupe complet
+                    self._scale_gradients(accumulation / pending["micro"])
+                stopped = self._optimizer_step(optimizer, scheduler, pending, epoch, total_steps)
+                self._maybe_checkpoint(optimizer, scheduler, epoch, batches.position)
+                self._end_step(pending["tokens"])
+                yield self.metrics
+
+            if stopped:
+                logger.info(f"Entraînement interrompu au pas {self.step}")
+                break
+
+        if self.checkpoint_manager is not None:
+            self.checkpoint_manager.wait()
+
+        # Évaluation finale si le dernier pas n'a pas déjà été évalué
+        if self.has_validation and (not self.eval_history or self.eval_history[-1]["step"] != self.step):
+            evaluation = self.evaluate()
+            self.metrics["val_loss"] = evaluation["val_loss"]
+            self.metrics["val_perplexity"] = evaluation["val_perplexity"]
+            self._check_early_stopping(evaluation)
+
+        # L'adaptateur final est le meilleur sur la validation, pas le dernier
+        self._restore_best()
+        if self.checkpoint_manager is not None:
+            self.checkpoint_manager.wait()
+
+        metrics = dict(self.metrics)
+        metrics["average_tokens_per_sec"] = self.total_tokens / self.total_time if self.total_time > 0 else 0.0
+        metrics["stopped_early"] = stopped
+        metrics["stop_reason"] = self.stop_reason
+        if self.world_size > 1:
+            metrics["allreduce_seconds"] = self.allreduce_time
+            metrics["allreduce_share"] = self.allreduce_time / self.total_time if self.total_time > 0 else 0.0
+        self.final_metrics = metrics
+
+
+def save_adapter(model, tokenizer, output_dir: str, adapter_name: Optional[str] = None):
+    """
+    Sauvegarde l'adaptateur LoRA et le tokenizer.
+
+    Le répertoire est chargeable par AutoModelForCausalLM.from_pretrained lorsque PEFT est installé.
+
+    Args:
+        model: Modèle avec adaptateurs LoRA
+        tokenizer: Tokenizer du modèle
+        output_dir: Répertoire de sortie
+        adapter_name: Adaptateur à sauvegarder lorsque le modèle en porte plusieurs
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if adapter_name is None:
+        model.save_pretrained(output_dir)
+    elif adapter_name == "default":
+        model.save_pretrained(output_dir, selected_adapters=[adapter_name])
+    else:
+        # save_pretrained range les adaptateurs nommés dans un sous-répertoire: écrire
+        # directement à la racine pour obtenir la même disposition qu'un job seul
+        from peft import get_peft_model_state_dict
+        from safetensors.torch import save_file
+
+        state = get_peft_model_state_dict(model, adapter_name=adapter_name)
+        save_file({key: value.contiguous() for key, value in state.items()}, os.path.join(output_dir, "adapter_model.safetensors"))
+        model.peft_config[adapter_name].save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    logger.info(f"Adaptateur sauvegardé dans {output_dir}")
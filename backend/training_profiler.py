@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("training_profiler.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("training-profiler")
+
+# Phases d'un pas d'optimisation, dans l'ordre d'exécution
+PHASES = ("data_wait", "forward", "backward", "optimizer", "evaluation", "checkpoint")
+
+# Nombre de pas profilés détaillés conservés dans le résumé
+RECENT_STEPS = 20
+
+# Intervalle (en secondes) d'échantillonnage de la RSS pendant un pas profilé sur CPU
+RSS_SAMPLE_INTERVAL = 0.01
+
+# La trace est réécrite tous les TRACE_FLUSH_STEPS pas profilés (une trace partielle survit à un crash)
+TRACE_FLUSH_STEPS = 10
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class TrainingProfiler:
+    def __init__(self, every_n_steps: int = 10, trace_path: Optional[str] = None, device: str = "cpu"):
+        """
+        Profileur opt-in de la boucle de fine-tuning.
+
+        Un pas d'optimisation sur every_n_steps est profilé: durée de chaque phase
+        (attente des données, forward, backward, optimiseur, évaluation, checkpoint),
+        mémoire après chaque phase et pic mémoire du pas (pic de torch réinitialisé au
+        début du pas sur GPU, RSS échantillonnée pendant le pas sur CPU). Sur GPU, les noyaux sont synchronisés aux
+        frontières de phase uniquement pendant les pas profilés, pour que les durées
+        mesurées correspondent au calcul réel sans ralentir les autres pas.
+
+        Args:
+            every_n_steps: Fréquence d'échantillonnage des pas
+            trace_path: Fichier de trace au format Chrome (chrome://tracing, Perfetto)
+            device: "gpu" ou "cpu"
+        """
+        self.every_n_steps = max(1, every_n_steps)
+        self.trace_path = trace_path
+        self.device = device
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._current: Optional[Dict[str, Any]] = None
+        self._steps: List[Dict[str, Any]] = []
+        self._events: List[Dict[str, Any]] = []
+        self._rss_peak = 0
+        self._rss_stop: Optional[threading.Event] = None
+        self._rss_thread: Optional[threading.Thread] = None
+
+    def _synchronize(self):
+        if self.device == "gpu":
+            import torch
+            torch.cuda.synchronize()
+
+    def _memory(self) -> Dict[str, int]:
+        """Mémoire courante et pic depuis le début du pas profilé."""
+        try:
+            if self.device == "gpu":
+                import torch
+                return {"allocated": torch.cuda.memory_allocated(), "peak": torch.cuda.max_memory_allocated()}
+            import psutil
+            rss = psutil.Process().memory_info().rss
+            self._rss_peak = max(self._rss_peak, rss)
+            return {"allocated": rss, "peak": self._rss_peak}
+        except Exception:
+            return {"allocated": 0, "peak": 0}
+
+    def _sample_rss(self, stop: threading.Event):
+        import psutil
+
+        process = psutil.Process()
+        while not stop.wait(RSS_SAMPLE_INTERVAL):
+            self._rss_peak = max(self._rss_peak, process.memory_info().rss)
+
+    def _start_memory_peak(self):
+        """Démarre la mesure du pic mémoire du pas."""
+        try:
+            if self.device == "gpu":
+                from resource_estimator import reset_gpu_peak
+                reset_gpu_peak()
+                return
+            import psutil
+            self._rss_peak = psutil.Process().memory_info().rss
+        except Exception as e:
+            logger.warning(f"Pic mémoire du pas indisponible: {str(e)}")
+            return
+        self._rss_stop = threading.Event()
+        self._rss_thread = threading.Thread(target=self._sample_rss, args=(self._rss_stop,), daemon=True)
+        self._rss_thread.start()
+
+    def _stop_memory_peak(self) -> int:
+        """Arrête la mesure du pic mémoire du pas et le retourne."""
+        if self._rss_thread is not None:
+            self._rss_stop.set()
+            self._rss_thread.join()
+            self._rss_thread = None
+        return self._memory()["peak"]
+
+    @property
+    def active(self) -> bool:
+        """Indique si le pas en cours est profilé."""
+        return self._current is not None
+
+    def start_step(self, step: int):
+        """
+        Commence un pas d'optimisation; il n'est profilé que s'il tombe sur la fréquence d'échantillonnage.
+
+        Args:
+            step: Numéro (à partir de 1) du pas d'optimisation qui commence
+        """
+        if step % self.every_n_steps != 0 and step != 1:
+            self._current = None
+            return
+        self._synchronize()
+        self._start_memory_peak()
+        self._current = {
+            "step": step,
+            "start": time.perf_counter(),
+            "phases": {phase: 0.0 for phase in PHASES},
+            "micro_batches": 0,
+            "memory_peak": 0
+        }
+
+    def record(self, phase: str, start: float, end: float):
+        """Ajoute une durée mesurée hors du gestionnaire de contexte (ex: attente du chargeur de données)."""
+        if self._current is None:
+            return
+        self._current["phases"][phase] += end - start
+        self._events.append({
+            "name": phase,
+            "ph": "X",
+            "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": 0,
+            "args": {"step": self._current["step"]}
+        })
+
+    @contextmanager
+    def phase(self, name: str):
+        """Mesure une phase du pas en cours (sans effet si le pas n'est pas profilé)."""
+        if self._current is None:
+            yield
+            return
+        self._synchronize()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._synchronize()
+            self.record(name, start, time.perf_counter())
+            if name == "forward":
+                self._current["micro_batches"] += 1
+            memory = self._memory()
+            self._current["memory_peak"] = max(self._current["memory_peak"], memory["peak"])
+            self._events.append({
+                "name": "memory",
+                "ph": "C",
+                "ts": (time.perf_counter() - self._origin) * 1e6,
+                "pid": os.getpid(),
+                "args": {"allocated_mb": memory["allocated"] / 1024 ** 2}
+            })
+
+    def end_step(self, tokens: int = 0):
+        """Termine le pas en cours et l'ajoute aux agrégats."""
+        if self._current is None:
+            return
+        step = self._current
+        self._current = None
+        step["duration"] = time.perf_counter() - step.pop("start")
+        step["tokens"] = tokens
+        step["memory_peak"] = max(step["memory_peak"], self._stop_memory_peak())
+        self._events.append({
+            "name": f"step {step['step']}",
+            "ph": "X",
+            "ts": (time.perf_counter() - step["duration"] - self._origin) * 1e6,
+            "dur": step["duration"] * 1e6,
+            "pid": os.getpid(),
+            "tid": 1,
+            "args": {"tokens": tokens, "micro_batches": step["micro_batches"]}
+        })
+        with self._lock:
+            self._steps.append(step)
+            flush = len(self._steps) % TRACE_FLUSH_STEPS == 0
+        if flush:
+            self.write_trace()
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Agrège les pas profilés.
+
+        Returns:
+            Dict[str, Any]: Statistiques par phase (total, moyenne, p50, max, part du temps de pas),
+            pic mémoire, phase dominante et détail des derniers pas profilés
+        """
+        with self._lock:
+            steps = list(self._steps)
+
+        if not steps:
+            return {"profiled_steps": 0, "every_n_steps": self.every_n_steps, "phases": {}}
+
+        total_duration = sum(s["duration"] for s in steps)
+        phases = {}
+        for phase in PHASES:
+            values = [s["phases"][phase] for s in steps]
+            if not any(values):
+                continue
+            phases[phase] = {
+                "total": sum(values),
+                "mean": sum(values) / len(values),
+                "p50": _percentile(values, 0.5),
+                "max": max(values),
+                "share": sum(values) / total_duration if total_duration > 0 else 0.0
+            }
+
+        durations = [s["duration"] for s in steps]
+        tokens = sum(s["tokens"] for s in steps)
+        return {
+            "profiled_steps": len(steps),
+            "every_n_steps": self.every_n_steps,
+            "device": self.device,
+            "step_time": {
+                "mean": total_duration / len(steps),
+                "p50": _percentile(durations, 0.5),
+                "max": max(durations)
+            },
+            "tokens_per_sec": tokens / total_duration if total_duration > 0 else 0.0,
+            "phases": phases,
+            "bottleneck": max(phases, key=lambda p: phases[p]["total"]) if phases else None,
+            "memory_peak": max(s["memory_peak"] for s in steps),
+            "recent_steps": [
+                {
+                    "step": s["step"],
+                    "duration": s["duration"],
+                    "micro_batches": s["micro_batches"],
+                    "memory_peak": s["memory_peak"],
+                    "phases": {p: v for p, v in s["phases"].items() if v}
+                }
+                for s in steps[-RECENT_STEPS:]
+            ],
+            "trace_path": self.trace_path
+        }
+
+    def write_trace(self) -> Optional[str]:
+        """
+        Écrit les événements des pas profilés au format Chrome trace (JSON).
+
+        Returns:
+            Optional[str]: Chemin du fichier écrit, ou None si aucun chemin n'est configuré
+        """
+        if not self.trace_path:
+            return None
+        os.makedirs(os.path.dirname(os.path.abspath(self.trace_path)), exist_ok=True)
+        tmp_path = f"{self.trace_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "traceEvents": [
+                    {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": 0, "args": {"name": "phases"}},
+                    {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": 1, "args": {"name": "steps"}}
+                ] + self._events,
+                "displayTimeUnit": "ms"
+            }, f)
+        os.replace(tmp_path, self.trace_path)
+        logger.info(f"Trace de profilage écrite dans {self.trace_path}")
+        return self.trace_path
+
+    def close(self) -> Optional[str]:
+        """Abandonne le pas en cours (entraînement interrompu) et écrit la trace."""
+        if self._current is not None:
+            self._current = None
+            self._stop_memory_peak()
+        return self.write_trace()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+import os
+import sys
+import uuid
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+from typing import Dict, Any, List, Optional
+
+from job_queue import JobQueue
+
+# Configuration du logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler("worker.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("worker")
+
+
+def detect_capabilities() -> List[str]:
+    """Détecte les capacités de la machine ("cpu", et "gpu" si un GPU est disponible)"""
+    from hardware_detection import get_gpu_info
+
+    capabilities = ["cpu"]
+    gpu_info = get_gpu_info()
+    if gpu_info["nvidia"]["available"] or gpu_info["amd"]["available"]:
+        capabilities.append("gpu")
+    return capabilities
+
+
+class Worker:
+    def __init__(
+        self,
+        queue: JobQueue,
+        capabilities: List[str],
+        worker_id: Optional[str] = None,
+        poll_interval: float = 2.0,
+        heartbeat_interval: Optional[float] = None
+    ):
+        """
+        Initialise un worker qui exécute les jobs de la file partagée.
+
+        Args:
+            queue: File de jobs partagée
+            capabilities: Capacités annoncées par le worker (ex: ["cpu"], ["cpu", "gpu"])
+            worker_id: Identifiant du worker (généré si absent)
+            poll_interval: Intervalle (en secondes) entre deux tentatives de location
+            heartbeat_interval: Intervalle des heartbeats (par défaut un tiers de la durée du bail)
+        """
+        self.queue = queue
+        self.capabilities = capabilities
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval or queue.lease_seconds / 3
+        self._stopping = threading.Event()
+
+    def stop(self, *_):
+        """Demande l'arrêt du worker après le job en cours"""
+        logger.info(f"Arrêt du worker {self.worker_id} demandé")
+        self._stopping.set()
+
+    def _prepare(self, job: Dict[str, Any]):
+        """Retourne la coroutine à exécuter et le dictionnaire de statut du job"""
+        # Import tardif: les fonctions run_* et leurs enregistrements vivent dans app.py
+        import app
+
+        job_id = job["job_id"]
+        payload = job["payload"]
+
+        if job["kind"] == "finetune":
+            app.jobs[job_id] = payload["record"]
+            config = app.FineTuningConfig(**payload["config"])
+            return app.run_finetune_job(job_id, config), app.jobs
+        if job["kind"] == "preprocess":
+            return app.run_preprocessing_task(job_id, **payload["kwargs"]), app.preprocessing_tasks
+        if job["kind"] == "export":
+            return app.run_export_task(job_id, **payload["kwargs"]), app.export_tasks
+        if job["kind"] == "evaluate":
+            return app.run_evaluation_task(job_id, **payload["kwargs"]), app.evaluation_tasks
+        if job["kind"] == "batch_inference":
+            return app.run_batch_inference_task(job_id, **payload["kwargs"]), app.batch_inference_tasks
+
+        raise ValueError(f"Type de job non pris en charge: {job['kind']}")
+
+    def _heartbeat_loop(self, job_id: str, store: Dict[str, Any], done: threading.Event, lease_lost: threading.Event):
+        """Prolonge le bail et publie la progression tant que le job s'exécute"""
+        while not done.wait(self.heartbeat_interval):
+            try:
+                if not self.queue.heartbeat(self.worker_id, job_id, store.get(job_id)):
+                    # Le job a été remis en file (et peut-être loué par un autre worker):
+                    # l'arrêter pour ne pas écrire dans les mêmes répertoires de sortie
+                    logger.warning(f"Bail du job {job_id} perdu par le worker {self.worker_id}, arrêt du job")
+                    lease_lost.set()
+                    if job_id in store:
+                        store[job_id]["stop_requested"] = True
+                        store[job_id]["stop_reason"] = "lease_lost"
+                    return
+                # Relayer au job les demandes d'arrêt reçues par l'API
+                if job_id in store and self.queue.is_stop_requested(job_id):
+                    store[job_id]["stop_requested"] = True
+            except Exception as e:
+                logger.warning(f"Échec du heartbeat pour le job {job_id}: {str(e)}")
+
+    def execute(self, job: Dict[str, Any]) -> bool:
+        """
+        Exécute un job loué et publie son résultat dans la file.
+
+        Args:
+            job: Job loué
+
+        Returns:
+            bool: True si le job s'est terminé avec succès
+        """
+        job_id = job["job_id"]
+        logger.info(f"Exécution du job {job_id} ({job['kind']}, tentative {job['attempts']})")
+        self.queue.update_worker(self.worker_id, "busy")
+
+        store: Dict[str, Any] = {}
+        done = threading.Event()
+        lease_lost = threading.Event()
+        heartbeat_thread = None
+        try:
+            coroutine, store = self._prepare(job)
+            heartbeat_thread = threading.Thread(
+                target=self._heartbeat_loop, args=(job_id, store, done, lease_lost), daemon=True
+            )
+            heartbeat_thread.start()
+
+            # Les fonctions run_* capturent leurs erreurs et les consignent dans l'enregistrement
+            asyncio.run(coroutine)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'exécution du job {job_id}: {str(e)}")
+            store.setdefault(job_id, {"task_id": job_id})
+            store[job_id]["status"] = "failed"
+            store[job_id]["error"] = str(e)
+        finally:
+            done.set()
+            if heartbeat_thread is not None:
+                heartbeat_thread.join()
+
+        record = store.get(job_id) or {}
+        if lease_lost.is_set():
+            # Le résultat appartient désormais au worker qui détient le bail
+            logger.warning(f"Résultat du job {job_id} ignoré: bail perdu par le worker {self.worker_id}")
+            success = False
+        elif record.get("status") == "completed":
+            self.queue.complete(job_id, self.worker_id, record)
+            success = True
+        else:
+            self.queue.fail(job_id, self.worker_id, record.get("error") or "Échec du job", record)
+            success = False
+
+        # Libérer la mémoire du processus entre deux jobs
+        store.pop(job_id, None)
+        self.queue.update_worker(self.worker_id, "idle")
+        return success
+
+    def run(self, once: bool = False):
+        """
+        Boucle principale: loue et exécute les jobs jusqu'à l'arrêt du worker.
+
+        Args:
+            once: Si True, s'arrête après le premier job exécuté (ou si la file est vide)
+        """
+        self.queue.register_worker(self.worker_id, self.capabilities)
+        logger.info(f"Worker {self.worker_id} démarré (capacités: {', '.join(self.capabilities)})")
+
+        try:
+            while not self._stopping.is_set():
+                job = self.queue.lease(self.worker_id, self.capabilities)
+                if job is None:
+                    if once:
+                        break
+                    self.queue.update_worker(self.worker_id, "idle")
+                    self._stopping.wait(self.poll_interval)
+                    continue
+
+                self.execute(job)
+                if once:
+                    break
+        finally:
+            self.queue.update_worker(self.worker_id, "stopped")
+            logger.info(f"Worker {self.worker_id} arrêté")
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Lance un worker qui exécute les jobs de la file partagée")
+    parser.add_argument("--db", type=str, default=os.environ.get("UNSLOTH_QUEUE_DB", "unsloth.db"), help="Base SQLite locale de la file partagée (même machine que l'API)")
+    parser.add_argument("--capabilities", type=str, default=None, help="Capacités du worker, séparées par des virgules (détectées par défaut)")
+    parser.add_argument("--worker-id", type=str, default=None, help="Identifiant du worker")
+    parser.add_argument("--lease-seconds", type=float, default=60.0, help="Durée d'un bail sans heartbeat")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Intervalle entre deux tentatives de location")
+    parser.add_argument("--once", action="store_true", help="S'arrêter après un job")
+
+    args = parser.parse_args()
+
+    capabilities = args.capabilities.split(",") if args.capabilities else detect_capabilities()
+    queue = JobQueue(args.db, lease_seconds=args.lease_seconds)
+    worker = Worker(queue, capabilities, worker_id=args.worker_id, poll_interval=args.poll_interval)
+
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+
+    worker.run(once=args.once)
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
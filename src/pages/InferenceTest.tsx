@@ -1,6 +1,7 @@
-import React, { useState } from 'react';
+import React, { useRef, useState } from 'react';
 import { motion } from 'framer-motion';
 import { Terminal, Send, Download, Copy, ThumbsUp, ThumbsDown, X, CheckCircle, MessageSquare } from 'lucide-react';
+import InferenceService from '../services/InferenceService';
 
 const InferenceTest: React.FC = () => {
   const [prompt, setPrompt] = useState('');
@@ -8,42 +9,63 @@ const InferenceTest: React.FC = () => {
   const [conversation, setConversation] = useState<{ role: 'user' | 'assistant', content: string }[]>([]);
   
   const models = [
-    { id: 1, name: 'Mistral-7B-Customer-Support-v1', type: 'fine-tuned' },
-    { id: 2, name: 'LLaMa2-7B-ProductReviews-v1', type: 'fine-tuned' },
-    { id: 3, name: 'Mistral-7B-base', type: 'base' },
+    { id: 1, name: 'Mistral-7B-Customer-Support-v1', type: 'fine-tuned', path: 'models/finetuned/Mistral-7B-Customer-Support-v1' },
+    { id: 2, name: 'LLaMa2-7B-ProductReviews-v1', type: 'fine-tuned', path: 'models/finetuned/LLaMa2-7B-ProductReviews-v1' },
+    { id: 3, name: 'Mistral-7B-base', type: 'base', path: 'unsloth/mistral-7b-bnb-4bit' },
   ];
   
   const [selectedModel, setSelectedModel] = useState(models[0]);
+  const [temperature, setTemperature] = useState(0.7);
+  const [topP, setTopP] = useState(0.9);
+  const [maxTokens, setMaxTokens] = useState(1024);
+  const abortControllerRef = useRef<AbortController | null>(null);
   
-  const handleSendPrompt = () => {
-    if (!prompt.trim()) return;
-    
-    // Add user message to conversation
-    setConversation([...conversation, { role: 'user', content: prompt }]);
+  // Append a streamed chunk to the response being generated (last message)
+  const appendToResponse = (text: string) => {
+    setConversation(prev => {
+      const last = prev[prev.length - 1];
+      return [...prev.slice(0, -1), { ...last, content: last.content + text }];
+    });
+  };
+  
+  const handleSendPrompt = async () => {
+    if (!prompt.trim() || isSending) return;
     
-    // Simulate sending to the model
+    // Add user message and an empty assistant message filled as tokens arrive
+    setConversation(prev => [...prev, { role: 'user', content: prompt }, { role: 'assistant', content: '' }]);
     setIsSending(true);
     
-    // Clear the prompt input
+    const currentPrompt = prompt;
     setPrompt('');
     
-    // Simulate AI response after a delay
-    setTimeout(() => {
-      // Example responses based on model
-      let response = '';
-      
-      if (selectedModel.name.includes('Customer-Support')) {
-        response = "I understand you're having an issue. I'd be happy to help resolve this for you. Could you please provide more details about the problem you're experiencing, including any error messages or when you first noticed it? This will help me provide the most accurate assistance.";
-      } else if (selectedModel.name.includes('ProductReviews')) {
-        response = "Thank you for your interest in our product. Based on customer reviews, this product has received positive feedback for its durability and ease of use. Several customers have mentioned that it exceeded their expectations. Would you like me to provide more specific information about any aspect of the product?";
-      } else {
-        response = "I'm a language model trained to assist with a variety of tasks including answering questions, providing information, and engaging in conversation. How can I help you today?";
+    const controller = new AbortController();
+    abortControllerRef.current = controller;
+    try {
+      await InferenceService.streamInference(
+        {
+          model_path: selectedModel.path,
+          prompt: currentPrompt,
+          max_tokens: maxTokens,
+          temperature,
+          top_p: topP,
+        },
+        appendToResponse,
+        controller.signal
+      );
+    } catch (error) {
+      // A cancelled generation keeps the text received so far
+      if (!controller.signal.aborted) {
+        appendToResponse(`\n[Erreur: ${error instanceof Error ? error.message : String(error)}]`);
       }
-      
-      // Add AI response to conversation
-      setConversation(prev => [...prev, { role: 'assistant', content: response }]);
+    } finally {
+      abortControllerRef.current = null;
       setIsSending(false);
-    }, 1500);
+    }
+  };
+  
+  // Closing the connection stops the generation on the server
+  const handleCancel = () => {
+    abortControllerRef.current?.abort();
   };
   
   const handleKeyDown = (e: React.KeyboardEvent) => {
@@ -110,7 +132,7 @@ const InferenceTest: React.FC = () => {
                 <p className="text-sm mt-2">Try asking a question or providing a prompt</p>
               </div>
             ) : (
-              conversation.map((message, index) => (
+              conversation.filter(message => message.content !== '').map((message, index) => (
                 <div 
                   key={index}
                   className={`flex ${message.role === 'user' ? 'justify-end' : 'justify-start'}`}
@@ -145,7 +167,7 @@ const InferenceTest: React.FC = () => {
               ))
             )}
             
-            {isSending && (
+            {isSending && conversation[conversation.length - 1]?.content === '' && (
               <div className="flex justify-start">
                 <div className="bg-background border border-border rounded-lg rounded-tl-none p-3">
                   <div className="flex space-x-2">
@@ -169,15 +191,25 @@ const InferenceTest: React.FC = () => {
                 onChange={(e) => setPrompt(e.target.value)}
                 onKeyDown={handleKeyDown}
               ></textarea>
-              <button 
-                className={`absolute right-3 bottom-3 p-2 rounded-full ${
-                  prompt.trim() ? 'bg-primary text-white' : 'bg-background-light text-text-secondary'
-                } transition-colors`}
-                onClick={handleSendPrompt}
-                disabled={!prompt.trim() || isSending}
-              >
-                <Send className="h-4 w-4" />
-              </button>
+              {isSending ? (
+                <button 
+                  className="absolute right-3 bottom-3 p-2 rounded-full bg-error text-white transition-colors"
+                  onClick={handleCancel}
+                  title="Stop generation"
+                >
+                  <X className="h-4 w-4" />
+                </button>
+              ) : (
+                <button 
+                  className={`absolute right-3 bottom-3 p-2 rounded-full ${
+                    prompt.trim() ? 'bg-primary text-white' : 'bg-background-light text-text-secondary'
+                  } transition-colors`}
+                  onClick={handleSendPrompt}
+                  disabled={!prompt.trim()}
+                >
+                  <Send className="h-4 w-4" />
+                </button>
+              )}
             </div>
             <div className="flex justify-between items-center mt-2 text-xs text-text-secondary">
               <div>
@@ -202,12 +234,13 @@ const InferenceTest: React.FC = () => {
               min="0"
               max="1"
               step="0.1"
-              defaultValue="0.7"
+              value={temperature}
+              onChange={(e) => setTemperature(parseFloat(e.target.value))}
               className="w-full"
             />
             <div className="flex justify-between text-xs text-text-secondary mt-1">
               <span>Precise (0)</span>
-              <span>0.7</span>
+              <span>{temperature}</span>
               <span>Creative (1)</span>
             </div>
           </div>
@@ -219,23 +252,28 @@ const InferenceTest: React.FC = () => {
               min="0.1"
               max="1"
               step="0.1"
-              defaultValue="0.9"
+              value={topP}
+              onChange={(e) => setTopP(parseFloat(e.target.value))}
               className="w-full"
             />
             <div className="flex justify-between text-xs text-text-secondary mt-1">
               <span>Focused (0.1)</span>
-              <span>0.9</span>
+              <span>{topP}</span>
               <span>Diverse (1)</span>
             </div>
           </div>
           
           <div>
             <label className="block text-sm font-medium mb-1">Max Tokens</label>
-            <select className="input w-full">
-              <option>256 tokens</option>
-              <option>512 tokens</option>
-              <option selected>1024 tokens</option>
-              <option>2048 tokens</option>
+            <select
+              className="input w-full"
+              value={maxTokens}
+              onChange={(e) => setMaxTokens(parseInt(e.target.value))}
+            >
+              <option value={256}>256 tokens</option>
+              <option value={512}>512 tokens</option>
+              <option value={1024}>1024 tokens</option>
+              <option value={2048}>2048 tokens</option>
             </select>
           </div>
         </div>
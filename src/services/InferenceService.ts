@@ -18,6 +18,11 @@ export interface InferenceConfig {
   max_tokens?: number;
   temperature?: number;
   top_p?: number;
+  // Décodage spéculatif: petit modèle brouillon partageant le vocabulaire du modèle cible
+  draft_model_path?: string;
+  num_draft_tokens?: number;
+  // Adaptateur LoRA du registre appliqué au modèle de base résident
+  adapter?: string;
 }
 
 export interface InferenceResult {
@@ -26,18 +31,30 @@ export interface InferenceResult {
   model_path: string;
 }
 
+export interface StreamInferenceResult extends InferenceResult {
+  chunks: number;
+  time_to_first_token: number | null;
+  elapsed: number;
+}
+
+// Créer un FormData à partir de la configuration
+const toFormData = (config: InferenceConfig): FormData => {
+  const formData = new FormData();
+  Object.entries(config).forEach(([key, value]) => {
+    if (value !== undefined) {
+      formData.append(key, value.toString());
+    }
+  });
+  return formData;
+};
+
 // Service pour l'inférence
 const InferenceService = {
   // Exécuter l'inférence
   runInference: async (config: InferenceConfig): Promise<InferenceResult> => {
     try {
       // Créer un FormData pour l'envoi
-      const formData = new FormData();
-      Object.entries(config).forEach(([key, value]) => {
-        if (value !== undefined) {
-          formData.append(key, value.toString());
-        }
-      });
+      const formData = toFormData(config);
       
       const response = await api.post('/api/inference', formData, {
         headers: {
@@ -50,6 +67,64 @@ const InferenceService = {
       console.error('Erreur lors de l\'inférence:', error);
       throw error;
     }
+  },
+
+  // Exécuter l'inférence en flux (Server-Sent Events): onToken reçoit chaque morceau généré.
+  // Interrompre le signal ferme la connexion, ce qui arrête la génération côté serveur.
+  streamInference: async (
+    config: InferenceConfig,
+    onToken: (text: string) => void,
+    signal?: AbortSignal
+  ): Promise<StreamInferenceResult> => {
+    const response = await fetch(`${API_BASE_URL}/api/inference/stream`, {
+      method: 'POST',
+      body: toFormData(config),
+      signal,
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Erreur lors de l'inférence: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result: StreamInferenceResult | null = null;
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Les événements sont séparés par une ligne vide
+      let separator = buffer.indexOf('\n\n');
+      while (separator !== -1) {
+        const rawEvent = buffer.slice(0, separator);
+        buffer = buffer.slice(separator + 2);
+        separator = buffer.indexOf('\n\n');
+
+        let event = 'message';
+        let data = '';
+        rawEvent.split('\n').forEach((line) => {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        if (!data) continue;
+
+        const payload = JSON.parse(data);
+        if (event === 'error') {
+          throw new Error(payload.error);
+        } else if (event === 'done') {
+          result = payload;
+        } else {
+          onToken(payload.text);
+        }
+      }
+    }
+
+    if (!result) {
+      throw new Error('Flux d\'inférence interrompu');
+    }
+    return result;
   }
 };
 